@@ -4,14 +4,40 @@
 # =========================================================
 
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
+from plotly.subplots import make_subplots
 import numpy as np
-from prophet import Prophet
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
+import calendar
 import warnings
+from regional_store import select_rollup, NATION_LABEL
+from cleaning import cleaning_summary
+from client_explorer import explorer_html, EXPLORER_HEIGHT
+from reconciliation import RECONCILIATION_METHODS
+from metrics import ERROR_METRICS, leaderboard
+from artifacts import DataHandle
+from forecast_store import node_series
+from scenarios import MarriageScenario, MARRIAGE
+from export import available_export_formats, export_tables, export_file_name, export_mime
+from forecasting import (
+    train_prophet_model, predict_prophet, split_prophet_prediction,
+    calculate_prophet_metrics_from_forecast, select_uncertainty_samples,
+    PROPHET_MAX_HORIZON
+)
+from sarima import SARIMA_ORDER, SARIMA_SEASONAL_ORDER
+from dashboard_compute import (
+    DATA_FILES, REGION_SCHEMES, REGIONAL_CLEANING, get_artifact_registry,
+    load_region_index, load_region_rollups, load_province_tensor, province_tensor_version,
+    summarize_selection, load_province_comparison, load_explorer_payload,
+    load_seasonal_decomposition, load_backtest_cube,
+    load_live_sarima, forecast_live_sarima, build_ensemble_forecast, reconcile_regional_forecast,
+    get_forecast_store, record_artifact_forecasts, refit_status, run_marriage_scenarios,
+    HIERARCHY_HORIZONS, SCENARIO_DEFAULT_HORIZON
+)
 warnings.filterwarnings('ignore')
 
 # =========================================================
@@ -27,15 +53,6 @@ st.set_page_config(
 # =========================================================
 # Constants
 # =========================================================
-DATA_FILES = {
-    "divorce_model": "divorce_all_model.csv",
-    "regional": "monthly_marriage_divorce_wide_BE.csv",
-    "sarimax_metrics": "sarimax_metrics.csv",
-    "sarimax_rolling": "sarimax_rolling_forecast.csv",
-    "prophet_future": "prophet_forecast_future.csv",
-    "sarimax_future": "sarima_rolling_future_forecast.csv",
-    # "scenario": "TestScenarioPred.csv"
-}
 
 # Enhanced color scheme optimized for white backgrounds with semantic meaning
 COLORS = {
@@ -60,6 +77,10 @@ COLORS = {
     "info":      "#3498DB"   # Info light blue
 }
 
+# Province comparison: most provinces overlaid at once, and their line colors in selection order
+COMPARISON_MAX_PROVINCES = 8
+COMPARISON_COLORS = ["#1F77B4", "#E74C3C", "#2ECC71", "#F39C12", "#8E44AD", "#16A085", "#D35400", "#7F8C8D"]
+
 # Custom CSS for beautiful dashboard styling
 CUSTOM_CSS = """
 <style>
@@ -187,293 +208,491 @@ CUSTOM_CSS = """
 """
 
 # =========================================================
-# Region Schemes
+# Data Loading (artifact registry driven by DATA_FILES)
 # =========================================================
-REGION_SCHEMES: Dict[str, Dict[str, List[str]]] = {
-    "การแบ่งแบบสี่ภูมิภาค (กรมทางหลวง)": {
-        "ภาคเหนือ": [
-            "จังหวัดเชียงราย", "จังหวัดน่าน", "จังหวัดพะเยา", "จังหวัดเชียงใหม่",
-            "จังหวัดแม่ฮ่องสอน", "จังหวัดแพร่", "จังหวัดลำปาง", "จังหวัดลำพูน",
-            "จังหวัดอุตรดิตถ์", "จังหวัดพิษณุโลก", "จังหวัดสุโขทัย",
-            "จังหวัดกำแพงเพชร", "จังหวัดนครสวรรค์", "จังหวัดพิจิตร"
-        ],
-        "ภาคตะวันออกเฉียงเหนือ": [
-            "จังหวัดเพชรบูรณ์", "จังหวัดหนองคาย", "จังหวัดนครพนม", "จังหวัดสกลนคร",
-            "จังหวัดอุดรธานี", "จังหวัดหนองบัวลำภู", "จังหวัดเลย", "จังหวัดมุกดาหาร",
-            "จังหวัดกาฬสินธุ์", "จังหวัดขอนแก่น", "จังหวัดอำนาจเจริญ", "จังหวัดยโสธร",
-            "จังหวัดร้อยเอ็ด", "จังหวัดมหาสารคาม", "จังหวัดชัยภูมิ",
-            "จังหวัดนครราชสีมา", "จังหวัดบุรีรัมย์", "จังหวัดสุรินทร์",
-            "จังหวัดศรีสะเกษ", "จังหวัดอุบลราชธานี", "จังหวัดบึงกาฬ"
-        ],
-        "ภาคกลาง": [
-            "กรุงเทพมหานคร", "จังหวัดนนทบุรี", "จังหวัดปทุมธานี", "จังหวัดสมุทรปราการ",
-            "จังหวัดสมุทรสาคร", "จังหวัดสมุทรสงคราม", "จังหวัดนครปฐม",
-            "จังหวัดสุพรรณบุรี"
-        ],
-        "ภาคใต้": [
-            "จังหวัดชุมพร", "จังหวัดระนอง", "จังหวัดสุราษฎร์ธานี",
-            "จังหวัดนครศรีธรรมราช", "จังหวัดกระบี่", "จังหวัดพังงา", "จังหวัดภูเก็ต",
-            "จังหวัดพัทลุง", "จังหวัดตรัง", "จังหวัดปัตตานี", "จังหวัดสงขลา",
-            "จังหวัดสตูล", "จังหวัดนราธิวาส", "จังหวัดยะลา"
-        ],
-    },
-    "การแบ่งอย่างเป็นทางการ (6 ภูมิภาค)": {
-        "ภาคเหนือ": [
-            "จังหวัดเชียงราย", "จังหวัดน่าน", "จังหวัดพะเยา", "จังหวัดเชียงใหม่",
-            "จังหวัดแม่ฮ่องสอน", "จังหวัดแพร่", "จังหวัดลำปาง",
-            "จังหวัดลำพูน", "จังหวัดอุตรดิตถ์"
-        ],
-        "ภาคตะวันออกเฉียงเหนือ": [
-            "จังหวัดหนองคาย", "จังหวัดนครพนม", "จังหวัดสกลนคร", "จังหวัดอุดรธานี",
-            "จังหวัดหนองบัวลำภู", "จังหวัดเลย", "จังหวัดมุกดาหาร", "จังหวัดกาฬสินธุ์",
-            "จังหวัดขอนแก่น", "จังหวัดอำนาจเจริญ", "จังหวัดยโสธร", "จังหวัดร้อยเอ็ด",
-            "จังหวัดมหาสารคาม", "จังหวัดชัยภูมิ", "จังหวัดนครราชสีมา",
-            "จังหวัดบุรีรัมย์", "จังหวัดสุรินทร์", "จังหวัดศรีสะเกษ",
-            "จังหวัดอุบลราชธานี", "จังหวัดบึงกาฬ"
-        ],
-        "ภาคตะวันตก": [
-            "จังหวัดตาก", "จังหวัดกาญจนบุรี", "จังหวัดราชบุรี", "จังหวัดเพชรบุรี", "จังหวัดประจวบคีรีขันธ์"
-        ],
-        "ภาคกลาง": [
-            "กรุงเทพมหานคร", "จังหวัดปทุมธานี", "จังหวัดนนทบุรี",
-            "จังหวัดนครปฐม", "จังหวัดสมุทรปราการ"
-        ],
-        "ภาคตะวันออก": [
-            "จังหวัดชลบุรี", "จังหวัดระยอง", "จังหวัดจันทบุรี", "จังหวัดตราด"
-        ],
-        "ภาคใต้": [
-            "จังหวัดชุมพร", "จังหวัดสุราษฎร์ธานี", "จังหวัดนครศรีธรรมราช",
-            "จังหวัดสงขลา", "จังหวัดยะลา", "จังหวัดนราธิวาส"
-        ],
-    }
-}
+
+def load_artifacts() -> Dict[str, DataHandle]:
+    """
+    Load all artifacts, re-reading only files that changed on disk since the last rerun
+    Missing or unreadable files are reported and come back as empty DataFrames
+    Returns: name -> handle (frame plus the fingerprint cached functions key on)
+    """
+    registry = get_artifact_registry()
+    with st.spinner("Loading data files..."):
+        artifacts = registry.load_handles()
+    for name, message in registry.errors.items():
+        st.error(f"❌ {message}")
+    # Forecast CSVs also go to the forecast store, once per file version
+    record_artifact_forecasts(artifacts)
+    return artifacts
+
 
 # =========================================================
-# Data Loading Functions with Enhanced Caching
+# Helper Functions
 # =========================================================
 
-@st.cache_data(show_spinner="Loading divorce model data...")
-def load_data() -> pd.DataFrame:
-    """Load and preprocess the divorce and marriage data for model comparison"""
-    try:
-        df = pd.read_csv(DATA_FILES["divorce_model"])
-        df["ds"] = pd.to_datetime(df["ds"])
-        df = df.sort_values("ds")
-        return df
-    except FileNotFoundError:
-        st.error(f"❌ File not found: {DATA_FILES['divorce_model']}")
-        return pd.DataFrame()
-    except Exception as e:
-        st.error(f"❌ Error loading divorce model data: {str(e)}")
-        return pd.DataFrame()
-
-
-@st.cache_data(show_spinner="Loading regional data...")
-def load_regional_data() -> pd.DataFrame:
-    """Load regional data for province/region filtering"""
-    try:
-        df = pd.read_csv(DATA_FILES["regional"])
-        return df
-    except FileNotFoundError:
-        st.error(f"❌ File not found: {DATA_FILES['regional']}")
-        return pd.DataFrame()
-    except Exception as e:
-        st.error(f"❌ Error loading regional data: {str(e)}")
-        return pd.DataFrame()
+def calculate_divorce_rate(marriages: float, divorces: float) -> float:
+    """Calculate divorce rate as percentage"""
+    return (divorces / marriages * 100) if marriages > 0 else 0.0
+
+
+def format_number(number: float, decimals: int = 0) -> str:
+    """Format number with thousands separator"""
+    return f"{number:,.{decimals}f}"
+
+
+def paginated_dataframe(df: pd.DataFrame, key: str, page_size: int = 20) -> None:
+    """Show one page of a DataFrame so the browser only receives the visible rows"""
+    n_pages = max(1, -(-len(df) // page_size))
+    page = 1
+    if n_pages > 1:
+        page = st.number_input(f"Page (1–{n_pages})", min_value=1, max_value=n_pages, value=1, key=key)
+
+    start = (page - 1) * page_size
+    st.dataframe(
+        df.iloc[start:start + page_size],
+        use_container_width=True,
+        hide_index=True
+    )
+    st.caption(f"Rows {min(start + 1, len(df)):,}–{min(start + page_size, len(df)):,} of {len(df):,}")
 
 
 # =========================================================
-# Prophet Model Functions (from basic_Prophet.ipynb)
+# Overview Charts
+# Cached on their (small) input tables, so a rerun that leaves the filter
+# selection unchanged (display options, tab widgets) reuses the built figures.
+# Cached figures are shared between sessions and must not be modified.
 # =========================================================
 
-@st.cache_data(show_spinner="Training Prophet model with hyperparameter tuning...")
-def train_prophet_model(df: pd.DataFrame) -> Tuple[Prophet, pd.DataFrame, Dict]:
-    """
-    Train Prophet model with optimized parameters from basic_Prophet.ipynb
-    Returns: (trained_model, prepared_dataframe, parameters_used)
-    """
-    # Prepare data
-    df_prophet = df[['ds', 'Divorce']].copy()
-    df_prophet = df_prophet.rename(columns={"Divorce": "y"})
-    
-    # Set cap/floor for logistic growth
-    global_cap = df_prophet['y'].max() * 1.2
-    global_floor = 0
-    df_prophet['cap'] = global_cap
-    df_prophet['floor'] = global_floor
-    
-    # Use best parameters from basic_Prophet.ipynb
-    # These were found through extensive grid search
-    best_params = {
-        'changepoint_prior_scale': 1.0,
-        'seasonality_prior_scale': 0.1,
-        'yearly_seasonality': True,
-        'weekly_seasonality': False,
-        'daily_seasonality': False
-    }
-    
-    # Train Prophet model with logistic growth
-    model = Prophet(growth='logistic', **best_params)
-    model.fit(df_prophet)
-    
-    return model, df_prophet, best_params
+@st.cache_resource(show_spinner=False, max_entries=64)
+def trend_figure(df_year: pd.DataFrame) -> go.Figure:
+    """Yearly marriages vs divorces for the selection"""
+    fig = go.Figure()
+
+    fig.add_trace(go.Scatter(
+        x=df_year.Year_BE, 
+        y=df_year.Marriage, 
+        name="Marriage",
+        line=dict(color=COLORS["marriage"], width=3),
+        mode='lines+markers'
+    ))
+
+    fig.add_trace(go.Scatter(
+        x=df_year.Year_BE, 
+        y=df_year.Divorce, 
+        name="Divorce",
+        line=dict(color=COLORS["divorce"], width=3),
+        mode='lines+markers'
+    ))
+
+    fig.update_layout(
+        title={
+            'text': "Marriage vs Divorce Trend Over Time",
+            'font': {'size': 22, 'color': '#2C3E50', 'family': 'Arial Black'}
+        },
+        xaxis_title="Year (พ.ศ.)",
+        yaxis_title="Count",
+        hovermode="x unified",
+        plot_bgcolor='rgba(240, 242, 245, 0.8)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
+        template="plotly_white",
+        height=450
+    )
+    return fig
 
 
-@st.cache_data(show_spinner="Calculating Prophet metrics...")
-def calculate_prophet_metrics_from_forecast(_model, df: pd.DataFrame) -> Dict:
-    """
-    Calculate Prophet metrics by comparing forecast with actual data
-    Based on the approach from basic_Prophet.ipynb
-    """
-    from sklearn.metrics import mean_absolute_error, mean_squared_error, mean_absolute_percentage_error
-    
-    # Get forecast for the training period
-    df_prophet = df[['ds', 'Divorce']].copy()
-    df_prophet = df_prophet.rename(columns={"Divorce": "y"})
-    
-    # Set cap/floor
-    global_cap = df_prophet['y'].max() * 1.2
-    global_floor = 0
-    df_prophet['cap'] = global_cap
-    df_prophet['floor'] = global_floor
-    
-    # Generate forecast
-    future = _model.make_future_dataframe(periods=0, freq='MS')  # Only historical period
-    future['cap'] = global_cap
-    future['floor'] = global_floor
-    forecast = _model.predict(future)
-    
-    # Merge forecast with actual data
-    metric_df = (
-        forecast[['ds', 'yhat']]
-        .merge(df_prophet[['ds', 'y']], on='ds', how='inner')
+@st.cache_resource(show_spinner=False, max_entries=64)
+def top_provinces_figure(top: pd.DataFrame, metric: str, title: str, colors: Tuple[str, ...]) -> go.Figure:
+    """Donut chart of the top provinces for one metric"""
+    fig = px.pie(
+        top, 
+        names="Province", 
+        values=metric,
+        title=title,
+        color_discrete_sequence=list(colors),
+        hole=0.3  # Makes it a donut chart for modern look
     )
-    
-    y_true = metric_df['y']
-    y_pred = metric_df['yhat']
-    
-    # Calculate metrics
-    mae = mean_absolute_error(y_true, y_pred)
-    mse = mean_squared_error(y_true, y_pred)
-    rmse = np.sqrt(mse)
-    mape = mean_absolute_percentage_error(y_true, y_pred) * 100
-    
-    return {
-        'MAE': mae,
-        'MSE': mse,
-        'RMSE': rmse,
-        'MAPE': mape,
-        'forecast_df': metric_df.rename(columns={'y': 'Actual', 'yhat': 'Forecast'})
-    }
+    fig.update_traces(
+        textposition='inside', 
+        textinfo='percent+label',
+        textfont_size=13,
+        marker=dict(line=dict(color='white', width=2))
+    )
+    fig.update_layout(
+        font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
+        title={
+            'font': {'size': 18, 'color': '#2C3E50', 'family': 'Arial Black'}
+        },
+        paper_bgcolor='rgba(0,0,0,0)',
+        showlegend=True,
+        legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5)
+    )
+    return fig
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def region_rate_figure(df_rank: pd.DataFrame, rate: str, title: str, yaxis_title: str,
+                       color_scale: Tuple[str, ...]) -> go.Figure:
+    """Bar chart of a per-region rate (%), df_rank already sorted"""
+    fig = px.bar(
+        df_rank,
+        x="Region",
+        y=rate,
+        text=df_rank[rate].round(2),
+        title=title,
+        color=rate,
+        color_continuous_scale=list(color_scale)
+    )
+
+    fig.update_traces(textposition="outside", texttemplate='%{text:.2f}%')
+    fig.update_layout(
+        title={
+            'text': title,
+            'font': {'size': 20, 'color': '#2C3E50', 'family': 'Arial Black'}
+        },
+        xaxis_title="Region",
+        yaxis_title=yaxis_title,
+        yaxis_tickformat=".2f",
+        template="plotly_white",
+        plot_bgcolor='rgba(240, 242, 245, 0.8)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
+        height=400,
+        showlegend=False
+    )
+    return fig
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def region_trend_figure(df_region_trend: pd.DataFrame, metric: str, grain: str) -> go.Figure:
+    """Per-region yearly or monthly series from the materialized rollups"""
+    fig = px.line(
+        df_region_trend,
+        x="Year_BE" if grain == "Yearly" else "ds",
+        y=metric,
+        color="Region",
+        markers=grain == "Yearly"
+    )
+    fig.update_layout(
+        title={
+            'text': f"{metric} by Region ({grain})",
+            'font': {'size': 20, 'color': '#2C3E50', 'family': 'Arial Black'}
+        },
+        xaxis_title="Year (พ.ศ.)" if grain == "Yearly" else "Date",
+        yaxis_title="Count",
+        hovermode="x unified",
+        template="plotly_white",
+        plot_bgcolor='rgba(240, 242, 245, 0.8)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
+        height=450
+    )
+    return fig
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def seasonal_decomposition_figure(decomposed: pd.DataFrame, title: str, color: str) -> go.Figure:
+    """Observed / trend / seasonal / residual panels sharing one time axis"""
+    panels = ["Observed", "Trend", "Seasonal", "Residual"]
+    fig = make_subplots(rows=len(panels), cols=1, shared_xaxes=True, vertical_spacing=0.04,
+                        subplot_titles=panels)
+    for i, panel in enumerate(panels, start=1):
+        fig.add_trace(go.Scatter(
+            x=decomposed["ds"],
+            y=decomposed[panel],
+            name=panel,
+            mode="markers" if panel == "Residual" else "lines",
+            line=dict(color=COLORS["actual"] if panel == "Observed" else color, width=2),
+            marker=dict(color=color, size=4)
+        ), row=i, col=1)
+    fig.update_layout(
+        title={
+            'text': title,
+            'font': {'size': 20, 'color': '#2C3E50', 'family': 'Arial Black'}
+        },
+        showlegend=False,
+        hovermode="x unified",
+        template="plotly_white",
+        plot_bgcolor='rgba(240, 242, 245, 0.8)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
+        height=750
+    )
+    return fig
 
 
-@st.cache_data(show_spinner="Generating Prophet future forecast...")
-def generate_prophet_future_forecast(_model, df_prophet: pd.DataFrame, periods: int = 60) -> pd.DataFrame:
+@st.cache_resource(show_spinner=False, max_entries=512)
+def comparison_trace(province: str, series: pd.Series, color: str, value_format: str) -> Dict:
     """
-    Generate future forecast using trained Prophet model
-    Args:
-        _model: Trained Prophet model (underscore prefix to skip caching this arg)
-        df_prophet: Prepared dataframe with cap/floor
-        periods: Number of periods to forecast (default: 60 months = 5 years)
+    One province's line for the comparison chart, as a plain trace dict
+    Cached per province, so a selection change only builds the traces it adds;
+    the figure copies the dict and never modifies the cached one.
     """
-    # Create future dataframe
-    future = _model.make_future_dataframe(periods=periods, freq='MS')
-    future['cap'] = df_prophet['cap'].iloc[0]
-    future['floor'] = df_prophet['floor'].iloc[0]
-    
-    # Generate forecast
-    forecast = _model.predict(future)
-    
-    # Return relevant columns
-    result = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper', 'trend']].copy()
-    return result
-
-
-@st.cache_data(show_spinner="Loading model metrics...")
-def load_metrics() -> pd.DataFrame:
-    """Load model metrics for Prophet and SARIMA"""
-    try:
-        prophet = pd.read_csv(DATA_FILES["prophet_metrics"])
-        arima = pd.read_csv(DATA_FILES["sarimax_metrics"])
-
-        # Add model identifier
-        prophet["Model"] = "Prophet"
-        arima["Model"] = "SARIMAX"
-
-        # Normalize column names to uppercase
-        prophet.columns = prophet.columns.str.upper()
-        arima.columns = arima.columns.str.upper()
-
-        # Select consistent columns from both
-        common_cols = ["MODEL", "ROUND", "TRAIN", "TEST", "MAE", "RMSE", "MAPE"]
-        prophet = prophet[common_cols]
-        arima = arima[common_cols]
-
-        return pd.concat([prophet, arima], ignore_index=True)
-    except FileNotFoundError as e:
-        st.error(f"❌ Metrics file not found: {str(e)}")
-        return pd.DataFrame()
-    except Exception as e:
-        st.error(f"❌ Error loading metrics: {str(e)}")
-        return pd.DataFrame()
-
-
-
-@st.cache_data(show_spinner="Loading SARIMA rolling forecast...")
-def load_sarimax_rolling() -> pd.DataFrame:
-    """Load SARIMA rolling forecast data only"""
-    try:
-        arima_roll = pd.read_csv(DATA_FILES["sarimax_rolling"])
-        arima_roll["ds"] = pd.to_datetime(arima_roll["ds"])
-        return arima_roll
-    except FileNotFoundError as e:
-        st.error(f"❌ SARIMA rolling forecast file not found: {str(e)}")
-        return pd.DataFrame()
-    except Exception as e:
-        st.error(f"❌ Error loading SARIMA rolling forecast: {str(e)}")
-        return pd.DataFrame()
-
-
-@st.cache_data(show_spinner="Loading future forecasts...")
-def load_future_forecasts() -> Tuple[pd.DataFrame, pd.DataFrame]:
-    """Load future forecast data"""
-    try:
-        prophet_future = pd.read_csv(DATA_FILES["prophet_future"])
-        arima_future = pd.read_csv(DATA_FILES["sarimax_future"])
-        
-        prophet_future["ds"] = pd.to_datetime(prophet_future["ds"])
-        arima_future["ds"] = pd.to_datetime(arima_future["ds"])
-        
-        return prophet_future, arima_future
-    except FileNotFoundError as e:
-        st.error(f"❌ Future forecast file not found: {str(e)}")
-        return pd.DataFrame(), pd.DataFrame()
-    except Exception as e:
-        st.error(f"❌ Error loading future forecasts: {str(e)}")
-        return pd.DataFrame(), pd.DataFrame()
+    return dict(
+        type="scatter",
+        x=series.index.tolist(),
+        y=series.tolist(),
+        name=province,
+        mode="lines+markers",
+        line=dict(color=color, width=3),
+        hovertemplate=f"{province}: %{{y:{value_format}}}<extra></extra>"
+    )
+
+
+def province_comparison_figure(traces: List[Dict], title: str, yaxis_title: str) -> go.Figure:
+    """Overlay of the compared provinces (uirevision keeps zoom and hidden lines across selection changes)"""
+    fig = go.Figure(data=traces)
+    fig.update_layout(
+        title={
+            'text': title,
+            'font': {'size': 20, 'color': '#2C3E50', 'family': 'Arial Black'}
+        },
+        xaxis_title="Year (พ.ศ.)",
+        yaxis_title=yaxis_title,
+        hovermode="x unified",
+        template="plotly_white",
+        plot_bgcolor='rgba(240, 242, 245, 0.8)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
+        uirevision="province_comparison",
+        height=450
+    )
+    return fig
 
 
 # =========================================================
-# Helper Functions
+# National Forecast Charts
+# Figures depend only on the national series and the chart options, so they are
+# cached: sidebar filter changes rerun the page without rebuilding them.
+# Cached figures are shared between sessions and must not be modified.
 # =========================================================
 
-def create_province_to_region_mapping(scheme: str) -> Dict[str, str]:
-    """Create a mapping from province names to region names"""
-    mapping = {}
-    for region, provinces in REGION_SCHEMES[scheme].items():
-        for province in provinces:
-            mapping[province] = region
-    return mapping
+FORECAST_LAYOUT = dict(
+    xaxis_title="Date",
+    hovermode="x unified",
+    template="plotly_white",
+    plot_bgcolor='rgba(240, 242, 245, 0.8)',
+    paper_bgcolor='rgba(0,0,0,0)',
+    font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
+    xaxis={'gridcolor': '#E1E8ED'},
+    yaxis={'gridcolor': '#E1E8ED'},
+)
 
 
-def calculate_divorce_rate(marriages: float, divorces: float) -> float:
-    """Calculate divorce rate as percentage"""
-    return (divorces / marriages * 100) if marriages > 0 else 0.0
+def _actual_trace(df: pd.DataFrame, name: str, width: int = 2) -> Optional[go.Scatter]:
+    """Historical national divorces, if present"""
+    if "Divorce" not in df.columns or "ds" not in df.columns:
+        return None
+    return go.Scatter(x=df["ds"], y=df["Divorce"], name=name, line=dict(color=COLORS["actual"], width=width))
 
 
-def format_number(number: float, decimals: int = 0) -> str:
-    """Format number with thousands separator"""
-    return f"{number:,.{decimals}f}"
+@st.cache_resource(show_spinner=False, max_entries=16)
+def forecast_comparison_figure(df: pd.DataFrame, arima_roll: pd.DataFrame, arima_forecast: pd.DataFrame,
+                               prophet_prediction: pd.DataFrame) -> go.Figure:
+    """Actual vs SARIMA rolling, live SARIMA future and Prophet forecasts (Rolling Forecast tab)"""
+    fig = go.Figure()
+    
+    actual = _actual_trace(df, "Actual")
+    if actual is not None:
+        fig.add_trace(actual)
+    
+    if not arima_roll.empty:
+        fig.add_trace(go.Scatter(
+            x=arima_roll["ds"],
+            y=arima_roll["forecast"],
+            name="SARIMA Rolling",
+            line=dict(color=COLORS["sarimax"], dash="dash")
+        ))
+    
+    if not arima_forecast.empty:
+        fig.add_trace(go.Scatter(
+            x=arima_forecast["ds"],
+            y=arima_forecast["yhat"],
+            name="SARIMA Future",
+            line=dict(color=COLORS["sarimax"], dash="dash", width=2)
+        ))
+    
+    if not prophet_prediction.empty:
+        fig.add_trace(go.Scatter(
+            x=prophet_prediction["ds"],
+            y=prophet_prediction["yhat"],
+            name="Prophet Future",
+            line=dict(color=COLORS["prophet"], dash="dash", width=2)
+        ))
+    
+    fig.update_layout(
+        title={
+            'text': "Divorce Forecast Comparison: SARIMA vs Prophet",
+            'font': {'size': 22, 'color': '#2C3E50', 'family': 'Arial Black'}
+        },
+        yaxis_title="Number of Divorces",
+        height=700,
+        **FORECAST_LAYOUT
+    )
+    return fig
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def prophet_future_figure(df: pd.DataFrame, prophet_future: pd.DataFrame, forecast_months: int,
+                          show_confidence_intervals: bool) -> go.Figure:
+    """Prophet future forecast over the chosen horizon (Future Forecast tab)"""
+    fig = go.Figure()
+    
+    actual = _actual_trace(df, "Actual (Historical)")
+    if actual is not None:
+        fig.add_trace(actual)
+    
+    prophet_subset = prophet_future.head(forecast_months)
+    fig.add_trace(go.Scatter(
+        x=prophet_subset["ds"],
+        y=prophet_subset["yhat"],
+        name="Future Forecast",
+        line=dict(color=COLORS["prophet"], dash="dash", width=2)
+    ))
+    
+    if show_confidence_intervals and "yhat_upper" in prophet_subset.columns and "yhat_lower" in prophet_subset.columns:
+        fig.add_trace(go.Scatter(
+            x=prophet_subset["ds"],
+            y=prophet_subset["yhat_upper"],
+            line=dict(width=0),
+            showlegend=False,
+            hoverinfo='skip'
+        ))
+        
+        fig.add_trace(go.Scatter(
+            x=prophet_subset["ds"],
+            y=prophet_subset["yhat_lower"],
+            fill="tonexty",
+            fillcolor="rgba(99, 110, 250, 0.15)",
+            line=dict(width=0),
+            name="Confidence Interval"
+        ))
+    
+    fig.update_layout(
+        title={
+            'text': f"Future Forecast of Divorce Cases (Prophet – {forecast_months} months)",
+            'font': {'size': 20, 'color': '#2C3E50', 'family': 'Arial Black'}
+        },
+        yaxis_title="Number of Divorces",
+        height=600,
+        **FORECAST_LAYOUT
+    )
+    return fig
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def sarima_future_figure(df: pd.DataFrame, arima_forecast: pd.DataFrame, forecast_months: int,
+                         show_confidence_intervals: bool) -> go.Figure:
+    """SARIMA future forecast with 95% bounds over the chosen horizon (Future Forecast tab)"""
+    fig = go.Figure()
+    
+    actual = _actual_trace(df, "Actual (Historical)", width=3)
+    if actual is not None:
+        fig.add_trace(actual)
+    
+    arima_subset = arima_forecast.head(forecast_months)
+    fig.add_trace(go.Scatter(
+        x=arima_subset["ds"],
+        y=arima_subset["yhat"],
+        name="SARIMAX Forecast",
+        line=dict(color=COLORS["sarimax"], width=2, dash="dash")
+    ))
+    
+    if show_confidence_intervals and "yhat_upper" in arima_subset.columns and "yhat_lower" in arima_subset.columns:
+        fig.add_trace(go.Scatter(
+            x=arima_subset["ds"],
+            y=arima_subset["yhat_upper"],
+            name="Upper Bound (95%)",
+            line=dict(color=COLORS["sarimax"], width=1, dash="dash"),
+            opacity=0.3
+        ))
+        fig.add_trace(go.Scatter(
+            x=arima_subset["ds"],
+            y=arima_subset["yhat_lower"],
+            name="Lower Bound (95%)",
+            line=dict(color=COLORS["sarimax"], width=1, dash="dash"),
+            fill='tonexty',
+            opacity=0.2
+        ))
+    
+    fig.update_layout(
+        title={
+            'text': f"SARIMA Future Forecast ({forecast_months} months)",
+            'font': {'size': 20, 'color': '#2C3E50', 'family': 'Arial Black'}
+        },
+        yaxis_title="Predicted Divorce Count",
+        height=600,
+        **FORECAST_LAYOUT
+    )
+    return fig
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def combined_future_figure(df: pd.DataFrame, prophet_future: pd.DataFrame, arima_forecast: pd.DataFrame,
+                           ensemble_future: pd.DataFrame, forecast_months: int,
+                           show_confidence_intervals: bool) -> go.Figure:
+    """SARIMA, Prophet and backtest-weighted ensemble forecasts side by side (Future Forecast tab)"""
+    fig = go.Figure()
+    
+    actual = _actual_trace(df, "Actual")
+    if actual is not None:
+        fig.add_trace(actual)
+    
+    if not arima_forecast.empty:
+        arima_subset = arima_forecast.head(forecast_months)
+        fig.add_trace(go.Scatter(
+            x=arima_subset["ds"],
+            y=arima_subset["yhat"],
+            name="SARIMA Future",
+            line=dict(color=COLORS["sarimax"], dash="dash", width=2)
+        ))
+    
+    if not prophet_future.empty:
+        prophet_subset = prophet_future.head(forecast_months)
+        fig.add_trace(go.Scatter(
+            x=prophet_subset["ds"],
+            y=prophet_subset["yhat"],
+            name="Prophet Future",
+            line=dict(color=COLORS["prophet"], dash="dash", width=2)
+        ))
+    
+    if not ensemble_future.empty:
+        ensemble_subset = ensemble_future.head(forecast_months)
+        if show_confidence_intervals:
+            fig.add_trace(go.Scatter(
+                x=ensemble_subset["ds"],
+                y=ensemble_subset["yhat_upper"],
+                line=dict(width=0),
+                showlegend=False,
+                hoverinfo='skip'
+            ))
+            fig.add_trace(go.Scatter(
+                x=ensemble_subset["ds"],
+                y=ensemble_subset["yhat_lower"],
+                fill="tonexty",
+                fillcolor="rgba(46, 204, 113, 0.15)",
+                line=dict(width=0),
+                name="Ensemble 95% Interval"
+            ))
+        
+        fig.add_trace(go.Scatter(
+            x=ensemble_subset["ds"],
+            y=ensemble_subset["yhat"],
+            name="Ensemble (backtest-weighted)",
+            line=dict(color=COLORS["success"], width=3)
+        ))
+    
+    fig.update_layout(
+        title={
+            'text': "Divorce Forecast Comparison: SARIMA vs Prophet",
+            'font': {'size': 20, 'color': '#2C3E50', 'family': 'Arial Black'}
+        },
+        yaxis_title="Number of Divorces",
+        height=700,
+        **FORECAST_LAYOUT
+    )
+    return fig
 
 
 # # =========================================================
@@ -636,31 +855,28 @@ def format_number(number: float, decimals: int = 0) -> str:
 # =========================================================
 
 try:
-    # Load base data
-    df = load_data()
-    df_regional = load_regional_data()
-    
-    # Train Prophet model and generate forecasts (live from basic_Prophet.ipynb)
-    prophet_model, df_prophet_prepared, prophet_params = train_prophet_model(df)
-    prophet_metrics_dict = calculate_prophet_metrics_from_forecast(prophet_model, df)
-    prophet_future = generate_prophet_future_forecast(prophet_model, df_prophet_prepared, periods=60)
-    
-    # Load SARIMAX data from CSV files
-    arima_metrics = pd.read_csv(DATA_FILES["sarimax_metrics"])
-    arima_metrics["Model"] = "SARIMAX"
-    arima_metrics.columns = arima_metrics.columns.str.upper()
-    metrics_df = arima_metrics  # Only SARIMAX metrics in the table
-    
-    arima_roll = pd.read_csv(DATA_FILES["sarimax_rolling"])
-    arima_roll["ds"] = pd.to_datetime(arima_roll["ds"])
-    
-    arima_future = pd.read_csv(DATA_FILES["sarimax_future"])
-    arima_future["ds"] = pd.to_datetime(arima_future["ds"])
+    # Load base data and SARIMAX artifacts (parallel, reloaded only when a file changes)
+    # Cached functions take the handles and key on their fingerprints, so no rerun rehashes a frame
+    artifacts = load_artifacts()
+    national_data = artifacts["divorce_model"]
+    regional_data = artifacts["regional"]
+    df = national_data.frame
+    df_regional = regional_data.frame
+    metrics_df = artifacts["sarimax_metrics"].frame  # Only SARIMAX metrics in the table
+    arima_roll = artifacts["sarimax_rolling"].frame
+    arima_future = artifacts["sarimax_future"].frame
     
     # Check if data loaded successfully
     if df.empty or df_regional.empty:
         st.error("❌ Failed to load required data files. Please check file paths.")
         st.stop()
+    
+    region_index = load_region_index(regional_data)
+    region_rollups = load_region_rollups(regional_data, region_index)
+    province_tensor = load_province_tensor(regional_data)
+    
+    # Train Prophet model (live from basic_Prophet.ipynb), predictions follow the sidebar settings
+    prophet_model, prophet_data, prophet_params = train_prophet_model(national_data)
         
 except Exception as e:
     st.error(f"❌ Critical error loading data: {str(e)}")
@@ -689,22 +905,37 @@ st.sidebar.header("🔎 Filters & Settings")
 if st.sidebar.button("🔄 Reset to Default Filters", use_container_width=True):
     st.rerun()
 
+# Batch mode stages the filter widgets in a form: edits do not rerun the page
+# until "Apply Filters" is pressed, then all of them are applied in one rerun
+batch_filters = st.sidebar.toggle(
+    "🧺 Batch Filter Changes",
+    value=False,
+    key="batch_filters",
+    help="Stage several filter changes and apply them together with one refresh"
+)
+filter_panel = st.sidebar.form("filters", border=False) if batch_filters else st.sidebar.container()
+
 # Region Scheme Selection
-scheme = st.sidebar.selectbox(
+scheme = filter_panel.selectbox(
     "1️⃣ รูปแบบการแบ่งภูมิภาค",
     list(REGION_SCHEMES.keys()),
     index=0,
+    key="filter_scheme",
     help="เลือกรูปแบบการแบ่งภูมิภาคที่ต้องการวิเคราะห์"
 )
 
-# Region Selection
+# Region Selection (in batch mode the options follow the last applied scheme;
+# a staged region the new scheme does not have falls back to ทั้งหมด)
 region_options = ["ทั้งหมด"] + list(REGION_SCHEMES[scheme].keys())
-region = st.sidebar.selectbox(
+region = filter_panel.selectbox(
     "2️⃣ เลือกภูมิภาค", 
     region_options, 
     index=0,
+    key="filter_region",
     help="เลือกภูมิภาคที่ต้องการวิเคราะห์"
 )
+if region not in region_options:
+    region = "ทั้งหมด"
 
 # Province Selection
 province_options = ["ทั้งหมด"]
@@ -715,33 +946,49 @@ else:
     province_options.extend(REGION_SCHEMES[scheme][region])
 
 province_options = ["ทั้งหมด"] + sorted(set(province_options) - {"ทั้งหมด"})
-province = st.sidebar.selectbox(
+province = filter_panel.selectbox(
     "3️⃣ เลือกจังหวัด", 
     province_options, 
     index=0,
+    key="filter_province",
     help="เลือกจังหวัดที่ต้องการวิเคราะห์โดยเฉพาะ"
 )
+if province not in province_options:
+    province = "ทั้งหมด"
 
 # Year Range Selection
 if not df_regional.empty and "Year_BE" in df_regional.columns:
     year_min = int(df_regional.Year_BE.min())
     year_max = int(df_regional.Year_BE.max())
-    year_range = st.sidebar.slider(
+    year_range = filter_panel.slider(
         "ช่วงปี (พ.ศ.)", 
         year_min, 
         year_max, 
         (year_min, year_max),
+        key="filter_years",
         help="เลือกช่วงปีที่ต้องการวิเคราะห์"
     )
 else:
     year_range = (2560, 2565)
 
+if batch_filters:
+    filter_panel.form_submit_button("✅ Apply Filters", use_container_width=True)
+
 st.sidebar.divider()
 
 # Model Selection (Fixed to both models for)
 models_to_show = ["Prophet", "SARIMAX"]
 st.sidebar.info("**📊 Models:** Prophet & SARIMA")
 
+# Refits run in scheduler.py; until its jobs for this data finish, views compute on first use
+refits = refit_status(artifacts)
+if refits is not None and refits["total"]:
+    st.sidebar.caption(
+        f"⏱️ Scheduled refits for the loaded data: {refits['done']}/{refits['total']} done"
+        + (f", {refits['failed']} failed" if refits["failed"] else "")
+        + (f" (last {refits['last_finished']:%Y-%m-%d %H:%M})" if refits["last_finished"] is not None else "")
+    )
+
 # Display Options
 st.sidebar.subheader("⚙️ Display Options")
 show_confidence_intervals = st.sidebar.checkbox(
@@ -756,6 +1003,44 @@ show_data_tables = st.sidebar.checkbox(
     help="Display raw data tables below charts"
 )
 
+fast_uncertainty = st.sidebar.checkbox(
+    "⚡ Fast Uncertainty Sampling",
+    value=True,
+    help="Draw fewer Prophet uncertainty samples (intervals are skipped entirely when confidence intervals are hidden)"
+)
+
+client_explorer = st.sidebar.checkbox(
+    "🖥️ Client-side Explorer",
+    value=False,
+    help="Send the overview data to the browser once and filter it there, without a server round trip per change"
+)
+
+# =========================================================
+# Prophet Prediction (one shared prediction at the maximum horizon)
+# =========================================================
+
+uncertainty_samples = select_uncertainty_samples(show_confidence_intervals, fast_uncertainty)
+
+prophet_prediction = predict_prophet(
+    prophet_model, prophet_data,
+    periods=PROPHET_MAX_HORIZON,
+    uncertainty_samples=uncertainty_samples
+)
+prophet_metrics_dict = calculate_prophet_metrics_from_forecast(prophet_prediction, df)
+
+# Future-only slices for the forecast horizon views
+last_actual_ds = df["ds"].max()
+_, prophet_future = split_prophet_prediction(prophet_prediction, last_actual_ds)
+
+# Live SARIMA forecast from the persisted state-space model (static CSV as fallback)
+try:
+    sarima_results, sarima_status = load_live_sarima(national_data)
+    arima_forecast = forecast_live_sarima(sarima_results, national_data, PROPHET_MAX_HORIZON)
+except Exception as e:
+    st.warning(f"⚠️ Live SARIMA unavailable, showing the saved forecast: {str(e)}")
+    sarima_status = "static"
+    arima_forecast = arima_future[arima_future["ds"] > last_actual_ds].reset_index(drop=True)
+
 # =========================================================
 # Apply Filters to Regional Data
 # =========================================================
@@ -768,306 +1053,303 @@ df_filt = df_regional[
 if province != "ทั้งหมด":
     df_filt = df_filt[df_filt.Province == province]
 elif region != "ทั้งหมด":
-    df_filt = df_filt[df_filt.Province.isin(REGION_SCHEMES[scheme][region])]
+    df_filt = df_filt[region_index.region_mask(scheme, region, df_filt.Province_Code.to_numpy())]
+
+# Summaries are reductions over the province tensor (df_filt only feeds tables and export),
+# cached per selection so display options and tab widgets do not recompute them
+selection_summary = summarize_selection(
+    province_tensor, region_index, province_tensor_version(), scheme,
+    region=None if region == "ทั้งหมด" else region,
+    province=None if province == "ทั้งหมด" else province,
+    year_range=tuple(year_range)
+)
+df_year = selection_summary["yearly"]
+df_region_totals = selection_summary["region_totals"]
+unmapped_totals = selection_summary["unmapped"]
 
 # =========================================================
-# KPI Metrics
+# Client-side Explorer (replaces the server-rendered overview)
 # =========================================================
 
-total_marriages = df_filt.Marriage.sum()
-total_divorces = df_filt.Divorce.sum()
-divorce_rate = calculate_divorce_rate(total_marriages, total_divorces)
+if client_explorer:
+    st.subheader("🖥️ Overview Explorer")
+    st.caption(
+        "Year, region and province filters here run in the browser on a pre-aggregated "
+        "province x year dataset sent once; the sidebar filters still apply to the sections below."
+    )
+    components.html(
+        explorer_html(load_explorer_payload(province_tensor, region_index, province_tensor_version()), COLORS),
+        height=EXPLORER_HEIGHT
+    )
+    st.divider()
 
-col1, col2, col3, col4 = st.columns(4)
+else:
+    # =========================================================
+    # KPI Metrics
+    # =========================================================
 
-with col1:
-    st.metric(
-        "💍 Total Marriages", 
-        format_number(total_marriages),
-        help="Total number of marriages in selected period/region"
-    )
+    total_marriages, total_divorces = selection_summary["totals"]
+    divorce_rate = calculate_divorce_rate(total_marriages, total_divorces)
 
-with col2:
-    st.metric(
-        "💔 Total Divorces", 
-        format_number(total_divorces),
-        help="Total number of divorces in selected period/region"
-    )
+    col1, col2, col3, col4 = st.columns(4)
 
-with col3:
-    st.metric(
-        "📉 Divorce Rate", 
-        f"{divorce_rate:.2f}%",
-        help="Percentage of divorces relative to marriages"
-    )
+    with col1:
+        st.metric(
+            "💍 Total Marriages", 
+            format_number(total_marriages),
+            help="Total number of marriages in selected period/region"
+        )
 
-with col4:
-    if not df_filt.empty and "Year_BE" in df_filt.columns:
-        years_analyzed = df_filt.Year_BE.nunique()
+    with col2:
         st.metric(
-            "📅 Years Analyzed", 
-            years_analyzed,
-            help="Number of unique years in the filtered dataset"
+            "💔 Total Divorces", 
+            format_number(total_divorces),
+            help="Total number of divorces in selected period/region"
         )
 
-st.divider()
+    with col3:
+        st.metric(
+            "📉 Divorce Rate", 
+            f"{divorce_rate:.2f}%",
+            help="Percentage of divorces relative to marriages"
+        )
 
-# =========================================================
-# Trend Chart
-# =========================================================
+    with col4:
+        years_analyzed = selection_summary["years_observed"]
+        if years_analyzed:
+            st.metric(
+                "📅 Years Analyzed", 
+                years_analyzed,
+                help="Number of unique years in the filtered dataset"
+            )
 
-st.subheader("📈 Marriage vs Divorce Trend")
-
-df_year = df_filt.groupby("Year_BE").sum().reset_index()
-
-fig_trend = go.Figure()
-
-fig_trend.add_trace(go.Scatter(
-    x=df_year.Year_BE, 
-    y=df_year.Marriage, 
-    name="Marriage",
-    line=dict(color=COLORS["marriage"], width=3),
-    mode='lines+markers'
-))
-
-fig_trend.add_trace(go.Scatter(
-    x=df_year.Year_BE, 
-    y=df_year.Divorce, 
-    name="Divorce",
-    line=dict(color=COLORS["divorce"], width=3),
-    mode='lines+markers'
-))
-
-fig_trend.update_layout(
-    title={
-        'text': "Marriage vs Divorce Trend Over Time",
-        'font': {'size': 22, 'color': '#2C3E50', 'family': 'Arial Black'}
-    },
-    xaxis_title="Year (พ.ศ.)",
-    yaxis_title="Count",
-    hovermode="x unified",
-    plot_bgcolor='rgba(240, 242, 245, 0.8)',
-    paper_bgcolor='rgba(0,0,0,0)',
-    font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
-    template="plotly_white",
-    height=450
-)
+    if REGIONAL_CLEANING["imputation"] != "none":
+        cleaned_cells = cleaning_summary(df_filt)
+        st.caption(
+            "🧹 Adjusted figures: outliers replaced ({method} / {imputation}) — ".format(**REGIONAL_CLEANING)
+            + ", ".join(
+                f"{metric} {counts['changed']:,} cells, "
+                f"{df_filt[metric].sum() - df_filt[f'{metric}_raw'].sum():+,.0f} vs official total"
+                for metric, counts in cleaned_cells.items()
+            )
+        )
 
-st.plotly_chart(fig_trend, use_container_width=True)
+    st.divider()
 
-st.divider()
+    # =========================================================
+    # Trend Chart
+    # =========================================================
 
-# =========================================================
-# Top Provinces - Pie Charts
-# =========================================================
+    st.subheader("📈 Marriage vs Divorce Trend")
 
-st.subheader("🏆 Top 5 Provinces")
+    fig_trend = trend_figure(df_year)
 
-col1, col2 = st.columns(2)
+    st.plotly_chart(fig_trend, use_container_width=True)
 
-# Top Divorce Provinces
-top_divorce = (
-    df_filt.groupby("Province")["Divorce"]
-    .sum()
-    .sort_values(ascending=False)
-    .head(5)
-    .reset_index()
-)
+    st.divider()
 
-# Top Marriage Provinces
-top_marriage = (
-    df_filt.groupby("Province")["Marriage"]
-    .sum()
-    .sort_values(ascending=False)
-    .head(5)
-    .reset_index()
-)
+    # =========================================================
+    # Top Provinces - Pie Charts
+    # =========================================================
 
-with col1:
-    # Custom color gradient for Marriage: #FFF2E0 (lowest) to #898AC4 (highest)
-    marriage_colors = ["#1F2287", "#393CA4", "#5557B6", "#7D7FCF", "#B3B4E8"]
+    st.subheader("🏆 Top 5 Provinces")
 
-    fig_pie_m = px.pie(
-        top_marriage, 
-        names="Province", 
-        values="Marriage",
-        title="💍 Top 5 Marriage Provinces",
-        color_discrete_sequence=marriage_colors,
-        hole=0.3  # Makes it a donut chart for modern look
-    )
-    fig_pie_m.update_traces(
-        textposition='inside', 
-        textinfo='percent+label',
-        textfont_size=13,
-        marker=dict(line=dict(color='white', width=2))
-    )
-    fig_pie_m.update_layout(
-        font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
-        title={
-            'font': {'size': 18, 'color': '#2C3E50', 'family': 'Arial Black'}
-        },
-        paper_bgcolor='rgba(0,0,0,0)',
-        showlegend=True,
-        legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5)
-    )
-    st.plotly_chart(fig_pie_m, use_container_width=True)
+    col1, col2 = st.columns(2)
 
-with col2:
-    # Custom color gradient for Divorce: #FEEAC9 (lowest) to #FD7979 (highest)
-    divorce_colors = ["#BA0E0E", "#ED2424", "#FF6D6D", "#FF9696", "#FFB8B8"]
-    fig_pie_d = px.pie(
-        top_divorce, 
-        names="Province", 
-        values="Divorce",
-        title="💔 Top 5 Divorce Provinces",
-        color_discrete_sequence=divorce_colors,
-        hole=0.3  # Makes it a donut chart for modern look
-    )
-    fig_pie_d.update_traces(
-        textposition='inside', 
-        textinfo='percent+label',
-        textfont_size=13,
-        marker=dict(line=dict(color='white', width=2))
+    province_totals = selection_summary["province_totals"]
+
+    # Top Divorce Provinces
+    top_divorce = province_totals.nlargest(5, "Divorce")[["Province", "Divorce"]]
+
+    # Top Marriage Provinces
+    top_marriage = province_totals.nlargest(5, "Marriage")[["Province", "Marriage"]]
+
+    with col1:
+        # Custom color gradient for Marriage: #FFF2E0 (lowest) to #898AC4 (highest)
+        marriage_colors = ("#1F2287", "#393CA4", "#5557B6", "#7D7FCF", "#B3B4E8")
+
+        fig_pie_m = top_provinces_figure(
+            top_marriage, "Marriage", "💍 Top 5 Marriage Provinces", marriage_colors
+        )
+        st.plotly_chart(fig_pie_m, use_container_width=True)
+
+    with col2:
+        # Custom color gradient for Divorce: #FEEAC9 (lowest) to #FD7979 (highest)
+        divorce_colors = ("#BA0E0E", "#ED2424", "#FF6D6D", "#FF9696", "#FFB8B8")
+        fig_pie_d = top_provinces_figure(
+            top_divorce, "Divorce", "💔 Top 5 Divorce Provinces", divorce_colors
+        )
+        st.plotly_chart(fig_pie_d, use_container_width=True)
+
+    st.divider()
+
+    # =========================================================
+    # Regional Marriage Rate Ranking
+    # =========================================================
+
+    st.subheader("💍 Regional Marriage Rate Ranking")
+
+    df_region_rank_marriage = df_region_totals[["Region", "Marriage"]].copy()
+
+    # Calculate marriage rate as percentage of total marriages
+    total_marriages_all = df_region_rank_marriage["Marriage"].sum()
+    df_region_rank_marriage["Marriage_Rate"] = (
+        df_region_rank_marriage["Marriage"] / total_marriages_all * 100
     )
-    fig_pie_d.update_layout(
-        font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
-        title={
-            'font': {'size': 18, 'color': '#2C3E50', 'family': 'Arial Black'}
-        },
-        paper_bgcolor='rgba(0,0,0,0)',
-        showlegend=True,
-        legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5)
+
+    df_region_rank_marriage = df_region_rank_marriage.sort_values("Marriage_Rate", ascending=False)
+
+    # Bar chart with custom color gradient: #FFF2E0 (lowest) to #898AC4 (highest)
+    fig_region_rank_marriage = region_rate_figure(
+        df_region_rank_marriage, "Marriage_Rate", "💍 Marriage Rate (%) by Region", "Marriage Rate (%)",
+        ("#B3B4E8", "#7D7FCF", "#5557B6", "#393CA4", "#1F2287")
     )
-    st.plotly_chart(fig_pie_d, use_container_width=True)
 
-st.divider()
+    st.plotly_chart(fig_region_rank_marriage, use_container_width=True)
 
-# =========================================================
-# Regional Marriage Rate Ranking
-# =========================================================
+    st.divider()
 
-st.subheader("💍 Regional Marriage Rate Ranking")
+    # =========================================================
+    # Regional Divorce Rate Ranking
+    # =========================================================
 
-# Create province to region mapping
-province_to_region = create_province_to_region_mapping(scheme)
+    st.subheader("📊 Regional Divorce Rate Ranking")
 
-df_region_rank_marriage = df_filt.copy()
-df_region_rank_marriage["Region"] = df_region_rank_marriage["Province"].map(province_to_region)
+    df_region_rank = df_region_totals[["Region", "Marriage", "Divorce"]].copy()
 
-# Remove unmapped provinces
-df_region_rank_marriage = df_region_rank_marriage.dropna(subset=["Region"])
+    df_region_rank["Divorce_Rate"] = (
+        df_region_rank["Divorce"] / df_region_rank["Marriage"] * 100
+    )
+
+    df_region_rank = df_region_rank.sort_values("Divorce_Rate", ascending=False)
 
-# Aggregate by region
-df_region_rank_marriage = (
-    df_region_rank_marriage
-    .groupby("Region")
-    .agg(
-        Marriage=("Marriage", "sum")
+    # Bar chart with custom color gradient: #E6D9A2 (lowest) to #624E88 (highest)
+    fig_region_rank = region_rate_figure(
+        df_region_rank, "Divorce_Rate", "📉 Divorce Rate (%) by Region", "Divorce Rate (%)",
+        ("#FFB8B8", "#FF9696", "#FF6D6D", "#ED2424", "#BA0E0E")
     )
-    .reset_index()
-)
 
-# Calculate marriage rate as percentage of total marriages
-total_marriages_all = df_region_rank_marriage["Marriage"].sum()
-df_region_rank_marriage["Marriage_Rate"] = (
-    df_region_rank_marriage["Marriage"] / total_marriages_all * 100
-)
+    st.plotly_chart(fig_region_rank, use_container_width=True)
 
-df_region_rank_marriage = df_region_rank_marriage.sort_values("Marriage_Rate", ascending=False)
-
-# Create bar chart with custom color gradient: #FFF2E0 (lowest) to #898AC4 (highest)
-fig_region_rank_marriage = px.bar(
-    df_region_rank_marriage,
-    x="Region",
-    y="Marriage_Rate",
-    text=df_region_rank_marriage["Marriage_Rate"].round(2),
-    title="💍 Marriage Rate (%) by Region",
-    color="Marriage_Rate",
-    color_continuous_scale=["#B3B4E8", "#7D7FCF", "#5557B6", "#393CA4", "#1F2287"] # Custom gradient
-)
+    # Report provinces the scheme does not assign to any region
+    if unmapped_totals.Provinces > 0:
+        st.caption(
+            f"⚠️ {int(unmapped_totals.Provinces)} provinces in the selection are not assigned to a region "
+            f"in this scheme and are excluded from the rankings "
+            f"({format_number(unmapped_totals.Marriage)} marriages, {format_number(unmapped_totals.Divorce)} divorces)"
+        )
 
-fig_region_rank_marriage.update_traces(textposition="outside", texttemplate='%{text:.2f}%')
-fig_region_rank_marriage.update_layout(
-    title={
-        'text': "💍 Marriage Rate (%) by Region",
-        'font': {'size': 20, 'color': '#2C3E50', 'family': 'Arial Black'}
-    },
-    xaxis_title="Region",
-    yaxis_title="Marriage Rate (%)",
-    yaxis_tickformat=".2f",
-    template="plotly_white",
-    plot_bgcolor='rgba(240, 242, 245, 0.8)',
-    paper_bgcolor='rgba(0,0,0,0)',
-    font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
-    height=400,
-    showlegend=False
+    st.divider()
+
+# =========================================================
+# Regional Trend (materialized rollups)
+# =========================================================
+
+st.subheader("🗺️ Regional Trend")
+
+col1, col2 = st.columns(2)
+with col1:
+    region_trend_metric = st.radio("Metric", ["Divorce", "Marriage"], horizontal=True, key="region_trend_metric")
+with col2:
+    region_trend_grain = st.radio("Granularity", ["Yearly", "Monthly"], horizontal=True, key="region_trend_grain")
+
+df_region_trend = select_rollup(
+    region_rollups[region_trend_grain.lower()], scheme, year_range,
+    region=None if region == "ทั้งหมด" else region
 )
+df_region_trend = df_region_trend[df_region_trend.Provinces > 0]
+
+fig_region_trend = region_trend_figure(df_region_trend, region_trend_metric, region_trend_grain)
 
-st.plotly_chart(fig_region_rank_marriage, use_container_width=True)
+st.plotly_chart(fig_region_trend, use_container_width=True)
 
 st.divider()
 
 # =========================================================
-# Regional Divorce Rate Ranking
+# Province Comparison (one pivot of all provinces, per-province cached traces)
 # =========================================================
 
-st.subheader("📊 Regional Divorce Rate Ranking")
+st.subheader("👥 Province Comparison")
+
+col1, col2 = st.columns([3, 1])
+with col1:
+    compared_provinces = st.multiselect(
+        "Provinces to compare",
+        sorted(province_tensor.province_names),
+        max_selections=COMPARISON_MAX_PROVINCES,
+        key="compare_provinces",
+        placeholder="Choose provinces",
+        help=f"Overlay up to {COMPARISON_MAX_PROVINCES} provinces over the selected year range"
+    )
+with col2:
+    comparison_metric = st.radio(
+        "Metric", ["Divorce_Rate", "Divorce", "Marriage"], horizontal=True, key="comparison_metric",
+        format_func=lambda metric: "Divorce Rate" if metric == "Divorce_Rate" else metric
+    )
+
+if compared_provinces:
+    df_comparison = load_province_comparison(province_tensor, province_tensor_version(), tuple(year_range))
+    is_rate = comparison_metric == "Divorce_Rate"
+    fig_comparison = province_comparison_figure(
+        [
+            comparison_trace(name, df_comparison[comparison_metric][name],
+                             COMPARISON_COLORS[i % len(COMPARISON_COLORS)], ".2f" if is_rate else ",.0f")
+            for i, name in enumerate(compared_provinces)
+        ],
+        title=f"{'Divorce Rate (%)' if is_rate else comparison_metric} by Province "
+              f"({year_range[0]}–{year_range[1]})",
+        yaxis_title="Divorce Rate (%)" if is_rate else "Count"
+    )
+    st.plotly_chart(fig_comparison, use_container_width=True)
 
-# Create province to region mapping
-province_to_region = create_province_to_region_mapping(scheme)
+    if show_data_tables:
+        st.dataframe(df_comparison[comparison_metric][compared_provinces].round(2), use_container_width=True)
+else:
+    st.info("Choose provinces above to overlay their yearly trends")
 
-df_region_rank = df_filt.copy()
-df_region_rank["Region"] = df_region_rank["Province"].map(province_to_region)
+st.divider()
 
-# Remove unmapped provinces
-df_region_rank = df_region_rank.dropna(subset=["Region"])
+# =========================================================
+# Seasonality (batched decomposition, sliced to the selection)
+# =========================================================
 
-# Aggregate by region
-df_region_rank = (
-    df_region_rank
-    .groupby("Region")
-    .agg(
-        Marriage=("Marriage", "sum"),
-        Divorce=("Divorce", "sum")
-    )
-    .reset_index()
-)
+st.subheader("🌀 Seasonality")
 
-df_region_rank["Divorce_Rate"] = (
-    df_region_rank["Divorce"] / df_region_rank["Marriage"] * 100
-)
+seasonal_metric = st.radio("Metric", ["Divorce", "Marriage"], horizontal=True, key="seasonal_metric")
 
-df_region_rank = df_region_rank.sort_values("Divorce_Rate", ascending=False)
-
-# Create bar chart with custom color gradient: #E6D9A2 (lowest) to #624E88 (highest)
-fig_region_rank = px.bar(
-    df_region_rank,
-    x="Region",
-    y="Divorce_Rate",
-    text=df_region_rank["Divorce_Rate"].round(2),
-    title="📉 Divorce Rate (%) by Region",
-    color="Divorce_Rate",
-    color_continuous_scale=["#FFB8B8", "#FF9696", "#FF6D6D", "#ED2424", "#BA0E0E"]  # Custom gradient
-)
+decomposition = load_seasonal_decomposition(province_tensor, region_index, province_tensor_version())
+if province != "ทั้งหมด":
+    seasonal_row = decomposition.row("Province", province)
+elif region != "ทั้งหมด":
+    seasonal_row = decomposition.row("Region", region, scheme)
+else:
+    seasonal_row = decomposition.row("Nation", NATION_LABEL)
 
-fig_region_rank.update_traces(textposition="outside", texttemplate='%{text:.2f}%')
-fig_region_rank.update_layout(
-    title={
-        'text': "📉 Divorce Rate (%) by Region",
-        'font': {'size': 20, 'color': '#2C3E50', 'family': 'Arial Black'}
-    },
-    xaxis_title="Region",
-    yaxis_title="Divorce Rate (%)",
-    yaxis_tickformat=".2f",
-    template="plotly_white",
-    plot_bgcolor='rgba(240, 242, 245, 0.8)',
-    paper_bgcolor='rgba(0,0,0,0)',
-    font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
-    height=400,
-    showlegend=False
-)
+if seasonal_row is None:
+    st.info("No monthly data to decompose for the current selection")
+else:
+    seasonal_name = decomposition.labels.Name.iloc[seasonal_row]
 
-st.plotly_chart(fig_region_rank, use_container_width=True)
+    seasonal_components = decomposition.components(
+        seasonal_row, seasonal_metric, province_tensor.month_slice(year_range)
+    )
+    fig_seasonal = seasonal_decomposition_figure(
+        seasonal_components,
+        f"{seasonal_metric} Decomposition – {seasonal_name}",
+        COLORS[seasonal_metric.lower()]
+    )
+    st.plotly_chart(fig_seasonal, use_container_width=True)
+
+    # Seasonal profile of the full series (calendar months, additive)
+    metric_idx = decomposition.metrics.index(seasonal_metric)
+    profile = decomposition.profile[seasonal_row, :, metric_idx]
+    if np.isfinite(profile).all():
+        st.caption(
+            f"📆 Seasonal strength {decomposition.strength[seasonal_row, metric_idx]:.2f} "
+            f"(0 = none, 1 = purely seasonal) • peak {calendar.month_abbr[int(np.argmax(profile)) + 1]} "
+            f"({profile.max():+,.0f}) • trough {calendar.month_abbr[int(np.argmin(profile)) + 1]} "
+            f"({profile.min():+,.0f}) per month vs trend"
+        )
 
 st.divider()
 
@@ -1081,10 +1363,12 @@ st.divider()
 #     "🔮 Future Forecast",
 #     "🧪 Prophet Scenario Test"
 # ])
-tab1, tab2, tab3 = st.tabs([
+tab1, tab2, tab3, tab4, tab5 = st.tabs([
     "📊 Model Metrics",
     "📉 Rolling Forecast",
-    "🔮 Future Forecast"
+    "🔮 Future Forecast",
+    "🧩 Hierarchical Forecast",
+    "🧪 Marriage Scenarios"
 ])
 # =========================================================
 # TAB 1: Model Metrics
@@ -1093,6 +1377,11 @@ tab1, tab2, tab3 = st.tabs([
 with tab1:
     st.subheader("📊 Model Performance Comparison")
     
+    # Both models scored on the same rolling-origin rounds by the shared metrics engine
+    forecast_cube = None
+    if not arima_roll.empty:
+        forecast_cube = load_backtest_cube(national_data, artifacts["sarimax_rolling"])
+    
     # Create two columns for Prophet and SARIMAX
     col1, col2 = st.columns(2)
     
@@ -1114,13 +1403,8 @@ with tab1:
         st.markdown("**Future Forecast Preview**")
         
         if not prophet_future.empty:
-            # Show first 20 rows of future forecast
-            display_df = prophet_future
-            st.dataframe(
-                display_df,
-                use_container_width=True,
-                hide_index=True
-            )
+            # Show the future forecast 20 rows at a time
+            paginated_dataframe(prophet_future, key="prophet_future_page")
         
     
     # SARIMAX Section - Show Metrics
@@ -1128,23 +1412,18 @@ with tab1:
         st.markdown("### 🟥 SARIMA")
         
         if not metrics_df.empty:
-            # Normalize column names
-            metrics_df.columns = metrics_df.columns.str.upper()
-            
-            # Calculate and display average metrics BEFORE the table
-            st.markdown("**Average Metrics:**")
-            metric_cols = st.columns(3)
-            
-            avg_mae = metrics_df["MAE"].mean()
-            avg_rmse = metrics_df["RMSE"].mean()
-            avg_mape = metrics_df["MAPE"].mean()
-            
-            with metric_cols[0]:
-                st.metric("MAE", f"{avg_mae:.2f}")
-            with metric_cols[1]:
-                st.metric("RMSE", f"{avg_rmse:.2f}")
-            with metric_cols[2]:
-                st.metric("MAPE", f"{avg_mape:.2f}%")
+            # Pooled over every backtest round, as the leaderboard below
+            if forecast_cube is not None:
+                sarima_scores = forecast_cube.scores(("Model",)).set_index("Model").loc["SARIMA"]
+                st.markdown("**Backtest Metrics (all rounds):**")
+                metric_cols = st.columns(3)
+                
+                with metric_cols[0]:
+                    st.metric("MAE", f"{sarima_scores['MAE']:.2f}")
+                with metric_cols[1]:
+                    st.metric("RMSE", f"{sarima_scores['RMSE']:.2f}")
+                with metric_cols[2]:
+                    st.metric("MAPE", f"{sarima_scores['MAPE']:.2f}%")
             
             st.markdown("**Model Metrics**")
             
@@ -1159,6 +1438,38 @@ with tab1:
             )
         else:
             st.warning("⚠️ SARIMA metrics data not loaded")
+    
+    # Leaderboard over the stacked backtests (grouping is a reduction of the same arrays)
+    if forecast_cube is not None:
+        st.divider()
+        st.subheader("🏁 Backtest Leaderboard")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            leaderboard_group = st.radio(
+                "Group by", ["Model", "Model × Round", "Model × Horizon"], horizontal=True, key="leaderboard_group"
+            )
+        with col2:
+            leaderboard_rank = st.selectbox("Rank by", ERROR_METRICS, index=ERROR_METRICS.index("MASE"),
+                                            key="leaderboard_rank")
+        
+        df_leaderboard = leaderboard(
+            forecast_cube,
+            by={"Model": ("Model",), "Model × Round": ("Model", "Round"),
+                "Model × Horizon": ("Model", "Step")}[leaderboard_group],
+            sort_by=leaderboard_rank
+        ).rename(columns={"Step": "Horizon (months)"})
+        st.dataframe(
+            df_leaderboard.style.format(precision=2, subset=ERROR_METRICS).background_gradient(
+                subset=ERROR_METRICS, cmap="YlOrRd"
+            ),
+            use_container_width=True,
+            hide_index=True
+        )
+        st.caption(
+            "MAPE / sMAPE in %. MASE divides by the in-sample seasonal naive error of each round's "
+            "training data (below 1 beats last year's same month). Click a column header to re-sort."
+        )
 
 # =========================================================
 # TAB 2: Rolling Forecast
@@ -1167,71 +1478,7 @@ with tab1:
 with tab2:
     st.subheader("📉 Divorce Forecast Comparison: SARIMA vs Prophet")
     
-    fig_all = go.Figure()
-    
-    # =========================
-    # Actual
-    # =========================
-    if "Divorce" in df.columns and "ds" in df.columns:
-        fig_all.add_trace(go.Scatter(
-            x=df["ds"],
-            y=df["Divorce"],
-            name="Actual",
-            line=dict(color=COLORS["actual"], width=2)
-        ))
-    
-    # =========================
-    # SARIMA Rolling
-    # =========================
-    if not arima_roll.empty:
-        fig_all.add_trace(go.Scatter(
-            x=arima_roll["ds"],
-            y=arima_roll["forecast"],
-            name="SARIMA Rolling",
-            line=dict(color=COLORS["sarimax"], dash="dash")
-        ))
-    
-    # =========================
-    # SARIMAX Future
-    # =========================
-    if not arima_future.empty:
-        fig_all.add_trace(go.Scatter(
-            x=arima_future["ds"],
-            y=arima_future["yhat"],
-            name="SARIMA Future",
-            line=dict(color=COLORS["sarimax"], dash="dash", width=2)
-        ))
-    
-    # =========================
-    # Prophet Future
-    # =========================
-    if not prophet_future.empty:
-        fig_all.add_trace(go.Scatter(
-            x=prophet_future["ds"],
-            y=prophet_future["yhat"],
-            name="Prophet Future",
-            line=dict(color=COLORS["prophet"], dash="dash", width=2)
-        ))
-    
-    # =========================
-    # Layout
-    # =========================
-    fig_all.update_layout(
-        title={
-            'text': "Divorce Forecast Comparison: SARIMA vs Prophet",
-            'font': {'size': 22, 'color': '#2C3E50', 'family': 'Arial Black'}
-        },
-        xaxis_title="Date",
-        yaxis_title="Number of Divorces",
-        hovermode="x unified",
-        template="plotly_white",
-        plot_bgcolor='rgba(240, 242, 245, 0.8)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
-        xaxis={'gridcolor': '#E1E8ED'},
-        yaxis={'gridcolor': '#E1E8ED'},
-        height=700
-    )
+    fig_all = forecast_comparison_figure(df, arima_roll, arima_forecast, prophet_prediction)
     
     st.plotly_chart(fig_all, use_container_width=True)
     
@@ -1247,8 +1494,8 @@ with tab2:
                     st.warning("⚠️ SARIMAX rolling forecast data not loaded")
             with col2:
                 st.markdown("**Future Forecasts**")
-                if not arima_future.empty:
-                    st.dataframe(arima_future.head(20), use_container_width=True)
+                if not arima_forecast.empty:
+                    st.dataframe(arima_forecast.head(20), use_container_width=True)
                 if not prophet_future.empty:
                     st.dataframe(prophet_future.head(20), use_container_width=True)
 
@@ -1260,7 +1507,7 @@ with tab3:
     st.subheader("🔮 Future Forecast Predictions")
     
     # User input for forecast horizon
-    max_forecast_months = max(len(prophet_future), len(arima_future)) if not prophet_future.empty or not arima_future.empty else 60
+    max_forecast_months = max(len(prophet_future), len(arima_forecast)) if not prophet_future.empty or not arima_forecast.empty else PROPHET_MAX_HORIZON
     
     forecast_months = st.slider(
         "Select number of months to display",
@@ -1271,73 +1518,14 @@ with tab3:
         help="Adjust the forecast horizon"
     )
     
-    # Prepare actual data from divorce_all_model.csv (using 'Divorce' column)
-    if "Divorce" in df.columns and "ds" in df.columns:
-        actual_data = df[["ds", "Divorce"]].copy()
-    else:
-        actual_data = pd.DataFrame()
-    
     # Create sub-tabs for each model
     sub_tab1, sub_tab2, sub_tab3 = st.tabs(["Prophet", "SARIMAX", "Combined View"])
     
     # Prophet Sub-tab
     with sub_tab1:
         if "Prophet" in models_to_show and not prophet_future.empty:
-            fig_prophet = go.Figure()
-            
-            # Add actual values
-            if not actual_data.empty:
-                fig_prophet.add_trace(go.Scatter(
-                    x=actual_data["ds"],
-                    y=actual_data["Divorce"],
-                    name="Actual (Historical)",
-                    line=dict(color=COLORS["actual"], width=2)
-                ))
-            
-            # Add Prophet forecast
+            fig_prophet = prophet_future_figure(df, prophet_future, forecast_months, show_confidence_intervals)
             prophet_subset = prophet_future.head(forecast_months)
-            fig_prophet.add_trace(go.Scatter(
-                x=prophet_subset["ds"],
-                y=prophet_subset["yhat"],
-                name="Future Forecast",
-                line=dict(color=COLORS["prophet"], dash="dash", width=2)
-            ))
-            
-            # Add confidence intervals
-            if show_confidence_intervals and "yhat_upper" in prophet_subset.columns and "yhat_lower" in prophet_subset.columns:
-                fig_prophet.add_trace(go.Scatter(
-                    x=prophet_subset["ds"],
-                    y=prophet_subset["yhat_upper"],
-                    line=dict(width=0),
-                    showlegend=False,
-                    hoverinfo='skip'
-                ))
-                
-                fig_prophet.add_trace(go.Scatter(
-                    x=prophet_subset["ds"],
-                    y=prophet_subset["yhat_lower"],
-                    fill="tonexty",
-                    fillcolor="rgba(99, 110, 250, 0.15)",
-                    line=dict(width=0),
-                    name="Confidence Interval"
-                ))
-            
-            fig_prophet.update_layout(
-                title={
-                    'text': f"Future Forecast of Divorce Cases (Prophet – {forecast_months} months)",
-                    'font': {'size': 20, 'color': '#2C3E50', 'family': 'Arial Black'}
-                },
-                xaxis_title="Date",
-                yaxis_title="Number of Divorces",
-                hovermode="x unified",
-                template="plotly_white",
-                plot_bgcolor='rgba(240, 242, 245, 0.8)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
-                xaxis={'gridcolor': '#E1E8ED'},
-                yaxis={'gridcolor': '#E1E8ED'},
-                height=600
-            )
             
             st.plotly_chart(fig_prophet, use_container_width=True)
             
@@ -1349,63 +1537,25 @@ with tab3:
     
     # SARIMAX Sub-tab
     with sub_tab2:
-        if "SARIMAX" in models_to_show and not arima_future.empty:
-            fig_arima = go.Figure()
-            
-            # Add actual values
-            if not actual_data.empty:
-                fig_arima.add_trace(go.Scatter(
-                    x=actual_data["ds"],
-                    y=actual_data["Divorce"],
-                    name="Actual (Historical)",
-                    line=dict(color=COLORS["actual"], width=3)
-                ))
-            
-            # Add SARIMAX forecast
-            arima_subset = arima_future.head(forecast_months)
-            fig_arima.add_trace(go.Scatter(
-                x=arima_subset["ds"],
-                y=arima_subset["yhat"],
-                name="SARIMAX Forecast",
-                line=dict(color=COLORS["sarimax"], width=2, dash="dash")
-            ))
+        if "SARIMAX" in models_to_show and not arima_forecast.empty:
+            fig_arima = sarima_future_figure(df, arima_forecast, forecast_months, show_confidence_intervals)
+            arima_subset = arima_forecast.head(forecast_months)
             
-            # Add bounds if available
-            if show_confidence_intervals and "cap" in arima_subset.columns and "floor" in arima_subset.columns:
-                fig_arima.add_trace(go.Scatter(
-                    x=arima_subset["ds"],
-                    y=arima_subset["cap"],
-                    name="Upper Bound (Cap)",
-                    line=dict(color=COLORS["sarimax"], width=1, dash="dash"),
-                    opacity=0.3
-                ))
-                fig_arima.add_trace(go.Scatter(
-                    x=arima_subset["ds"],
-                    y=arima_subset["floor"],
-                    name="Lower Bound (Floor)",
-                    line=dict(color=COLORS["sarimax"], width=1, dash="dash"),
-                    fill='tonexty',
-                    opacity=0.2
-                ))
+            st.plotly_chart(fig_arima, use_container_width=True)
             
-            fig_arima.update_layout(
-                title={
-                    'text': f"SARIMA Future Forecast ({forecast_months} months)",
-                    'font': {'size': 20, 'color': '#2C3E50', 'family': 'Arial Black'}
-                },
-                xaxis_title="Date",
-                yaxis_title="Predicted Divorce Count",
-                hovermode="x unified",
-                template="plotly_white",
-                plot_bgcolor='rgba(240, 242, 245, 0.8)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
-                xaxis={'gridcolor': '#E1E8ED'},
-                yaxis={'gridcolor': '#E1E8ED'},
-                height=600
+            sarima_status_text = {
+                "fitted": "fitted from scratch and saved",
+                "current": "loaded from the saved state",
+                "updated": "new months filtered through the saved parameters (no refit)",
+                "refiltered": "revised history re-filtered with the saved parameters (no refit)",
+                "static": "saved forecast file",
+            }
+            # Orders come from the state file (it may hold an auto_sarima selection)
+            sarima_orders = (
+                (SARIMA_ORDER, SARIMA_SEASONAL_ORDER) if sarima_status == "static"
+                else (sarima_results.model.order, sarima_results.model.seasonal_order)
             )
-            
-            st.plotly_chart(fig_arima, use_container_width=True)
+            st.caption(f"🧮 SARIMA{sarima_orders[0]}x{sarima_orders[1]}: {sarima_status_text[sarima_status]}")
             
             # Show data table
             if show_data_tables:
@@ -1417,60 +1567,239 @@ with tab3:
     with sub_tab3:
         st.markdown("**Combined Model Comparison**")
         
-        fig_combined = go.Figure()
-        
-        # =========================
-        # Actual
-        # =========================
-        if not actual_data.empty:
-            fig_combined.add_trace(go.Scatter(
-                x=actual_data["ds"],
-                y=actual_data["Divorce"],
-                name="Actual",
-                line=dict(color=COLORS["actual"], width=2)
-            ))
-        
-        # # =========================
-        # # SARIMAX Rolling
-        # # =========================
-        # if not arima_roll.empty:
-        #     fig_combined.add_trace(go.Scatter(
-        #         x=arima_roll["ds"],
-        #         y=arima_roll["forecast"],
-        #         name="SARIMAX Rolling",
-        #         line=dict(color=COLORS["sarimax"], dash="dot")
-        #     ))
+        # Backtest-weighted ensemble of the two models
+        ensemble_future = pd.DataFrame()
+        if not prophet_future.empty and not arima_forecast.empty and not arima_roll.empty:
+            ensemble_future, _ = build_ensemble_forecast(
+                national_data, prophet_future, arima_forecast, artifacts["sarimax_rolling"]
+            )
+            ensemble_subset = ensemble_future.head(forecast_months)
         
-        # =========================
-        # SARIMAX Future
-        # =========================
-        if "SARIMAX" in models_to_show and not arima_future.empty:
-            arima_subset = arima_future.head(forecast_months)
-            fig_combined.add_trace(go.Scatter(
-                x=arima_subset["ds"],
-                y=arima_subset["yhat"],
-                name="SARIMA Future",
-                line=dict(color=COLORS["sarimax"], dash="dash", width=2)
-            ))
+        fig_combined = combined_future_figure(
+            df,
+            prophet_future if "Prophet" in models_to_show else pd.DataFrame(),
+            arima_forecast if "SARIMAX" in models_to_show else pd.DataFrame(),
+            ensemble_future, forecast_months, show_confidence_intervals
+        )
         
-        # =========================
-        # Prophet Future
-        # =========================
-        if "Prophet" in models_to_show and not prophet_future.empty:
-            prophet_subset = prophet_future.head(forecast_months)
-            fig_combined.add_trace(go.Scatter(
-                x=prophet_subset["ds"],
-                y=prophet_subset["yhat"],
-                name="Prophet Future",
-                line=dict(color=COLORS["prophet"], dash="dash", width=2)
+        st.plotly_chart(fig_combined, use_container_width=True)
+
+        if not ensemble_future.empty:
+            avg_weights = ensemble_subset[["weight_Prophet", "weight_SARIMA"]].mean()
+            st.caption(
+                f"⚖️ Ensemble weights (inverse backtest MSE per horizon step, averaged over "
+                f"{forecast_months} months): Prophet {avg_weights['weight_Prophet']:.0%} • "
+                f"SARIMA {avg_weights['weight_SARIMA']:.0%}"
+            )
+            if show_data_tables:
+                st.dataframe(ensemble_subset, use_container_width=True, hide_index=True)
+
+# =========================================================
+# TAB 4: Hierarchical Forecast
+# =========================================================
+
+with tab4:
+    st.subheader("🧩 Hierarchical Forecast (Nation → Region → Province)")
+    st.caption(
+        "Base forecasts are fitted for every node and reconciled so province, "
+        "region and national numbers add up."
+    )
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        hier_metric = st.selectbox("Metric", ["Divorce", "Marriage"], index=0)
+    with col2:
+        hier_method = st.selectbox(
+            "Reconciliation method",
+            list(RECONCILIATION_METHODS.keys()),
+            format_func=lambda m: RECONCILIATION_METHODS[m]
+        )
+    with col3:
+        hier_horizon = st.slider(
+            "Forecast months", min(HIERARCHY_HORIZONS), max(HIERARCHY_HORIZONS),
+            HIERARCHY_HORIZONS[0], step=12
+        )
+
+    hier = reconcile_regional_forecast(regional_data, scheme, hier_metric, hier_horizon, hier_method)
+    nodes = hier["nodes"]
+
+    # Node for the current sidebar selection
+    if province != "ทั้งหมด":
+        node_mask = (nodes.Level == "Province") & (nodes.Name == province)
+    elif region != "ทั้งหมด":
+        node_mask = (nodes.Level == "Region") & (nodes.Name == region)
+    else:
+        node_mask = nodes.Level == "Nation"
+
+    if not node_mask.any():
+        st.info("No regional data available for the current selection")
+    else:
+        node_idx = int(np.flatnonzero(node_mask)[0])
+        node_name = nodes.Name.iloc[node_idx]
+
+        fig_hier = go.Figure()
+        fig_hier.add_trace(go.Scatter(
+            x=hier["dates"],
+            y=hier["history"][node_idx],
+            name="Actual",
+            line=dict(color=COLORS["actual"], width=2)
+        ))
+        fig_hier.add_trace(go.Scatter(
+            x=hier["future_dates"],
+            y=hier["base"][node_idx],
+            name="Base Forecast",
+            line=dict(color=COLORS["warning"], dash="dot", width=2)
+        ))
+        fig_hier.add_trace(go.Scatter(
+            x=hier["future_dates"],
+            y=hier["reconciled"][node_idx],
+            name="Reconciled Forecast",
+            line=dict(color=COLORS["primary"], dash="dash", width=2)
+        ))
+        fig_hier.update_layout(
+            title={
+                'text': f"{hier_metric} Forecast – {node_name}",
+                'font': {'size': 20, 'color': '#2C3E50', 'family': 'Arial Black'}
+            },
+            xaxis_title="Date",
+            yaxis_title=f"Number of {hier_metric}",
+            hovermode="x unified",
+            template="plotly_white",
+            plot_bgcolor='rgba(240, 242, 245, 0.8)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
+            xaxis={'gridcolor': '#E1E8ED'},
+            yaxis={'gridcolor': '#E1E8ED'},
+            height=550
+        )
+        st.plotly_chart(fig_hier, use_container_width=True)
+
+        # Coherence check: every level sums to the same national total
+        level_totals = (
+            pd.DataFrame({
+                "Level": nodes.Level,
+                "Base": hier["base"].sum(axis=1),
+                "Reconciled": hier["reconciled"].sum(axis=1)
+            })
+            .groupby("Level", sort=False)
+            .sum()
+            .reset_index()
+        )
+        st.markdown(f"**Total over {hier_horizon} months by level** (reconciled levels all match {NATION_LABEL})")
+        st.dataframe(
+            level_totals.style.format(precision=0),
+            use_container_width=True,
+            hide_index=True
+        )
+
+        # Every reconciliation run is kept in the forecast store; compare this node's runs over the same months
+        with st.expander("🕘 Earlier runs of this forecast"):
+            run_history = get_forecast_store().history(
+                f"Reconciled ({hier_method})",
+                node_series(nodes.iloc[[node_idx]], hier_metric, scheme)[0],
+                start=hier["future_dates"][0], end=hier["future_dates"][-1]
+            )
+            runs_total = (
+                run_history.groupby(["version", "created"], as_index=False)
+                .agg(yhat=("yhat", "sum"), months=("ds", "count"))
+                .query("months == @hier_horizon")
+                .drop(columns="months")
+                .sort_values("created", ascending=False)
+            )
+            if len(runs_total) < 2:
+                st.caption("No earlier runs covering these months are recorded for this node yet.")
+            else:
+                current = runs_total.loc[runs_total["version"] == hier["version"], "yhat"]
+                current_total = current.iloc[0] if len(current) else runs_total["yhat"].iloc[0]
+                runs_total["Change vs shown run (%)"] = 100 * (current_total / runs_total["yhat"] - 1)
+                st.dataframe(
+                    runs_total.rename(columns={
+                        "version": "Run", "created": "Recorded", "yhat": f"Total over {hier_horizon} months"
+                    }).assign(Run=lambda t: t["Run"].str[:10]).style.format(precision=1),
+                    use_container_width=True,
+                    hide_index=True
+                )
+
+# =========================================================
+# TAB 5: Marriage Scenarios
+# =========================================================
+
+with tab5:
+    st.subheader("🧪 Marriage Scenarios")
+    st.caption(
+        "Prophet is fitted once with monthly marriages as an extra regressor. Each scenario changes the "
+        "marriage path (baseline: last year's months repeated) and every scenario comes out of one prediction."
+    )
+
+    scenario_horizon = st.slider(
+        "Scenario months", 12, PROPHET_MAX_HORIZON, SCENARIO_DEFAULT_HORIZON, step=12, key="scenario_horizon"
+    )
+
+    # Default what-ifs; the shock hits the first full forecast year (Buddhist Era, as in the filters)
+    shock_year_be = df["ds"].max().year + 1 + 543
+    scenario_table = st.data_editor(
+        pd.DataFrame({
+            "Scenario": [
+                "Baseline", "Marriages +5% / year", "Marriages -5% / year", f"Shock -20% in {shock_year_be}"
+            ],
+            "Annual growth (%)": [0.0, 5.0, -5.0, 0.0],
+            "Shock year (BE)": [None, None, None, shock_year_be],
+            "Shock (%)": [0.0, 0.0, 0.0, -20.0],
+        }),
+        num_rows="dynamic",
+        use_container_width=True,
+        hide_index=True,
+        key="marriage_scenarios",
+        column_config={
+            "Annual growth (%)": st.column_config.NumberColumn(format="%.1f", min_value=-90.0, max_value=200.0),
+            "Shock year (BE)": st.column_config.NumberColumn(format="%d", step=1),
+            "Shock (%)": st.column_config.NumberColumn(format="%.1f", min_value=-100.0, max_value=500.0),
+        }
+    )
+
+    # Rows without a name are ignored; the first row is the reference for the comparison table
+    scenario_rows = scenario_table.dropna(subset=["Scenario"])
+    scenario_rows = scenario_rows[scenario_rows["Scenario"].str.strip() != ""].drop_duplicates("Scenario")
+    scenarios = tuple(
+        MarriageScenario(
+            name=str(row["Scenario"]),
+            annual_growth=float(np.nan_to_num(row["Annual growth (%)"])),
+            shock_year=int(row["Shock year (BE)"]) - 543 if pd.notna(row["Shock year (BE)"]) else None,
+            shock=float(np.nan_to_num(row["Shock (%)"])),
+        )
+        for _, row in scenario_rows.iterrows()
+    )
+
+    if MARRIAGE not in df.columns:
+        st.info("Marriage counts are not available in the national data")
+    elif not scenarios:
+        st.info("Add at least one named scenario")
+    else:
+        scenario_forecast, marriage_coefficient = run_marriage_scenarios(
+            national_data, scenarios, scenario_horizon, uncertainty_samples
+        )
+        st.caption(f"Fitted effect: {marriage_coefficient * 1000:,.1f} divorces per 1,000 extra marriages in a month")
+
+        fig_scenarios = go.Figure()
+        actual = _actual_trace(df, "Actual")
+        if actual is not None:
+            fig_scenarios.add_trace(actual)
+        for i, (name, path) in enumerate(scenario_forecast.groupby("Scenario", sort=False)):
+            color = COMPARISON_COLORS[i % len(COMPARISON_COLORS)]
+            fig_scenarios.add_trace(go.Scatter(
+                x=path["ds"], y=path["yhat"], name=name,
+                line=dict(color=color, dash="dash" if i else "solid", width=2)
             ))
-        
-        # =========================
-        # Layout
-        # =========================
-        fig_combined.update_layout(
+            if show_confidence_intervals and i == 0 and "yhat_lower" in path.columns:
+                fig_scenarios.add_trace(go.Scatter(
+                    x=pd.concat([path["ds"], path["ds"][::-1]]),
+                    y=pd.concat([path["yhat_upper"], path["yhat_lower"][::-1]]),
+                    fill="toself", fillcolor="rgba(31, 119, 180, 0.12)", line=dict(width=0),
+                    name=f"{name} interval", hoverinfo="skip"
+                ))
+        fig_scenarios.update_layout(
             title={
-                'text': "Divorce Forecast Comparison: SARIMA vs Prophet",
+                'text': f"Divorce Forecast under Marriage Scenarios ({scenario_horizon} months)",
                 'font': {'size': 20, 'color': '#2C3E50', 'family': 'Arial Black'}
             },
             xaxis_title="Date",
@@ -1482,10 +1811,26 @@ with tab3:
             font=dict(family="Arial, sans-serif", size=12, color="#2C3E50"),
             xaxis={'gridcolor': '#E1E8ED'},
             yaxis={'gridcolor': '#E1E8ED'},
-            height=700
+            height=550
         )
-        
-        st.plotly_chart(fig_combined, use_container_width=True)
+        st.plotly_chart(fig_scenarios, use_container_width=True)
+
+        scenario_totals = (
+            scenario_forecast.groupby("Scenario", sort=False)[[MARRIAGE, "yhat"]].sum()
+            .rename(columns={MARRIAGE: "Marriages", "yhat": "Divorces"})
+        )
+        reference = scenario_totals.index[0]
+        scenario_totals[f"Divorces vs {reference} (%)"] = (
+            100 * (scenario_totals["Divorces"] / scenario_totals.loc[reference, "Divorces"] - 1)
+        )
+        st.markdown(f"**Totals over {scenario_horizon} months**")
+        st.dataframe(
+            scenario_totals.reset_index().style.format(precision=1, thousands=","),
+            use_container_width=True,
+            hide_index=True
+        )
+        if show_data_tables:
+            st.dataframe(scenario_forecast, use_container_width=True, hide_index=True)
 
 # # =========================================================
 # # TAB 4: Prophet Scenario Test
@@ -1764,6 +2109,63 @@ with tab3:
 #     except Exception as e:
 #         st.error(f"❌ An error occurred: {str(e)}")
 
+# =========================================================
+# Data Export
+# =========================================================
+
+st.divider()
+st.subheader("📥 Export Data")
+
+export_options = {
+    "Filtered rows": df_filt,
+    "Yearly totals": df_year,
+    "Region totals": df_region_totals,
+    "Prophet forecast": prophet_future,
+    "SARIMA forecast": arima_forecast,
+}
+
+col1, col2 = st.columns([3, 1])
+with col1:
+    export_selection = st.multiselect(
+        "Tables to export",
+        list(export_options.keys()),
+        default=list(export_options.keys()),
+        help="Exports follow the current sidebar filters"
+    )
+with col2:
+    export_format = st.selectbox("Format", available_export_formats())
+
+if show_data_tables:
+    with st.expander("📋 View Filtered Rows"):
+        cleaned_cells = cleaning_summary(df_filt)
+        st.caption(
+            "🧹 Outlier cleaning ({method} / {imputation}): ".format(**REGIONAL_CLEANING)
+            + ", ".join(
+                f"{metric} {counts['flagged']:,} cells flagged, {counts['changed']:,} replaced"
+                for metric, counts in cleaned_cells.items()
+            )
+            + " — original values in the *_raw columns, flags in *_outlier"
+        )
+        paginated_dataframe(df_filt, key="filtered_rows_page")
+
+if export_selection:
+    export_selected = {
+        name.lower().replace(" ", "_"): export_options[name] for name in export_selection
+    }
+
+    def build_export() -> bytes:
+        """Serialize the selected tables only when the download is clicked"""
+        with export_tables(export_selected, export_format) as out:
+            return out.read()
+
+    st.download_button(
+        f"⬇️ Download {export_format}",
+        data=build_export,
+        file_name=export_file_name(f"divorce_dashboard_{year_range[0]}_{year_range[1]}", export_format),
+        mime=export_mime(export_format),
+        use_container_width=True
+    )
+
 # =========================================================
 # Footer
 # =========================================================
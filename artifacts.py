@@ -0,0 +1,157 @@
+# =========================================================
+# Artifact Registry - parallel CSV loading with change detection
+# =========================================================
+
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import pandas as pd
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def file_signature(path: str) -> Tuple[int, int]:
+    """Cheap change check: (mtime in ns, size in bytes)"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+@dataclass(frozen=True, eq=False)
+class DataHandle:
+    """
+    A loaded dataset together with its content fingerprint
+    Cached functions take handles instead of frames and key on the fingerprint
+    (see HANDLE_HASH_FUNCS), so a cache lookup hashes one short string however
+    large the frame is. version counts content changes seen by the registry.
+    """
+    name: str
+    frame: pd.DataFrame
+    fingerprint: str
+    version: int = 1
+
+    def derive(self, label: str, frame: pd.DataFrame) -> "DataHandle":
+        """
+        Handle for a frame computed deterministically from this one
+        label must identify the derivation, since the fingerprint is built from it, not the frame.
+        """
+        fingerprint = hashlib.sha1(f"{self.fingerprint}:{label}".encode()).hexdigest()
+        return DataHandle(f"{self.name}:{label}", frame, fingerprint, self.version)
+
+
+# hash_funcs for st.cache_data / st.cache_resource functions taking DataHandle arguments
+HANDLE_HASH_FUNCS = {DataHandle: lambda handle: handle.fingerprint}
+
+
+class ArtifactRegistry:
+    """
+    Loads every CSV artifact from DATA_FILES and keeps it until the file changes
+    Each rerun only stats the files. A file whose mtime/size moved is re-read and
+    hashed, and it is parsed again only when its content hash differs, so a touched
+    but identical file costs one read and a replaced file reloads on its own.
+    Args:
+        settings: Per-artifact postprocess options folded into the fingerprint, so
+            handles change when the loaded frame would, not only when the file does
+    """
+
+    def __init__(self, files: Dict[str, str], parse_dates: Optional[Dict[str, List[str]]] = None,
+                 postprocess: Optional[Dict[str, Callable[[pd.DataFrame], pd.DataFrame]]] = None,
+                 settings: Optional[Dict[str, Any]] = None, max_workers: int = 8):
+        self.files = dict(files)
+        self.parse_dates = parse_dates or {}
+        self.postprocess = postprocess or {}
+        self.settings = settings or {}
+        self.max_workers = max_workers
+        self.errors: Dict[str, str] = {}
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _read(self, name: str, signature: Tuple[int, int]) -> Dict:
+        """Read, hash and (if the content changed) parse one artifact"""
+        with open(self.files[name], "rb") as f:
+            raw = f.read()
+        content_hash = hashlib.sha1(raw).hexdigest()
+
+        cached = self._entries.get(name)
+        if cached is not None and cached["hash"] == content_hash:
+            return dict(cached, signature=signature)
+
+        df = pd.read_csv(io.BytesIO(raw), parse_dates=self.parse_dates.get(name, False))
+        if name in self.postprocess:
+            df = self.postprocess[name](df)
+
+        fingerprint = content_hash
+        if name in self.settings:
+            fingerprint = hashlib.sha1(f"{content_hash}:{self.settings[name]!r}".encode()).hexdigest()
+        return {"signature": signature, "hash": content_hash, "fingerprint": fingerprint, "frame": df}
+
+    def refresh(self, names: Optional[List[str]] = None) -> List[str]:
+        """
+        Reload artifacts whose files changed, reading them concurrently
+        Returns: names of the artifacts that were (re)parsed
+        """
+        names = list(self.files) if names is None else names
+
+        with self._lock:
+            stale = {}
+            for name in names:
+                try:
+                    signature = file_signature(self.files[name])
+                except OSError as e:
+                    self.errors[name] = f"File not found: {self.files[name]} ({e.strerror})"
+                    self._entries.pop(name, None)
+                    continue
+                cached = self._entries.get(name)
+                if cached is None or cached["signature"] != signature:
+                    stale[name] = signature
+
+            if not stale:
+                return []
+
+            reloaded = []
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(stale))) as pool:
+                futures = {name: pool.submit(self._read, name, sig) for name, sig in stale.items()}
+            for name, future in futures.items():
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    self.errors[name] = f"Error loading {self.files[name]}: {str(e)}"
+                    self._entries.pop(name, None)
+                    continue
+                self.errors.pop(name, None)
+                previous = self._entries.get(name)
+                if previous is None or previous["hash"] != entry["hash"]:
+                    reloaded.append(name)
+                    entry["version"] = previous["version"] + 1 if previous is not None else 1
+                self._entries[name] = entry
+            return reloaded
+
+    def get(self, name: str) -> pd.DataFrame:
+        """Artifact frame (shallow copy, so callers can add columns safely); empty if unavailable"""
+        entry = self._entries.get(name)
+        if entry is None:
+            return pd.DataFrame()
+        return entry["frame"].copy(deep=False)
+
+    def fingerprint(self, name: str) -> str:
+        """Content hash of the artifact currently loaded (with its settings), "" if unavailable"""
+        entry = self._entries.get(name)
+        return entry["fingerprint"] if entry is not None else ""
+
+    def handle(self, name: str) -> DataHandle:
+        """Artifact frame (shallow copy, as get) with its precomputed fingerprint"""
+        entry = self._entries.get(name)
+        if entry is None:
+            return DataHandle(name, pd.DataFrame(), "", 0)
+        return DataHandle(name, entry["frame"].copy(deep=False), entry["fingerprint"], entry["version"])
+
+    def load_all(self) -> Dict[str, pd.DataFrame]:
+        """Refresh every artifact and return name -> frame"""
+        self.refresh()
+        return {name: self.get(name) for name in self.files}
+
+    def load_handles(self) -> Dict[str, DataHandle]:
+        """Refresh every artifact and return name -> handle"""
+        self.refresh()
+        return {name: self.handle(name) for name in self.files}
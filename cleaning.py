@@ -0,0 +1,204 @@
+# =========================================================
+# Outlier Cleaning - rolling IQR / MAD per province (ingestion stage)
+# =========================================================
+
+import warnings
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Tuple
+
+from regional_store import METRICS
+from province_tensor import tensor_coordinates
+
+# Centered rolling window (months) used for the local quartiles / median
+CLEANING_WINDOW = 13
+SEASON_LENGTH = 12
+
+# method -> default threshold (IQR "far out" fences k * IQR, MAD robust z-score)
+OUTLIER_METHODS = {
+    "iqr": 3.0,
+    "mad": 3.5,
+}
+
+# How flagged cells are replaced ("none" only flags them)
+IMPUTATION_METHODS = ["median", "clip", "interpolate", "none"]
+
+# Scale floor (counts) so provinces with near-constant small counts are not all flagged
+MIN_SCALE = 1.0
+
+# Consistency constant turning MAD into a standard deviation estimate
+MAD_TO_SIGMA = 1.4826
+
+
+def _rolling_windows(cube: np.ndarray, window: int) -> np.ndarray:
+    """
+    Centered windows over the month axis of a (provinces, months, metrics) cube
+    Edges are padded with NaN so short windows only use the months that exist.
+    Returns a strided view of shape (provinces, months, metrics, window)
+    """
+    half = window // 2
+    padded = np.pad(cube, ((0, 0), (half, half), (0, 0)), constant_values=np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window, axis=1)
+    return windows
+
+
+def _nan_quantiles(windows: np.ndarray, quantiles: List[float]) -> List[np.ndarray]:
+    """
+    Linear-interpolated quantiles over the last axis ignoring NaN
+    One sort of all windows instead of np.nanpercentile's per-window path.
+    """
+    ordered = np.sort(windows, axis=-1)  # NaN sort last
+    valid = np.count_nonzero(~np.isnan(ordered), axis=-1)
+    last = np.maximum(valid - 1, 0)
+
+    results = []
+    for q in quantiles:
+        position = last * q
+        low = np.floor(position).astype(np.intp)
+        high = np.minimum(low + 1, last)
+        frac = position - low
+        lower = np.take_along_axis(ordered, low[..., None], axis=-1)[..., 0]
+        upper = np.take_along_axis(ordered, high[..., None], axis=-1)[..., 0]
+        value = lower + (upper - lower) * frac
+        results.append(np.where(valid > 0, value, np.nan))
+    return results
+
+
+def seasonal_factors(cube: np.ndarray, first_month: int = 0, window: int = CLEANING_WINDOW,
+                     season: int = SEASON_LENGTH) -> np.ndarray:
+    """
+    Multiplicative month-of-year factors per province and metric
+    Marriages cluster in auspicious months, so without this the rolling fences
+    would flag every seasonal peak. Each factor is the median, over years, of
+    value / rolling median for that calendar month, normalized to mean 1.
+    Args:
+        first_month: Calendar position (0 = January) of the first month on the axis
+    Returns: factors broadcast to the cube shape (1 where undefined)
+    """
+    with warnings.catch_warnings(), np.errstate(divide="ignore", invalid="ignore"):
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        level, = _nan_quantiles(_rolling_windows(cube, window), [0.5])
+        ratio = np.where(level > 0, cube / level, np.nan)
+
+        positions = (first_month + np.arange(cube.shape[1])) % season
+        profile = np.stack(
+            [np.nanmedian(ratio[:, positions == j], axis=1) for j in range(season)], axis=1
+        )
+        profile = profile / np.nanmean(profile, axis=1, keepdims=True)
+
+    profile = np.where(np.isfinite(profile) & (profile > 0), profile, 1.0)
+    return profile[:, positions]
+
+
+def outlier_bounds(cube: np.ndarray, method: str = "iqr", threshold: float = None,
+                   window: int = CLEANING_WINDOW) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Local lower/upper bounds and rolling median for every (province, month, metric) cell
+    Args:
+        cube: Float array (provinces, months, metrics), NaN where a month was not reported
+        method: One of OUTLIER_METHODS
+        threshold: Fence multiplier (defaults to OUTLIER_METHODS[method])
+        window: Centered rolling window in months
+    Returns: (lower, upper, median), each shaped like cube
+    """
+    if method not in OUTLIER_METHODS:
+        raise ValueError(f"Unknown outlier method: {method}")
+    k = OUTLIER_METHODS[method] if threshold is None else threshold
+
+    windows = _rolling_windows(cube, window)
+    with warnings.catch_warnings():
+        # All-NaN windows (months before a province existed) yield NaN bounds, never flags
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        if method == "iqr":
+            q1, median, q3 = _nan_quantiles(windows, [0.25, 0.5, 0.75])
+            scale = np.maximum(q3 - q1, MIN_SCALE)
+            return q1 - k * scale, q3 + k * scale, median
+
+        median, = _nan_quantiles(windows, [0.5])
+        mad, = _nan_quantiles(np.abs(windows - median[..., None]), [0.5])
+        scale = np.maximum(MAD_TO_SIGMA * mad, MIN_SCALE)
+        return median - k * scale, median + k * scale, median
+
+
+def _interpolate_months(cube: np.ndarray, flags: np.ndarray) -> np.ndarray:
+    """Linear interpolation over flagged months, all provinces/metrics at once"""
+    provinces, months, metrics = cube.shape
+    wide = np.where(flags, np.nan, cube).transpose(1, 0, 2).reshape(months, provinces * metrics)
+    filled = pd.DataFrame(wide).interpolate(method="linear", limit_direction="both").to_numpy()
+    return filled.reshape(months, provinces, metrics).transpose(1, 0, 2)
+
+
+def clean_cube(cube: np.ndarray, method: str = "iqr", imputation: str = "median",
+               threshold: float = None, window: int = CLEANING_WINDOW,
+               first_month: int = 0, seasonal: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Detect and replace outliers in a (provinces, months, metrics) cube
+    Detection and imputation run on the seasonally adjusted series when seasonal is set.
+    Returns: (cleaned cube, boolean flags of the cells detected as outliers)
+    """
+    if imputation not in IMPUTATION_METHODS:
+        raise ValueError(f"Unknown imputation method: {imputation}")
+
+    factors = seasonal_factors(cube, first_month, window) if seasonal else np.ones_like(cube)
+    adjusted = cube / factors
+
+    lower, upper, median = outlier_bounds(adjusted, method, threshold, window)
+    with np.errstate(invalid="ignore"):
+        flags = (adjusted < lower) | (adjusted > upper)
+
+    if imputation == "median":
+        replacement = median * factors
+    elif imputation == "clip":
+        replacement = np.clip(adjusted, lower, upper) * factors
+    elif imputation == "interpolate":
+        replacement = _interpolate_months(adjusted, flags) * factors
+    else:
+        return cube.copy(), flags
+
+    # Counts stay whole and non-negative
+    cleaned = np.where(flags, np.maximum(np.round(replacement), 0), cube)
+    return cleaned, flags
+
+
+def clean_regional(df: pd.DataFrame, method: str = "iqr", imputation: str = "median",
+                   threshold: float = None, window: int = CLEANING_WINDOW,
+                   seasonal: bool = True, metrics: List[str] = METRICS) -> pd.DataFrame:
+    """
+    Clean every province series of the long regional table in one vectorized pass
+    Adds <metric>_raw (original value) and <metric>_outlier (flag) columns; a cell
+    changed by the cleaning is exactly one with its flag set and a different value.
+    Args:
+        df: Regional data (Year_BE, Month, Province_Code, Marriage, Divorce)
+        method: Outlier detection, one of OUTLIER_METHODS
+        imputation: Replacement for flagged cells, one of IMPUTATION_METHODS
+        threshold: Fence multiplier (defaults per method)
+        window: Centered rolling window in months
+        seasonal: Remove month-of-year factors before detection
+    """
+    provinces, rows, cols, first, n_months = tensor_coordinates(df)
+
+    cube = np.full((len(provinces), n_months, len(metrics)), np.nan)
+    for i, metric in enumerate(metrics):
+        cube[rows, cols, i] = df[metric].to_numpy(dtype=float)
+
+    cleaned, flags = clean_cube(cube, method, imputation, threshold, window,
+                                first_month=first % SEASON_LENGTH, seasonal=seasonal)
+
+    df = df.copy()
+    for i, metric in enumerate(metrics):
+        df[f"{metric}_raw"] = df[metric]
+        df[metric] = cleaned[rows, cols, i]
+        df[f"{metric}_outlier"] = flags[rows, cols, i]
+    return df
+
+
+def cleaning_summary(df: pd.DataFrame, metrics: List[str] = METRICS) -> Dict[str, int]:
+    """Number of flagged and changed cells per metric in a cleaned regional table"""
+    summary = {}
+    for metric in metrics:
+        flagged = df[f"{metric}_outlier"]
+        summary[metric] = {
+            "flagged": int(flagged.sum()),
+            "changed": int((df[metric] != df[f"{metric}_raw"]).sum()),
+        }
+    return summary
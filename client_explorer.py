@@ -0,0 +1,253 @@
+# =========================================================
+# Client Explorer - pre-aggregated data filtered in the browser
+# The province x year counts are small (~77 x 18 x 2), so they are shipped once
+# as typed arrays and every year/region/province filter runs client-side.
+# =========================================================
+
+import base64
+import json
+import numpy as np
+import plotly.offline
+from typing import Dict, Tuple
+
+from province_tensor import ProvinceTensor
+from regional_store import RegionIndex
+
+# Same Plotly.js version the Python figures are rendered with
+PLOTLY_JS_URL = f"https://cdn.plot.ly/plotly-{plotly.offline.get_plotlyjs_version()}.min.js"
+
+# Component iframe height (px)
+EXPLORER_HEIGHT = 1250
+
+ALL_OPTION = "ทั้งหมด"
+
+
+def yearly_cube(tensor: ProvinceTensor) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Collapse the month axis of the province tensor to Buddhist Era years
+    Returns: (int32 counts (provinces, years, metrics), bool observed (provinces, years), years)
+    """
+    years = tensor.years_be
+    starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+    counts = np.add.reduceat(tensor.values, starts, axis=1, dtype=np.int64)
+    observed = np.logical_or.reduceat(tensor.observed, starts, axis=1)
+    return counts.astype(np.int32), observed, years[starts]
+
+
+def _encode(array: np.ndarray, dtype: str) -> str:
+    """Base64 of the little-endian bytes, decoded in the browser as a typed array"""
+    return base64.b64encode(np.ascontiguousarray(array, dtype=dtype).tobytes()).decode("ascii")
+
+
+def explorer_payload(tensor: ProvinceTensor, index: RegionIndex) -> Dict:
+    """
+    Compact JSON-serializable aggregate for the browser
+    counts is Int32Array indexed [(province * years + year) * metrics + metric],
+    observed is Uint8Array [province * years + year], and each scheme maps every
+    province to a region code (Uint8Array, the unmapped bucket last).
+    """
+    counts, observed, years = yearly_cube(tensor)
+    return {
+        "years": years.astype(int).tolist(),
+        "metrics": list(tensor.metrics),
+        "provinces": tensor.province_names.astype(str).tolist(),
+        "counts": _encode(counts, "<i4"),
+        "observed": _encode(observed, "u1"),
+        "schemes": {
+            scheme: {
+                "regions": list(regions),
+                "codes": _encode(index.region_codes(scheme, tensor.province_codes), "u1"),
+            }
+            for scheme, regions in index.regions.items()
+        },
+    }
+
+
+EXPLORER_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<script src="__PLOTLY_JS_URL__"></script>
+<style>
+  body { font-family: Arial, sans-serif; color: #2C3E50; margin: 0; }
+  .controls { display: flex; flex-wrap: wrap; gap: 12px; margin-bottom: 12px; }
+  .controls label { display: flex; flex-direction: column; font-size: 13px; color: #7F8C8D; gap: 4px; }
+  .controls select { padding: 6px; border: 1px solid #E1E8ED; border-radius: 8px; min-width: 140px; }
+  .kpis { display: grid; grid-template-columns: repeat(4, 1fr); gap: 12px; margin-bottom: 8px; }
+  .kpi span { display: block; font-size: 15px; color: #7F8C8D; }
+  .kpi b { font-size: 28px; }
+  .row { display: grid; grid-template-columns: 1fr 1fr; }
+</style>
+</head>
+<body>
+<div class="controls">
+  <label>รูปแบบการแบ่งภูมิภาค <select id="scheme"></select></label>
+  <label>ภูมิภาค <select id="region"></select></label>
+  <label>จังหวัด <select id="province"></select></label>
+  <label>ตั้งแต่ปี (พ.ศ.) <select id="from"></select></label>
+  <label>ถึงปี (พ.ศ.) <select id="to"></select></label>
+</div>
+<div class="kpis">
+  <div class="kpi"><span>💍 Total Marriages</span><b id="kpi-marriage"></b></div>
+  <div class="kpi"><span>💔 Total Divorces</span><b id="kpi-divorce"></b></div>
+  <div class="kpi"><span>📉 Divorce Rate</span><b id="kpi-rate"></b></div>
+  <div class="kpi"><span>📅 Years Analyzed</span><b id="kpi-years"></b></div>
+</div>
+<div id="trend"></div>
+<div class="row"><div id="top-marriage"></div><div id="top-divorce"></div></div>
+<div id="regions"></div>
+<script>
+const DATA = __PAYLOAD__;
+const ALL = "__ALL__";
+
+function decode(b64, Type) {
+  const bytes = Uint8Array.from(atob(b64), c => c.charCodeAt(0));
+  return new Type(bytes.buffer);
+}
+
+const counts = decode(DATA.counts, Int32Array);
+const observed = decode(DATA.observed, Uint8Array);
+const schemes = {};
+for (const [name, s] of Object.entries(DATA.schemes)) {
+  schemes[name] = { regions: s.regions, codes: decode(s.codes, Uint8Array) };
+}
+const P = DATA.provinces.length, Y = DATA.years.length, M = DATA.metrics.length;
+const MARRIAGE = DATA.metrics.indexOf("Marriage"), DIVORCE = DATA.metrics.indexOf("Divorce");
+
+const el = id => document.getElementById(id);
+const fmt = n => Math.round(n).toLocaleString("en-US");
+const LAYOUT = {
+  paper_bgcolor: "rgba(0,0,0,0)", plot_bgcolor: "rgba(240, 242, 245, 0.8)",
+  font: { family: "Arial, sans-serif", size: 12, color: "#2C3E50" }, margin: { t: 60, r: 20, b: 50, l: 60 }
+};
+const TITLE_FONT = { color: "#2C3E50", family: "Arial Black" };
+
+function fill(select, options, keep) {
+  select.innerHTML = "";
+  for (const value of options) select.add(new Option(value, value));
+  select.value = options.includes(keep) ? keep : options[0];
+}
+
+function selectedRows() {
+  const scheme = schemes[el("scheme").value];
+  const region = scheme.regions.indexOf(el("region").value);
+  const province = DATA.provinces.indexOf(el("province").value);
+  const rows = [];
+  for (let p = 0; p < P; p++) {
+    if (province >= 0 ? p === province : region < 0 || scheme.codes[p] === region) rows.push(p);
+  }
+  return rows;
+}
+
+function refreshProvinces() {
+  const scheme = schemes[el("scheme").value];
+  const region = scheme.regions.indexOf(el("region").value);
+  const names = DATA.provinces.filter((_, p) => region < 0 || scheme.codes[p] === region).sort();
+  fill(el("province"), [ALL].concat(names), el("province").value);
+}
+
+function refreshRegions() {
+  // The unmapped bucket (last) is not offered as a region
+  fill(el("region"), [ALL].concat(schemes[el("scheme").value].regions.slice(0, -1)), el("region").value);
+  refreshProvinces();
+}
+
+function render() {
+  let y0 = DATA.years.indexOf(+el("from").value), y1 = DATA.years.indexOf(+el("to").value);
+  if (y0 > y1) [y0, y1] = [y1, y0];
+  const rows = selectedRows();
+  const scheme = schemes[el("scheme").value];
+
+  const yearly = Array.from({ length: y1 - y0 + 1 }, () => new Float64Array(M));
+  const perProvince = new Map();
+  const perRegion = scheme.regions.map(() => new Float64Array(M));
+  const yearSeen = new Uint8Array(y1 - y0 + 1);
+  for (const p of rows) {
+    const sums = new Float64Array(M);
+    for (let y = y0; y <= y1; y++) {
+      const base = (p * Y + y) * M;
+      for (let m = 0; m < M; m++) {
+        yearly[y - y0][m] += counts[base + m];
+        sums[m] += counts[base + m];
+      }
+      yearSeen[y - y0] |= observed[p * Y + y];
+    }
+    perProvince.set(p, sums);
+    for (let m = 0; m < M; m++) perRegion[scheme.codes[p]][m] += sums[m];
+  }
+
+  const totalMarriage = yearly.reduce((a, v) => a + v[MARRIAGE], 0);
+  const totalDivorce = yearly.reduce((a, v) => a + v[DIVORCE], 0);
+  el("kpi-marriage").textContent = fmt(totalMarriage);
+  el("kpi-divorce").textContent = fmt(totalDivorce);
+  el("kpi-rate").textContent = (totalMarriage > 0 ? totalDivorce / totalMarriage * 100 : 0).toFixed(2) + "%";
+  el("kpi-years").textContent = yearSeen.reduce((a, v) => a + v, 0);
+
+  const years = DATA.years.slice(y0, y1 + 1);
+  Plotly.react("trend", [
+    { x: years, y: yearly.map(v => v[MARRIAGE]), name: "Marriage", mode: "lines+markers", line: { color: "__MARRIAGE__", width: 3 } },
+    { x: years, y: yearly.map(v => v[DIVORCE]), name: "Divorce", mode: "lines+markers", line: { color: "__DIVORCE__", width: 3 } }
+  ], Object.assign({}, LAYOUT, {
+    title: { text: "Marriage vs Divorce Trend Over Time", font: Object.assign({ size: 22 }, TITLE_FONT) },
+    xaxis: { title: { text: "Year (พ.ศ.)" } }, yaxis: { title: { text: "Count" } }, hovermode: "x unified", height: 420
+  }), { responsive: true });
+
+  const top = (m, title, colors, target) => {
+    const best = [...perProvince.entries()].sort((a, b) => b[1][m] - a[1][m]).slice(0, 5);
+    Plotly.react(target, [{
+      type: "pie", hole: 0.3, labels: best.map(([p]) => DATA.provinces[p]), values: best.map(([, v]) => v[m]),
+      textinfo: "percent+label", textposition: "inside", sort: false,
+      marker: { colors: colors, line: { color: "white", width: 2 } }
+    }], Object.assign({}, LAYOUT, {
+      title: { text: title, font: Object.assign({ size: 18 }, TITLE_FONT) }, height: 380,
+      legend: { orientation: "h", yanchor: "bottom", y: -0.2, xanchor: "center", x: 0.5 }
+    }), { responsive: true });
+  };
+  top(MARRIAGE, "💍 Top 5 Marriage Provinces", ["#1F2287", "#393CA4", "#5557B6", "#7D7FCF", "#B3B4E8"], "top-marriage");
+  top(DIVORCE, "💔 Top 5 Divorce Provinces", ["#BA0E0E", "#ED2424", "#FF6D6D", "#FF9696", "#FFB8B8"], "top-divorce");
+
+  const ranking = scheme.regions.slice(0, -1)
+    .map((name, r) => ({ name, rate: perRegion[r][MARRIAGE] > 0 ? perRegion[r][DIVORCE] / perRegion[r][MARRIAGE] * 100 : null }))
+    .filter(r => r.rate !== null)
+    .sort((a, b) => b.rate - a.rate);
+  Plotly.react("regions", [{
+    type: "bar", x: ranking.map(r => r.name), y: ranking.map(r => r.rate),
+    text: ranking.map(r => r.rate.toFixed(2) + "%"), textposition: "outside",
+    marker: { color: ranking.map(r => r.rate), colorscale: [[0, "#FFB8B8"], [0.25, "#FF9696"], [0.5, "#FF6D6D"], [0.75, "#ED2424"], [1, "#BA0E0E"]] }
+  }], Object.assign({}, LAYOUT, {
+    title: { text: "📉 Divorce Rate (%) by Region", font: Object.assign({ size: 20 }, TITLE_FONT) },
+    xaxis: { title: { text: "Region" } }, yaxis: { title: { text: "Divorce Rate (%)" }, tickformat: ".2f" }, height: 400
+  }), { responsive: true });
+}
+
+fill(el("scheme"), Object.keys(schemes));
+fill(el("from"), DATA.years.map(String), String(DATA.years[0]));
+fill(el("to"), DATA.years.map(String), String(DATA.years[Y - 1]));
+refreshRegions();
+el("scheme").onchange = () => { refreshRegions(); render(); };
+el("region").onchange = () => { refreshProvinces(); render(); };
+for (const id of ["province", "from", "to"]) el(id).onchange = render;
+render();
+</script>
+</body>
+</html>
+"""
+
+
+def explorer_html(payload: Dict, colors: Dict[str, str]) -> str:
+    """
+    Self-contained page (data, controls and Plotly.js charts) for components.html
+    Args:
+        payload: From explorer_payload
+        colors: Dashboard COLORS (marriage / divorce line colors)
+    """
+    # "</" inside the JSON would close the script element early
+    data = json.dumps(payload, ensure_ascii=False).replace("</", "<\\/")
+    return (
+        EXPLORER_TEMPLATE
+        .replace("__PLOTLY_JS_URL__", PLOTLY_JS_URL)
+        .replace("__ALL__", ALL_OPTION)
+        .replace("__MARRIAGE__", colors["marriage"])
+        .replace("__DIVORCE__", colors["divorce"])
+        .replace("__PAYLOAD__", data)
+    )
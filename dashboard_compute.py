@@ -0,0 +1,427 @@
+# =========================================================
+# Dashboard Compute Layer - data loading and cached computations
+# Imported by DashboardV3.py and by prewarm.py (no page elements here)
+# =========================================================
+
+import os
+import streamlit as st
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+from regional_store import (
+    build_bottom_matrix, build_hierarchy, build_region_index, build_region_rollups, RegionIndex, UNMAPPED_REGION
+)
+from province_tensor import ProvinceTensor, load_or_build_province_tensor
+from cleaning import clean_regional
+from client_explorer import explorer_payload
+from decomposition import SeasonalDecomposition, decompose_hierarchy
+from reconciliation import hierarchical_forecast
+from forecasting import prophet_rolling_backtest, train_prophet_scenario_model, predict_scenario_baseline
+from scenarios import MarriageScenario, apply_scenarios
+from ensemble import ensemble_forecast
+from metrics import ForecastCube, backtest_cube
+from forecast_store import ForecastStore, record_artifacts, record_hierarchy, run_version
+from job_queue import QUEUE_PATH, JobQueue
+from artifacts import ArtifactRegistry, DataHandle, HANDLE_HASH_FUNCS, file_signature
+from disk_cache import CACHE_DIR, disk_cached
+from sarima import current_state_file, load_or_update_sarima, sarima_forecast, to_monthly_series
+
+# =========================================================
+# Data Files
+# =========================================================
+DATA_FILES = {
+    "divorce_model": "divorce_all_model.csv",
+    "regional": "monthly_marriage_divorce_wide_BE.csv",
+    "sarimax_metrics": "sarimax_metrics.csv",
+    "sarimax_rolling": "sarimax_rolling_forecast.csv",
+    "prophet_future": "prophet_forecast_future.csv",
+    "sarimax_future": "sarima_rolling_future_forecast.csv",
+    # SARIMAX (with exogenous regressors) future forecast, only recorded in the forecast store
+    "sarimax_exog_future": "sarimax_future.csv",
+    # Shipped SARIMA state (read-only seed); updates go to SARIMA_LIVE_STATE
+    "sarima_state": "sarima_state.npz",
+    # Memory-mapped province x month tensor (<prefix>.npy + <prefix>.meta.npz), shared by worker processes
+    "province_tensor": "province_tensor",
+    # "scenario": "TestScenarioPred.csv"
+}
+
+# SARIMA state updated at runtime (new months, order search), kept out of the repo
+SARIMA_LIVE_STATE = os.path.join(CACHE_DIR, "sarima_state.npz")
+
+# =========================================================
+# Region Schemes
+# =========================================================
+REGION_SCHEMES: Dict[str, Dict[str, List[str]]] = {
+    "การแบ่งแบบสี่ภูมิภาค (กรมทางหลวง)": {
+        "ภาคเหนือ": [
+            "จังหวัดเชียงราย", "จังหวัดน่าน", "จังหวัดพะเยา", "จังหวัดเชียงใหม่",
+            "จังหวัดแม่ฮ่องสอน", "จังหวัดแพร่", "จังหวัดลำปาง", "จังหวัดลำพูน",
+            "จังหวัดอุตรดิตถ์", "จังหวัดพิษณุโลก", "จังหวัดสุโขทัย",
+            "จังหวัดกำแพงเพชร", "จังหวัดนครสวรรค์", "จังหวัดพิจิตร"
+        ],
+        "ภาคตะวันออกเฉียงเหนือ": [
+            "จังหวัดเพชรบูรณ์", "จังหวัดหนองคาย", "จังหวัดนครพนม", "จังหวัดสกลนคร",
+            "จังหวัดอุดรธานี", "จังหวัดหนองบัวลำภู", "จังหวัดเลย", "จังหวัดมุกดาหาร",
+            "จังหวัดกาฬสินธุ์", "จังหวัดขอนแก่น", "จังหวัดอำนาจเจริญ", "จังหวัดยโสธร",
+            "จังหวัดร้อยเอ็ด", "จังหวัดมหาสารคาม", "จังหวัดชัยภูมิ",
+            "จังหวัดนครราชสีมา", "จังหวัดบุรีรัมย์", "จังหวัดสุรินทร์",
+            "จังหวัดศรีสะเกษ", "จังหวัดอุบลราชธานี", "จังหวัดบึงกาฬ"
+        ],
+        "ภาคกลาง": [
+            "กรุงเทพมหานคร", "จังหวัดนนทบุรี", "จังหวัดปทุมธานี", "จังหวัดสมุทรปราการ",
+            "จังหวัดสมุทรสาคร", "จังหวัดสมุทรสงคราม", "จังหวัดนครปฐม",
+            "จังหวัดสุพรรณบุรี"
+        ],
+        "ภาคใต้": [
+            "จังหวัดชุมพร", "จังหวัดระนอง", "จังหวัดสุราษฎร์ธานี",
+            "จังหวัดนครศรีธรรมราช", "จังหวัดกระบี่", "จังหวัดพังงา", "จังหวัดภูเก็ต",
+            "จังหวัดพัทลุง", "จังหวัดตรัง", "จังหวัดปัตตานี", "จังหวัดสงขลา",
+            "จังหวัดสตูล", "จังหวัดนราธิวาส", "จังหวัดยะลา"
+        ],
+    },
+    "การแบ่งอย่างเป็นทางการ (6 ภูมิภาค)": {
+        "ภาคเหนือ": [
+            "จังหวัดเชียงราย", "จังหวัดน่าน", "จังหวัดพะเยา", "จังหวัดเชียงใหม่",
+            "จังหวัดแม่ฮ่องสอน", "จังหวัดแพร่", "จังหวัดลำปาง",
+            "จังหวัดลำพูน", "จังหวัดอุตรดิตถ์"
+        ],
+        "ภาคตะวันออกเฉียงเหนือ": [
+            "จังหวัดหนองคาย", "จังหวัดนครพนม", "จังหวัดสกลนคร", "จังหวัดอุดรธานี",
+            "จังหวัดหนองบัวลำภู", "จังหวัดเลย", "จังหวัดมุกดาหาร", "จังหวัดกาฬสินธุ์",
+            "จังหวัดขอนแก่น", "จังหวัดอำนาจเจริญ", "จังหวัดยโสธร", "จังหวัดร้อยเอ็ด",
+            "จังหวัดมหาสารคาม", "จังหวัดชัยภูมิ", "จังหวัดนครราชสีมา",
+            "จังหวัดบุรีรัมย์", "จังหวัดสุรินทร์", "จังหวัดศรีสะเกษ",
+            "จังหวัดอุบลราชธานี", "จังหวัดบึงกาฬ"
+        ],
+        "ภาคตะวันตก": [
+            "จังหวัดตาก", "จังหวัดกาญจนบุรี", "จังหวัดราชบุรี", "จังหวัดเพชรบุรี", "จังหวัดประจวบคีรีขันธ์"
+        ],
+        "ภาคกลาง": [
+            "กรุงเทพมหานคร", "จังหวัดปทุมธานี", "จังหวัดนนทบุรี",
+            "จังหวัดนครปฐม", "จังหวัดสมุทรปราการ"
+        ],
+        "ภาคตะวันออก": [
+            "จังหวัดชลบุรี", "จังหวัดระยอง", "จังหวัดจันทบุรี", "จังหวัดตราด"
+        ],
+        "ภาคใต้": [
+            "จังหวัดชุมพร", "จังหวัดสุราษฎร์ธานี", "จังหวัดนครศรีธรรมราช",
+            "จังหวัดสงขลา", "จังหวัดยะลา", "จังหวัดนราธิวาส"
+        ],
+    }
+}
+
+# =========================================================
+# Data Loading (artifact registry driven by DATA_FILES)
+# =========================================================
+
+# Date columns parsed once at load time
+ARTIFACT_PARSE_DATES = {
+    "divorce_model": ["ds"],
+    "sarimax_rolling": ["ds"],
+    "prophet_future": ["ds"],
+    "sarimax_future": ["ds"],
+    "sarimax_exog_future": ["ds"],
+}
+
+
+def _prepare_sarimax_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """Tag SARIMA metrics with the model name and normalize column names to uppercase"""
+    df["Model"] = "SARIMAX"
+    df.columns = df.columns.str.upper()
+    return df
+
+
+# Province-level outlier cleaning applied at ingestion (see cleaning.py for the options).
+# Flag-only by default so headline figures match the official counts; a deployment
+# opts in to replacing outliers with DASHBOARD_IMPUTATION=median|clip|interpolate.
+REGIONAL_CLEANING = {
+    "method": "iqr",
+    "imputation": os.environ.get("DASHBOARD_IMPUTATION", "none"),
+}
+
+ARTIFACT_POSTPROCESS = {
+    "divorce_model": lambda df: df.sort_values("ds").reset_index(drop=True),
+    "regional": lambda df: clean_regional(df, **REGIONAL_CLEANING),
+    "sarimax_metrics": _prepare_sarimax_metrics,
+}
+
+
+@st.cache_resource
+def get_artifact_registry() -> ArtifactRegistry:
+    """Process-wide registry of every CSV artifact in DATA_FILES"""
+    csv_files = {name: path for name, path in DATA_FILES.items() if path.endswith(".csv")}
+    return ArtifactRegistry(
+        csv_files,
+        parse_dates=ARTIFACT_PARSE_DATES,
+        postprocess=ARTIFACT_POSTPROCESS,
+        # The regional frame holds cleaned counts, so its fingerprint covers the cleaning options
+        settings={"regional": sorted(REGIONAL_CLEANING.items())}
+    )
+
+
+@st.cache_resource(show_spinner="Indexing region schemes...", hash_funcs=HANDLE_HASH_FUNCS)
+def load_region_index(regional: DataHandle) -> RegionIndex:
+    """Build the province -> region index for every scheme once per data version"""
+    return build_region_index(regional.frame, REGION_SCHEMES)
+
+
+@st.cache_data(show_spinner="Materializing region rollups...", hash_funcs=HANDLE_HASH_FUNCS)
+@disk_cached(extra_key=REGION_SCHEMES)
+def load_region_rollups(regional: DataHandle, _region_index: RegionIndex) -> Dict[str, pd.DataFrame]:
+    """Region-level monthly/yearly series for every scheme, built once per data version"""
+    return build_region_rollups(regional.frame, _region_index)
+
+
+def province_tensor_version() -> str:
+    """Fingerprint of the cleaned regional data the tensor is built from"""
+    return get_artifact_registry().fingerprint("regional")
+
+
+@st.cache_resource(show_spinner="Building province x month tensor...", hash_funcs=HANDLE_HASH_FUNCS)
+def load_province_tensor(regional: DataHandle) -> ProvinceTensor:
+    """Dense province x month tensor, memory-mapped from disk and rebuilt when the regional CSV changes"""
+    return load_or_build_province_tensor(
+        regional.frame,
+        prefix=DATA_FILES["province_tensor"],
+        fingerprint=regional.fingerprint
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+@disk_cached(extra_key=REGION_SCHEMES)
+def summarize_selection(_tensor: ProvinceTensor, _region_index: RegionIndex, tensor_version: str,
+                        scheme: str, region: Optional[str], province: Optional[str],
+                        year_range: Tuple[int, int]) -> Dict:
+    """
+    Overview aggregates (KPIs, yearly trend, region ranking, top provinces) for one filter selection
+    Keyed on the selection and tensor version only, so reruns triggered by display
+    options or other tabs reuse them instead of reducing the tensor again; the disk
+    cache shares them across workers (prewarm.py fills every scheme/region).
+    Args:
+        region, province: None for all
+    Returns: dict with totals, years_observed, yearly, region_totals, unmapped, province_totals
+    """
+    if province is not None:
+        rows = [_tensor.province_row(province)]
+    elif region is not None:
+        rows = _tensor.region_rows(_region_index, scheme, region)
+    else:
+        rows = slice(None)
+
+    region_totals = _tensor.by_region(_region_index, scheme, year_range, rows)
+    unmapped = region_totals[region_totals.Region == UNMAPPED_REGION].iloc[0]
+    region_totals = region_totals[(region_totals.Region != UNMAPPED_REGION) & (region_totals.Provinces > 0)]
+
+    return {
+        "totals": _tensor.totals(year_range, rows),
+        "years_observed": _tensor.years_observed(year_range, rows),
+        "yearly": _tensor.yearly(year_range, rows),
+        "region_totals": region_totals,
+        "unmapped": unmapped,
+        "province_totals": _tensor.by_province(year_range, rows),
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_province_comparison(_tensor: ProvinceTensor, tensor_version: str,
+                             year_range: Tuple[int, int]) -> pd.DataFrame:
+    """
+    Yearly Marriage, Divorce and Divorce_Rate (%) for every province in one pivot
+    Built for all provinces per year range, so adding or removing a compared
+    province only selects columns.
+    Returns: index Year_BE, columns (metric, province)
+    """
+    pivot = _tensor.province_pivot(year_range)
+    marriages = pivot["Marriage"]
+    rate = pivot["Divorce"] / marriages.where(marriages > 0) * 100
+    rate.columns = pd.MultiIndex.from_product([["Divorce_Rate"], rate.columns], names=pivot.columns.names)
+    return pd.concat([pivot, rate], axis=1)
+
+
+@st.cache_resource(show_spinner="Decomposing seasonality...")
+def load_seasonal_decomposition(_tensor: ProvinceTensor, _region_index: RegionIndex,
+                                tensor_version: str) -> SeasonalDecomposition:
+    """Trend / seasonal / residual of every province, region and the nation, once per data version"""
+    return decompose_hierarchy(_tensor, _region_index)
+
+
+@st.cache_data(show_spinner=False)
+def load_explorer_payload(_tensor: ProvinceTensor, _region_index: RegionIndex, tensor_version: str) -> Dict:
+    """Province x year aggregate shipped once to the client-side explorer"""
+    return explorer_payload(_tensor, _region_index)
+
+
+def artifacts_version(handles: Dict[str, DataHandle]) -> str:
+    """One version for every loaded artifact together (scheduler jobs are keyed on it)"""
+    return run_version(*sorted(f"{name}={handle.fingerprint}" for name, handle in handles.items()))
+
+
+def refit_status(handles: Dict[str, DataHandle]) -> Optional[Dict]:
+    """Scheduler progress on the loaded data (see scheduler.py), None when no scheduler has run"""
+    if not os.path.exists(QUEUE_PATH):
+        return None
+    return get_job_queue().summary(artifacts_version(handles))
+
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """Process-wide handle on the scheduler's job queue (read only here)"""
+    return JobQueue(QUEUE_PATH)
+
+
+@st.cache_resource
+def get_forecast_store() -> ForecastStore:
+    """Process-wide handle on the forecast run store"""
+    return ForecastStore()
+
+
+@st.cache_resource(show_spinner=False, hash_funcs=HANDLE_HASH_FUNCS)
+def record_artifact_forecasts(handles: Dict[str, DataHandle]) -> int:
+    """Record the forecast CSVs in the forecast store, once per process and file version"""
+    return record_artifacts(get_forecast_store(), handles)
+
+
+# =========================================================
+# Live SARIMA Functions
+# =========================================================
+
+def sarima_state_version() -> Optional[Tuple[int, int]]:
+    """Signature of the SARIMA state file the live model loads (None before the first fit)"""
+    path = current_state_file(DATA_FILES["sarima_state"], SARIMA_LIVE_STATE)
+    return file_signature(path) if path is not None else None
+
+
+def load_live_sarima(data: DataHandle) -> Tuple[object, str]:
+    """
+    Load the persisted SARIMA state and filter new months through its parameters
+    (full fit only when no state file exists yet). The shipped state is never
+    rewritten: updates are saved to SARIMA_LIVE_STATE and loaded from there next time.
+    Keyed on the state file too, so a refit saved by scheduler.py reaches running workers.
+    Returns: (state-space results, update status)
+    """
+    return _load_live_sarima(data, sarima_state_version())
+
+
+@st.cache_resource(show_spinner="Updating SARIMA state-space model...", hash_funcs=HANDLE_HASH_FUNCS)
+def _load_live_sarima(data: DataHandle, state_version: Optional[Tuple[int, int]]) -> Tuple[object, str]:
+    """Live model per data version and state file (state_version keys the cache on file changes)"""
+    return load_or_update_sarima(
+        to_monthly_series(data.frame), DATA_FILES["sarima_state"], live_path=SARIMA_LIVE_STATE
+    )
+
+
+def forecast_live_sarima(results, data: DataHandle, horizon: int) -> pd.DataFrame:
+    """SARIMA forecast with 95% intervals for any horizon (the data fingerprint and state file key the cache)"""
+    return _forecast_live_sarima(results, data, horizon, sarima_state_version())
+
+
+@st.cache_data(show_spinner="Forecasting SARIMA...", hash_funcs=HANDLE_HASH_FUNCS)
+def _forecast_live_sarima(_results, data: DataHandle, horizon: int,
+                          state_version: Optional[Tuple[int, int]]) -> pd.DataFrame:
+    """Forecast per data version, state file and horizon"""
+    return sarima_forecast(_results, horizon)
+
+
+# =========================================================
+# Ensemble Forecast Functions
+# =========================================================
+
+def backtest_rounds(arima_roll: pd.DataFrame) -> Tuple[Tuple[str, str], ...]:
+    """(round name, test start date) pairs of the SARIMA rolling backtest, oldest first"""
+    return tuple(
+        arima_roll.groupby("Round")["ds"].min().sort_values().dt.strftime("%Y-%m-%d").items()
+    )
+
+
+@st.cache_data(show_spinner="Building backtest-weighted ensemble...", hash_funcs=HANDLE_HASH_FUNCS)
+@disk_cached
+def build_ensemble_forecast(data: DataHandle, prophet_future: pd.DataFrame,
+                            arima_forecast: pd.DataFrame, arima_roll: DataHandle) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Combine Prophet and SARIMA future forecasts with per-horizon weights
+    learned from their rolling out-of-sample errors on the same rounds
+    Args:
+        data, arima_roll: National series and the SARIMA rolling backtest (keyed by fingerprint);
+            the future forecasts are horizon-sized frames and are hashed directly
+    Returns: (ensemble forecast, Prophet rolling backtest)
+    """
+    prophet_roll = prophet_rolling_backtest(data, backtest_rounds(arima_roll.frame), horizon=12)
+
+    ensemble = ensemble_forecast(
+        {"Prophet": prophet_future, "SARIMA": arima_forecast},
+        {"Prophet": prophet_roll, "SARIMA": arima_roll.frame}
+    )
+    return ensemble, prophet_roll
+
+
+@st.cache_data(show_spinner="Scoring backtests...", hash_funcs=HANDLE_HASH_FUNCS)
+def load_backtest_cube(data: DataHandle, arima_roll: DataHandle) -> ForecastCube:
+    """
+    Prophet and SARIMA rolling backtests on the same rounds, stacked for the metrics engine
+    (the Prophet backtest is the cached one the ensemble weights use)
+    """
+    prophet_roll = prophet_rolling_backtest(data, backtest_rounds(arima_roll.frame), horizon=12)
+    return backtest_cube(
+        {"Prophet": prophet_roll, "SARIMA": arima_roll.frame},
+        data.frame, value="Divorce"
+    )
+
+
+# =========================================================
+# Marriage Scenario Functions
+# =========================================================
+
+# Months the Marriage Scenarios tab opens with
+SCENARIO_DEFAULT_HORIZON = 24
+
+@st.cache_data(show_spinner="Evaluating marriage scenarios...", hash_funcs=HANDLE_HASH_FUNCS, max_entries=64)
+def run_marriage_scenarios(data: DataHandle, scenarios: Tuple[MarriageScenario, ...], horizon: int,
+                           uncertainty_samples: int) -> Tuple[pd.DataFrame, float]:
+    """
+    Every scenario from one fit and one prediction of the Marriage regressor model
+    Editing scenarios only redoes the array arithmetic; the fit and the baseline
+    prediction are cached on the data, horizon and sample count.
+    Returns: (stacked scenario forecasts, divorces per additional marriage)
+    """
+    model, prophet_data, coefficient = train_prophet_scenario_model(data)
+    baseline = predict_scenario_baseline(model, prophet_data, horizon, uncertainty_samples)
+    return apply_scenarios(baseline, coefficient, scenarios), coefficient
+
+
+# =========================================================
+# Hierarchical Forecast Functions
+# =========================================================
+
+# Forecast months offered by the Hierarchical Forecast tab (default first)
+HIERARCHY_HORIZONS = [24, 12, 36, 48, 60]
+
+@st.cache_data(show_spinner="Reconciling regional forecasts...", hash_funcs=HANDLE_HASH_FUNCS)
+def reconcile_regional_forecast(regional: DataHandle, scheme: str, metric: str,
+                                horizon: int, method: str) -> Dict:
+    """
+    Forecast every node of nation -> region -> province (-> district)
+    and reconcile them so every level adds up to the national total
+    Results are also recorded in the forecast store, which keeps the earlier runs.
+    Returns: dict with node labels, dates, future dates, history/base/reconciled matrices and the run version
+    """
+    result = _reconcile_regional_forecast(regional, scheme, metric, horizon, method)
+    record_hierarchy(get_forecast_store(), result, scheme, metric, method)
+    return result
+
+
+@disk_cached(extra_key=REGION_SCHEMES)
+def _reconcile_regional_forecast(regional: DataHandle, scheme: str, metric: str,
+                                 horizon: int, method: str) -> Dict:
+    """Computation behind reconcile_regional_forecast (shared through the disk cache)"""
+    Y_bottom, bottom_keys, dates = build_bottom_matrix(regional.frame, metric)
+    S, nodes = build_hierarchy(bottom_keys, REGION_SCHEMES[scheme])
+
+    result = hierarchical_forecast(Y_bottom, S, horizon, method=method)
+    result["nodes"] = nodes
+    result["dates"] = dates
+    result["future_dates"] = pd.date_range(
+        dates[-1] + pd.DateOffset(months=1), periods=horizon, freq="MS"
+    )
+    result["version"] = run_version(regional.fingerprint, scheme, horizon)
+    return result
+
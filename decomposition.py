@@ -0,0 +1,137 @@
+# =========================================================
+# Seasonal Decomposition - classical additive decomposition of every
+# province, region and national series in one batched pass
+# =========================================================
+
+import warnings
+import pandas as pd
+import numpy as np
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from regional_store import NATION_LABEL, RegionIndex
+from province_tensor import ProvinceTensor
+from cleaning import SEASON_LENGTH
+
+
+def centered_moving_average(Y: np.ndarray, period: int = SEASON_LENGTH) -> np.ndarray:
+    """
+    Centered moving average along axis 1 (2 x 12 for monthly data, as statsmodels' seasonal_decompose)
+    Args:
+        Y: Array (series, months, ...), NaN where a month is missing
+    Returns: trend shaped like Y, NaN for the half window at each end and around gaps
+    """
+    if period % 2 == 0:
+        weights = np.r_[0.5, np.ones(period - 1), 0.5] / period
+    else:
+        weights = np.ones(period) / period
+    half = len(weights) // 2
+
+    windows = np.lib.stride_tricks.sliding_window_view(Y, len(weights), axis=1)
+    trend = np.full(Y.shape, np.nan)
+    trend[:, half:Y.shape[1] - half] = windows @ weights
+    return trend
+
+
+def decompose_batch(Y: np.ndarray, first_month: int = 0,
+                    period: int = SEASON_LENGTH) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Additive decomposition Y = trend + seasonal + residual for many series at once
+    The seasonal profile is the mean detrended value per calendar month, centered to sum to zero.
+    Args:
+        Y: Array (series, months, ...) with NaN for unobserved months
+        first_month: Calendar position (0 = January) of the first month on the axis
+    Returns: (trend, seasonal, residual, profile (series, period, ...) indexed by calendar month)
+    """
+    trend = centered_moving_average(Y, period)
+    detrended = Y - trend
+    phase = (first_month + np.arange(Y.shape[1])) % period
+
+    with warnings.catch_warnings():
+        # Series without a complete window (e.g. too short) have an all-NaN profile
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        profile = np.stack([np.nanmean(detrended[:, phase == j], axis=1) for j in range(period)], axis=1)
+        profile = profile - np.nanmean(profile, axis=1, keepdims=True)
+
+    seasonal = profile[:, phase]
+    return trend, seasonal, Y - trend - seasonal, profile
+
+
+@dataclass(frozen=True)
+class SeasonalDecomposition:
+    """
+    Components of every series, shape (series, months, metrics) on the province tensor's month axis
+    labels has one row per series: Level (Nation / Region / Province), Scheme, Name.
+    profile is (series, 12, metrics) indexed by calendar month (0 = January);
+    strength is max(0, 1 - Var(residual) / Var(seasonal + residual)) per series and metric.
+    """
+    labels: pd.DataFrame
+    dates: pd.DatetimeIndex
+    metrics: Tuple[str, ...]
+    observed: np.ndarray
+    trend: np.ndarray
+    seasonal: np.ndarray
+    resid: np.ndarray
+    profile: np.ndarray
+    strength: np.ndarray
+
+    def row(self, level: str, name: str, scheme: str = "") -> Optional[int]:
+        """Series position of a node (scheme only matters for regions), None when the node has no data"""
+        mask = (self.labels.Level == level) & (self.labels.Name == name)
+        if level == "Region":
+            mask &= self.labels.Scheme == scheme
+        rows = np.flatnonzero(mask.to_numpy())
+        return int(rows[0]) if len(rows) else None
+
+    def components(self, row: int, metric: str, months: slice = slice(None)) -> pd.DataFrame:
+        """One series' observed / trend / seasonal / residual columns over a month slice"""
+        m = self.metrics.index(metric)
+        return pd.DataFrame({
+            "ds": self.dates[months],
+            "Observed": self.observed[row, months, m],
+            "Trend": self.trend[row, months, m],
+            "Seasonal": self.seasonal[row, months, m],
+            "Residual": self.resid[row, months, m],
+        })
+
+
+def decompose_hierarchy(tensor: ProvinceTensor, index: RegionIndex) -> SeasonalDecomposition:
+    """
+    Decompose the nation, every region of every scheme and every province together
+    Region and national series are summed from the province tensor, so the whole
+    hierarchy is one (series, months, metrics) array and one decomposition pass.
+    Months a province did not report are NaN; aggregates use whatever reported.
+    """
+    values = tensor.values.astype(float)
+    blocks = [values.sum(axis=0, keepdims=True)]
+    labels = [("Nation", "", NATION_LABEL)]
+
+    for scheme, regions in index.regions.items():
+        codes = index.region_codes(scheme, tensor.province_codes)
+        sums = np.zeros((len(regions),) + values.shape[1:])
+        np.add.at(sums, codes, values)
+        present = np.unique(codes)
+        blocks.append(sums[present])
+        labels += [("Region", scheme, regions[code]) for code in present]
+
+    blocks.append(np.where(tensor.observed[..., None], values, np.nan))
+    labels += [("Province", "", name) for name in tensor.province_names]
+
+    Y = np.concatenate(blocks)
+    trend, seasonal, resid, profile = decompose_batch(Y, first_month=tensor.dates[0].month - 1)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        strength = np.clip(1 - np.nanvar(resid, axis=1) / np.nanvar(seasonal + resid, axis=1), 0, 1)
+
+    return SeasonalDecomposition(
+        labels=pd.DataFrame(labels, columns=["Level", "Scheme", "Name"]),
+        dates=tensor.dates,
+        metrics=tuple(tensor.metrics),
+        observed=Y,
+        trend=trend,
+        seasonal=seasonal,
+        resid=resid,
+        profile=profile,
+        strength=strength,
+    )
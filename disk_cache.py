@@ -0,0 +1,329 @@
+# =========================================================
+# Disk Cache - SQLite result cache shared by every worker on the host
+# =========================================================
+
+import contextlib
+import functools
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+import pandas as pd
+import numpy as np
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from artifacts import DataHandle
+
+try:
+    import fcntl
+except ImportError:  # Windows: SQLite still serializes writes, only duplicate computes remain possible
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Location and size budget, overridable per deployment
+CACHE_DIR = os.environ.get("DASHBOARD_CACHE_DIR", ".cache")
+CACHE_MAX_BYTES = int(float(os.environ.get("DASHBOARD_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+# Seconds a worker waits on the database lock before giving up
+SQLITE_TIMEOUT = 30.0
+
+# Part of every key: bump to drop all cached results when something outside this
+# repo's source changes them (e.g. a prophet or statsmodels upgrade)
+CACHE_VERSION = 1
+
+# Modules whose source is folded into the keys of the functions that use them
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class DiskCache:
+    """
+    Pickled results in one SQLite file, evicted least-recently-used beyond max_bytes
+    SQLite (WAL mode) makes each write atomic and safe across processes; a per-key
+    file lock around compute makes concurrent workers wait for the first one instead
+    of computing the same result in parallel.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.path = os.path.join(directory, "results.sqlite3")
+        self._local = threading.local()
+        os.makedirs(os.path.join(directory, "locks"), exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not shareable)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Returns: (hit, value)"""
+        conn = self._connection()
+        row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False, None
+        try:
+            value = pickle.loads(row[0])
+        except (pickle.UnpicklingError, AttributeError, ImportError, EOFError) as e:
+            logger.warning("Dropping unreadable disk cache entry %s: %s", key, e)
+            return False, None
+        conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        return True, value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value and evict the least recently used entries over the size budget"""
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.warning("Not caching unpicklable result %s: %s", key, e)
+            return
+        if len(blob) > self.max_bytes:
+            return
+
+        now = time.time()
+        evict = []
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now)
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+                    if total <= self.max_bytes:
+                        break
+                    if old_key != key:
+                        evict.append((old_key,))
+                        total -= size
+                conn.executemany("DELETE FROM entries WHERE key = ?", evict)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._remove_locks(old_key for (old_key,) in evict)
+
+    def _lock_path(self, key: str) -> str:
+        return os.path.join(self.directory, "locks", f"{key}.lock")
+
+    def _remove_locks(self, keys) -> None:
+        """
+        Delete the lock files of dropped entries
+        A worker still holding a removed lock only means a second worker may compute
+        the same key once more; the SQLite write stays atomic either way.
+        """
+        for key in keys:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._lock_path(key))
+
+    @contextlib.contextmanager
+    def lock(self, key: str):
+        """Exclusive host-wide lock for computing one key"""
+        if fcntl is None:
+            yield
+            return
+        with open(self._lock_path(key), "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Cached value for key, computing it at most once per host"""
+        hit, value = self.get(key)
+        if hit:
+            return value
+        with self.lock(key):
+            # Another worker may have finished while we waited for the lock
+            hit, value = self.get(key)
+            if hit:
+                return value
+            value = compute()
+            self.set(key, value)
+            return value
+
+    def stats(self) -> Dict[str, int]:
+        """Entry count and total stored bytes"""
+        count, total = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        return {"entries": count, "bytes": total}
+
+    def clear(self) -> None:
+        """Drop every entry and its lock file"""
+        self._connection().execute("DELETE FROM entries")
+        locks = os.path.join(self.directory, "locks")
+        self._remove_locks(name[:-len(".lock")] for name in os.listdir(locks) if name.endswith(".lock"))
+
+
+# =========================================================
+# Cache keys
+# =========================================================
+
+def _update_hash(h, value: Any) -> None:
+    """Feed a value into the hash (data handles by fingerprint, DataFrames/arrays by content, the rest pickled)"""
+    if isinstance(value, DataHandle):
+        h.update(f"DataHandle:{value.fingerprint}".encode())
+    elif isinstance(value, pd.DataFrame):
+        h.update(pickle.dumps((list(value.columns), [str(t) for t in value.dtypes])))
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        h.update(pickle.dumps((value.name, str(value.dtype))))
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        h.update(pickle.dumps((value.shape, str(value.dtype))))
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update(type(value).__name__.encode())
+        for item in value:
+            _update_hash(h, item)
+    elif isinstance(value, dict):
+        for k in sorted(value, key=repr):
+            _update_hash(h, k)
+            _update_hash(h, value[k])
+    else:
+        h.update(pickle.dumps(value))
+
+
+def _project_module(value: Any) -> Optional[str]:
+    """Name of the module in PROJECT_DIR that defines value (a module, function, class or constant's module)"""
+    name = value.__name__ if inspect.ismodule(value) else getattr(value, "__module__", None)
+    module = sys.modules.get(name) if isinstance(name, str) else None
+    path = getattr(module, "__file__", None)
+    if path and os.path.dirname(os.path.abspath(path)) == PROJECT_DIR:
+        return name
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def code_salt(module_name: str) -> str:
+    """
+    Hash of CACHE_VERSION and the source of a module plus every project module it uses, directly or not
+    Editing a helper (fit_prophet, PROPHET_BEST_PARAMS, hierarchical_forecast, ...) then changes
+    the keys of every cached function that reaches it. Computed once per process.
+    """
+    seen, pending = set(), [module_name]
+    while pending:
+        name = pending.pop()
+        if name in seen or name not in sys.modules:
+            continue
+        seen.add(name)
+        for value in list(vars(sys.modules[name]).values()):
+            used = _project_module(value)
+            if used is not None and used not in seen:
+                pending.append(used)
+
+    h = hashlib.sha1(f"CACHE_VERSION:{CACHE_VERSION}".encode())
+    for name in sorted(seen):
+        h.update(name.encode())
+        try:
+            with open(sys.modules[name].__file__, "rb") as f:
+                h.update(f.read())
+        except (OSError, TypeError, AttributeError):
+            pass
+    return h.hexdigest()
+
+
+def make_key(func: Callable, bound: Dict[str, Any], extra_key: Any = None) -> str:
+    """
+    Key from the code the function depends on and its arguments
+    (underscore-prefixed arguments skipped, as in st.cache_data)
+    """
+    h = hashlib.sha1(f"{func.__module__}.{func.__qualname__}".encode())
+    h.update(code_salt(func.__module__).encode())
+    _update_hash(h, extra_key)
+    try:
+        h.update(inspect.getsource(func).encode())
+    except (OSError, TypeError):
+        pass
+    for name, value in bound.items():
+        if name.startswith("_"):
+            continue
+        h.update(name.encode())
+        _update_hash(h, value)
+    return h.hexdigest()
+
+
+_default_cache: Optional[DiskCache] = None
+
+
+def default_cache() -> Optional[DiskCache]:
+    """Process-wide cache in CACHE_DIR (None when the directory is not writable)"""
+    global _default_cache
+    if _default_cache is None:
+        try:
+            _default_cache = DiskCache()
+        except OSError as e:
+            logger.warning("Disk cache disabled: %s", e)
+            return None
+    return _default_cache
+
+
+def disk_cached(func: Optional[Callable] = None, *, extra_key: Any = None) -> Callable:
+    """
+    Persist a function's results in the shared disk cache
+    Meant to sit under @st.cache_data: the in-memory cache answers repeat calls
+    within a worker, this one answers the first call in every other worker and
+    after restarts. Keys cover the project code the function uses (see code_salt),
+    so a deploy does not serve stale results. Cache failures fall back to computing
+    directly; errors raised by the function itself propagate unchanged.
+    Args:
+        extra_key: Module-level configuration the result depends on (e.g. REGION_SCHEMES),
+            so entries written under an older configuration are not reused
+    """
+    if func is None:
+        return functools.partial(disk_cached, extra_key=extra_key)
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        cache = default_cache()
+        if cache is None:
+            return func(*args, **kwargs)
+
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        try:
+            key = make_key(func, bound.arguments, extra_key)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.warning("Disk cache key unavailable for %s: %s", func.__qualname__, e)
+            return func(*args, **kwargs)
+
+        computed, raised = [], []
+
+        def compute():
+            try:
+                computed.append(func(*args, **kwargs))
+            except BaseException:
+                raised.append(True)
+                raise
+            return computed[0]
+
+        try:
+            return cache.get_or_compute(key, compute)
+        except (sqlite3.Error, OSError) as e:
+            if raised:
+                raise
+            logger.warning("Disk cache unavailable for %s: %s", func.__qualname__, e)
+            # Keep a result computed before the store failed; otherwise compute directly
+            return computed[0] if computed else func(*args, **kwargs)
+
+    return wrapper
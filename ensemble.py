@@ -0,0 +1,108 @@
+# =========================================================
+# Ensemble Forecast - backtest-weighted Prophet + SARIMA
+# =========================================================
+
+import pandas as pd
+import numpy as np
+from typing import Dict, Tuple
+
+# 95% interval
+Z_95 = 1.959964
+
+
+def backtest_error_matrix(backtests: Dict[str, pd.DataFrame]) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Stack rolling backtests into an aligned (models, rounds, horizon step) error array
+    Only target months forecast by every model are kept, so errors are comparable.
+    Args:
+        backtests: Model name -> frame with Round, ds, Actual, forecast
+    Returns: (errors, targets) where targets holds the shared Round / ds / step rows
+    """
+    frames = []
+    for name, bt in backtests.items():
+        frame = bt[["Round", "ds", "Actual", "forecast"]].copy()
+        frame["ds"] = pd.to_datetime(frame["ds"])
+        frame = frame.sort_values(["Round", "ds"])
+        frame["step"] = frame.groupby("Round").cumcount()
+        frames.append(frame.set_index(["Round", "step"]).add_suffix(f"|{name}"))
+
+    aligned = pd.concat(frames, axis=1, join="inner").sort_index()
+    rounds = aligned.index.get_level_values("Round").unique()
+    n_steps = aligned.index.get_level_values("step").max() + 1
+    full_index = pd.MultiIndex.from_product([rounds, range(n_steps)], names=["Round", "step"])
+    aligned = aligned.reindex(full_index)
+
+    errors = np.stack([
+        (aligned[f"Actual|{name}"] - aligned[f"forecast|{name}"]).to_numpy().reshape(len(rounds), n_steps)
+        for name in backtests
+    ])
+    return errors, aligned.reset_index()[["Round", "step"]]
+
+
+def horizon_weights(errors: np.ndarray, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Inverse-MSE weights per model and horizon step, plus the ensemble RMSE per step
+    Steps beyond the backtest horizon reuse the last step's weights and grow
+    the error with sqrt(h / H).
+    Args:
+        errors: Backtest errors with shape (models, rounds, steps)
+        horizon: Number of forecast steps to produce weights for
+    Returns: (weights (models, horizon), rmse (horizon,))
+    """
+    mse = np.nanmean(errors ** 2, axis=1)
+    inv = 1.0 / np.maximum(mse, 1e-9)
+    weights_bt = inv / inv.sum(axis=0, keepdims=True)
+
+    # Error of the combined forecast on the backtest itself
+    ens_errors = np.einsum("ms,mrs->rs", weights_bt, np.nan_to_num(errors))
+    valid = ~np.isnan(errors).any(axis=0)
+    rmse_bt = np.sqrt((ens_errors ** 2 * valid).sum(axis=0) / np.maximum(valid.sum(axis=0), 1))
+
+    n_steps = errors.shape[2]
+    steps = np.arange(horizon)
+    src = np.minimum(steps, n_steps - 1)
+    weights = weights_bt[:, src]
+    growth = np.sqrt(np.maximum(steps + 1, n_steps) / n_steps)
+    rmse = rmse_bt[src] * growth
+    return weights, rmse
+
+
+def combine_forecasts(forecasts: np.ndarray, weights: np.ndarray, rmse: np.ndarray,
+                      z: float = Z_95) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Weighted combination of aligned model forecasts with symmetric intervals
+    Args:
+        forecasts: Model forecasts with shape (models, horizon)
+    Returns: (yhat, yhat_lower, yhat_upper)
+    """
+    yhat = (weights * forecasts).sum(axis=0)
+    return yhat, yhat - z * rmse, yhat + z * rmse
+
+
+def ensemble_forecast(futures: Dict[str, pd.DataFrame], backtests: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Backtest-weighted ensemble of model future forecasts
+    Args:
+        futures: Model name -> future frame with ds / yhat (same names as backtests)
+        backtests: Model name -> rolling backtest frame
+    Returns: ds, yhat, yhat_lower, yhat_upper and a weight column per model
+    """
+    names = list(futures.keys())
+    aligned = pd.concat(
+        [futures[name].set_index("ds")["yhat"].rename(name) for name in names],
+        axis=1, join="inner"
+    ).sort_index()
+
+    errors, _ = backtest_error_matrix({name: backtests[name] for name in names})
+    weights, rmse = horizon_weights(errors, len(aligned))
+    yhat, lower, upper = combine_forecasts(aligned[names].to_numpy().T, weights, rmse)
+
+    result = pd.DataFrame({
+        "ds": aligned.index,
+        "yhat": yhat,
+        "yhat_lower": lower,
+        "yhat_upper": upper,
+    })
+    for i, name in enumerate(names):
+        result[f"weight_{name}"] = weights[i]
+    return result
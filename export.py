@@ -0,0 +1,113 @@
+# =========================================================
+# Data Export - chunked CSV / Parquet / Excel writers
+# =========================================================
+
+import importlib.util
+import tempfile
+import zipfile
+import pandas as pd
+from typing import BinaryIO, Dict, Iterator, List
+
+EXPORT_CHUNK_ROWS = 5000
+
+# Keep up to 8 MB in memory, larger exports spill to a temp file on disk
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# format -> (file extension, mime type, optional dependency)
+EXPORT_FORMATS = {
+    "CSV": ("zip", "application/zip", None),
+    "Parquet": ("zip", "application/zip", "pyarrow"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "openpyxl"),
+}
+
+
+def available_export_formats() -> List[str]:
+    """Export formats whose optional dependency is installed"""
+    return [
+        fmt for fmt, (_, _, module) in EXPORT_FORMATS.items()
+        if module is None or importlib.util.find_spec(module) is not None
+    ]
+
+
+def iter_chunks(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Yield consecutive row slices (views, no copies) of a DataFrame"""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _write_csv(tables: Dict[str, pd.DataFrame], out: BinaryIO, chunk_rows: int) -> None:
+    """One CSV per table inside a zip archive, written chunk by chunk"""
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, df in tables.items():
+            with zf.open(f"{name}.csv", "w") as member:
+                for i, chunk in enumerate(iter_chunks(df, chunk_rows)):
+                    # utf-8-sig so Excel opens the Thai province names correctly
+                    encoding = "utf-8-sig" if i == 0 else "utf-8"
+                    member.write(chunk.to_csv(index=False, header=i == 0).encode(encoding))
+
+
+def _write_parquet(tables: Dict[str, pd.DataFrame], out: BinaryIO, chunk_rows: int) -> None:
+    """One Parquet file per table inside a zip archive, one row group per chunk"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as zf:
+        for name, df in tables.items():
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+            with zf.open(f"{name}.parquet", "w") as member:
+                with pq.ParquetWriter(member, schema) as writer:
+                    for chunk in iter_chunks(df, chunk_rows):
+                        writer.write_table(
+                            pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                        )
+
+
+def _write_excel(tables: Dict[str, pd.DataFrame], out: BinaryIO, chunk_rows: int) -> None:
+    """One sheet per table using openpyxl's streaming write-only workbook"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for name, df in tables.items():
+        # Excel sheet names are limited to 31 characters
+        ws = wb.create_sheet(title=name[:31])
+        ws.append([str(col) for col in df.columns])
+        for chunk in iter_chunks(df, chunk_rows):
+            for row in chunk.itertuples(index=False, name=None):
+                ws.append([v.to_pydatetime() if isinstance(v, pd.Timestamp) else v for v in row])
+    wb.save(out)
+
+
+_WRITERS = {
+    "CSV": _write_csv,
+    "Parquet": _write_parquet,
+    "Excel": _write_excel,
+}
+
+
+def export_tables(tables: Dict[str, pd.DataFrame], fmt: str,
+                  chunk_rows: int = EXPORT_CHUNK_ROWS) -> BinaryIO:
+    """
+    Write several tables to a single downloadable file
+    Args:
+        tables: Table name -> DataFrame
+        fmt: One of EXPORT_FORMATS
+        chunk_rows: Rows serialized per write
+    Returns: Spooled temp file positioned at the start
+    """
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    _WRITERS[fmt](tables, out, chunk_rows)
+    out.seek(0)
+    return out
+
+
+def export_file_name(base_name: str, fmt: str) -> str:
+    """File name with the extension of the export format"""
+    return f"{base_name}.{EXPORT_FORMATS[fmt][0]}"
+
+
+def export_mime(fmt: str) -> str:
+    """MIME type of the export format"""
+    return EXPORT_FORMATS[fmt][1]
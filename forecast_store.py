@@ -0,0 +1,330 @@
+# =========================================================
+# Forecast Store - every forecast run in one indexed SQLite table
+# Rows are keyed by (model, series, kind, version, round, ds) in a clustered
+# primary key, so reading one series' months of one run is a single index
+# seek, and older runs stay queryable for drift analysis.
+# =========================================================
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import pandas as pd
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from artifacts import DataHandle
+from regional_store import NATION_LABEL
+
+logger = logging.getLogger(__name__)
+
+# Location, overridable per deployment (unlike the disk cache, nothing here is evicted)
+STORE_PATH = os.environ.get("DASHBOARD_FORECAST_STORE", "forecast_store.sqlite3")
+
+# Seconds a writer waits on the database lock before giving up
+SQLITE_TIMEOUT = 30.0
+
+# Normalized value columns (NaN where a source has no such column)
+VALUE_COLUMNS = ["actual", "yhat", "yhat_lower", "yhat_upper"]
+
+# Kinds of rows: future/fitted forecasts and rolling-origin backtests (one round per origin)
+FORECAST = "forecast"
+BACKTEST = "backtest"
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS runs ("
+    " model TEXT NOT NULL, series TEXT NOT NULL, kind TEXT NOT NULL, version TEXT NOT NULL,"
+    " created REAL NOT NULL, source TEXT NOT NULL, rows INTEGER NOT NULL,"
+    " PRIMARY KEY (model, series, kind, version)) WITHOUT ROWID",
+    # Latest run per series without scanning its history
+    "CREATE INDEX IF NOT EXISTS runs_latest ON runs (model, series, kind, created)",
+    "CREATE TABLE IF NOT EXISTS forecasts ("
+    " model TEXT NOT NULL, series TEXT NOT NULL, kind TEXT NOT NULL, version TEXT NOT NULL,"
+    " round TEXT NOT NULL, ds TEXT NOT NULL,"
+    " actual REAL, yhat REAL, yhat_lower REAL, yhat_upper REAL,"
+    " PRIMARY KEY (model, series, kind, version, round, ds)) WITHOUT ROWID",
+]
+
+
+def series_id(metric: str, name: str = NATION_LABEL) -> str:
+    """Series key: metric and node, e.g. "Divorce/ทั้งประเทศ" or "Marriage/จังหวัดน่าน" """
+    return f"{metric}/{name}"
+
+
+def run_version(*parts) -> str:
+    """Version string for a run derived from several inputs (data fingerprint, settings)"""
+    return hashlib.sha1(":".join(str(p) for p in parts).encode()).hexdigest()
+
+
+def _ds_text(values) -> np.ndarray:
+    """Dates as ISO strings, which sort and compare like the dates in SQLite"""
+    return pd.to_datetime(pd.Series(values)).dt.strftime("%Y-%m-%d").to_numpy()
+
+
+class ForecastStore:
+    """
+    Forecast runs in one SQLite file, all in the normalized VALUE_COLUMNS schema
+    A run is identified by (model, series, kind, version); writing a run that
+    already exists replaces its rows, so re-recording the same inputs is idempotent.
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not shareable)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+        return conn
+
+    def has_run(self, model: str, series: str, version: str, kind: str = FORECAST) -> bool:
+        """Whether a run is already recorded"""
+        return self._connection().execute(
+            "SELECT 1 FROM runs WHERE model = ? AND series = ? AND kind = ? AND version = ?",
+            (model, series, kind, version)
+        ).fetchone() is not None
+
+    def write_runs(self, runs: Iterable[Tuple[str, str, str, str, pd.DataFrame]], source: str = "") -> int:
+        """
+        Record several runs in one transaction
+        Args:
+            runs: (model, series, kind, version, frame) tuples; frame has ds, any of
+                VALUE_COLUMNS and, for backtests, round
+            source: Where the runs came from (artifact file, function), kept with each run
+        Returns: rows written
+        """
+        now = time.time()
+        run_rows, forecast_rows = [], []
+        for model, series, kind, version, frame in runs:
+            values = [
+                frame[c].to_numpy(dtype=float) if c in frame.columns else np.full(len(frame), np.nan)
+                for c in VALUE_COLUMNS
+            ]
+            rounds = frame["round"].astype(str).to_numpy() if "round" in frame.columns else [""] * len(frame)
+            # NaN is stored as NULL
+            cells = [[None if np.isnan(v) else float(v) for v in column] for column in values]
+            forecast_rows += [
+                (model, series, kind, version, r, ds, *row)
+                for r, ds, row in zip(rounds, _ds_text(frame["ds"]), zip(*cells))
+            ]
+            run_rows.append((model, series, kind, version, now, source, len(frame)))
+
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "DELETE FROM forecasts WHERE model = ? AND series = ? AND kind = ? AND version = ?",
+                [row[:4] for row in run_rows]
+            )
+            conn.executemany("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)", run_rows)
+            conn.executemany("INSERT INTO forecasts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", forecast_rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(forecast_rows)
+
+    def write(self, model: str, series: str, version: str, frame: pd.DataFrame,
+              kind: str = FORECAST, source: str = "") -> int:
+        """Record one run (see write_runs)"""
+        return self.write_runs([(model, series, kind, version, frame)], source)
+
+    def latest_version(self, model: str, series: str, kind: str = FORECAST) -> Optional[str]:
+        """Version of the most recently recorded run, None if there is none"""
+        row = self._connection().execute(
+            "SELECT version FROM runs WHERE model = ? AND series = ? AND kind = ?"
+            " ORDER BY created DESC LIMIT 1",
+            (model, series, kind)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def read(self, model: str, series: str, version: Optional[str] = None, start=None, end=None,
+             kind: str = FORECAST, round: Optional[str] = None) -> pd.DataFrame:
+        """
+        Rows of one run between start and end (inclusive, either open)
+        Args:
+            version: Run to read (latest when None)
+            round: Backtest round; forecasts have none, backtests return every round when None
+        Returns: round, ds, VALUE_COLUMNS (empty when the run does not exist)
+        """
+        version = version if version is not None else self.latest_version(model, series, kind)
+        if version is None:
+            return pd.DataFrame(columns=["round", "ds"] + VALUE_COLUMNS)
+
+        query = "SELECT round, ds, actual, yhat, yhat_lower, yhat_upper FROM forecasts" \
+                " WHERE model = ? AND series = ? AND kind = ? AND version = ?"
+        params: List = [model, series, kind, version]
+        if round is not None or kind == FORECAST:
+            query += " AND round = ?"
+            params.append(round or "")
+        if start is not None:
+            query += " AND ds >= ?"
+            params.append(_ds_text([start])[0])
+        if end is not None:
+            query += " AND ds <= ?"
+            params.append(_ds_text([end])[0])
+        return self._frame(query + " ORDER BY round, ds", params)
+
+    def history(self, model: str, series: str, start=None, end=None, kind: str = FORECAST) -> pd.DataFrame:
+        """
+        Every recorded run of a series over one date range, oldest run first (for drift analysis)
+        Returns: version, created, round, ds, VALUE_COLUMNS
+        """
+        query = "SELECT r.version, r.created, f.round, f.ds, f.actual, f.yhat, f.yhat_lower, f.yhat_upper" \
+                " FROM runs r JOIN forecasts f ON f.model = r.model AND f.series = r.series" \
+                " AND f.kind = r.kind AND f.version = r.version" \
+                " WHERE r.model = ? AND r.series = ? AND r.kind = ?"
+        params: List = [model, series, kind]
+        if start is not None:
+            query += " AND f.ds >= ?"
+            params.append(_ds_text([start])[0])
+        if end is not None:
+            query += " AND f.ds <= ?"
+            params.append(_ds_text([end])[0])
+        history = self._frame(query + " ORDER BY r.created, f.round, f.ds", params)
+        history["created"] = pd.to_datetime(history["created"], unit="s")
+        return history
+
+    def runs(self, model: Optional[str] = None, series: Optional[str] = None) -> pd.DataFrame:
+        """Recorded runs, newest first, optionally for one model and/or series"""
+        query = "SELECT model, series, kind, version, created, source, rows FROM runs"
+        filters = [(c, v) for c, v in (("model", model), ("series", series)) if v is not None]
+        if filters:
+            query += " WHERE " + " AND ".join(f"{c} = ?" for c, _ in filters)
+        runs = pd.read_sql_query(query + " ORDER BY created DESC", self._connection(),
+                                 params=[v for _, v in filters])
+        runs["created"] = pd.to_datetime(runs["created"], unit="s")
+        return runs
+
+    def prune(self, keep: int) -> int:
+        """
+        Keep only the newest keep runs of every (model, series, kind)
+        Returns: runs deleted
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            stale = conn.execute(
+                "SELECT model, series, kind, version FROM ("
+                " SELECT *, ROW_NUMBER() OVER (PARTITION BY model, series, kind ORDER BY created DESC) AS n"
+                " FROM runs) WHERE n > ?",
+                (keep,)
+            ).fetchall()
+            conn.executemany(
+                "DELETE FROM forecasts WHERE model = ? AND series = ? AND kind = ? AND version = ?", stale
+            )
+            conn.executemany(
+                "DELETE FROM runs WHERE model = ? AND series = ? AND kind = ? AND version = ?", stale
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(stale)
+
+    def _frame(self, query: str, params: List) -> pd.DataFrame:
+        """Query result with parsed dates and NULL values back to NaN"""
+        frame = pd.read_sql_query(query, self._connection(), params=params)
+        frame["ds"] = pd.to_datetime(frame["ds"])
+        frame[VALUE_COLUMNS] = frame[VALUE_COLUMNS].astype(float)
+        return frame
+
+
+def _write_logged(store: ForecastStore, runs: List, source: str, skip_recorded: bool = False) -> int:
+    """Write runs, logging instead of raising when the store is unavailable (recording is best effort)"""
+    try:
+        if skip_recorded:
+            runs = [run for run in runs if not store.has_run(run[0], run[1], run[3], run[2])]
+        return store.write_runs(runs, source=source) if runs else 0
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("Forecast store unavailable, %s runs not recorded: %s", source, e)
+        return 0
+
+
+# =========================================================
+# CSV Artifacts
+# =========================================================
+
+# Artifact name -> (model, kind, source column -> normalized column); the national
+# divorce series throughout. Backtest frames carry their own model name in "Model".
+ARTIFACT_FORECASTS: Dict[str, Tuple[str, str, Dict[str, str]]] = {
+    "prophet_future": ("Prophet", FORECAST, {"Divorce": "actual", "Forecast": "yhat"}),
+    "sarimax_future": ("SARIMA", FORECAST, {"y": "actual"}),
+    "sarimax_exog_future": ("SARIMAX", FORECAST, {"floor": "yhat_lower", "cap": "yhat_upper"}),
+    "sarimax_rolling": ("SARIMAX", BACKTEST, {"Actual": "actual", "forecast": "yhat", "Round": "round"}),
+}
+
+
+def normalize_artifact(name: str, frame: pd.DataFrame) -> List[Tuple[str, pd.DataFrame]]:
+    """
+    Split one forecast artifact into (model, frame) runs in the normalized schema
+    Returns: one entry per model in the file
+    """
+    model, _, columns = ARTIFACT_FORECASTS[name]
+    frame = frame.rename(columns=columns)
+    if "Model" not in frame.columns:
+        return [(model, frame)]
+    return [(str(m), part) for m, part in frame.groupby("Model", sort=False)]
+
+
+def record_artifacts(store: ForecastStore, handles: Dict[str, DataHandle]) -> int:
+    """
+    Record the forecast CSV artifacts, one run per file version (the handle fingerprint)
+    Files already recorded at their current version are skipped.
+    Returns: rows written
+    """
+    series = series_id("Divorce")
+    runs = []
+    for name, (_, kind, _) in ARTIFACT_FORECASTS.items():
+        handle = handles.get(name)
+        if handle is None or handle.frame.empty:
+            continue
+        runs += [
+            (model, series, kind, handle.fingerprint, frame)
+            for model, frame in normalize_artifact(name, handle.frame)
+        ]
+    return _write_logged(store, runs, "artifacts", skip_recorded=True)
+
+
+# =========================================================
+# Hierarchical Forecasts
+# =========================================================
+
+def node_series(nodes: pd.DataFrame, metric: str, scheme: str) -> List[str]:
+    """
+    Series key of every hierarchy node
+    Regions are qualified by their scheme (the same name covers different provinces
+    across schemes) and districts by their province.
+    """
+    keys = []
+    for level, name, province in zip(nodes["Level"], nodes["Name"], nodes["Province"]):
+        if level == "Region":
+            name = f"{scheme}/{name}"
+        elif level == "District":
+            name = f"{province}/{name}"
+        keys.append(series_id(metric, name))
+    return keys
+
+
+def record_hierarchy(store: ForecastStore, result: Dict, scheme: str, metric: str, method: str) -> int:
+    """
+    Record base and reconciled forecasts of every node of a reconcile_regional_forecast result
+    Runs already recorded at the result's version are skipped.
+    Returns: rows written
+    """
+    version = result["version"]
+    runs = []
+    for i, series in enumerate(node_series(result["nodes"], metric, scheme)):
+        for model, values in (("Base", result["base"][i]), (f"Reconciled ({method})", result["reconciled"][i])):
+            frame = pd.DataFrame({"ds": result["future_dates"], "yhat": values})
+            runs.append((model, series, FORECAST, version, frame))
+    return _write_logged(store, runs, "hierarchy", skip_recorded=True)
@@ -0,0 +1,326 @@
+# =========================================================
+# Forecasting - Prophet model functions (from basic_Prophet.ipynb)
+# =========================================================
+
+import hashlib
+import logging
+import os
+import tempfile
+import streamlit as st
+import pandas as pd
+import numpy as np
+from prophet import Prophet
+from prophet.utilities import regressor_coefficients
+from typing import Dict, Optional, Sequence, Tuple
+
+from artifacts import DataHandle, HANDLE_HASH_FUNCS
+from disk_cache import disk_cached
+from metrics import error_metrics
+from scenarios import MARRIAGE, baseline_marriage
+
+logger = logging.getLogger(__name__)
+
+# Longest horizon offered anywhere in the dashboard (months)
+PROPHET_MAX_HORIZON = 60
+
+# Uncertainty modes -> number of posterior samples used for yhat_lower/yhat_upper
+# Sampling dominates predict time, "fast" keeps usable intervals at a fraction of the cost
+UNCERTAINTY_SAMPLES = {
+    "full": 1000,
+    "fast": 200,
+    "off": 0,
+}
+
+PREDICTION_COLUMNS = ["ds", "yhat", "yhat_lower", "yhat_upper", "trend"]
+
+
+def select_uncertainty_samples(show_confidence_intervals: bool, fast_uncertainty: bool) -> int:
+    """Prophet posterior samples for the sidebar settings (0 when intervals are hidden)"""
+    if not show_confidence_intervals:
+        return UNCERTAINTY_SAMPLES["off"]
+    if fast_uncertainty:
+        return UNCERTAINTY_SAMPLES["fast"]
+    return UNCERTAINTY_SAMPLES["full"]
+
+
+# Best parameters from basic_Prophet.ipynb
+# These were found through extensive grid search
+PROPHET_BEST_PARAMS = {
+    'changepoint_prior_scale': 1.0,
+    'seasonality_prior_scale': 0.1,
+    'yearly_seasonality': True,
+    'weekly_seasonality': False,
+    'daily_seasonality': False
+}
+
+
+def prepare_prophet_frame(df: pd.DataFrame, regressors: Sequence[str] = ()) -> pd.DataFrame:
+    """Rename Divorce to y and set cap/floor for logistic growth (regressor columns are kept)"""
+    df_prophet = df[['ds', 'Divorce', *regressors]].copy()
+    df_prophet = df_prophet.rename(columns={"Divorce": "y"})
+
+    global_cap = df_prophet['y'].max() * 1.2
+    global_floor = 0
+    df_prophet['cap'] = global_cap
+    df_prophet['floor'] = global_floor
+    return df_prophet
+
+
+# =========================================================
+# Warm Starts
+# Fitted parameters are persisted per series and used as the optimizer's
+# starting point for the next fit, which after a month of new data is close by.
+# =========================================================
+
+PROPHET_STATE_DIR = "prophet_state"
+
+# Parameters Stan accepts as initial values
+WARM_START_PARAMS = ["k", "m", "delta", "beta", "sigma_obs"]
+
+# A warm fit whose log posterior per observation ends this far below the fit it
+# started from is treated as stuck and redone from Prophet's default start
+WARM_START_LP_TOLERANCE = 0.05
+
+
+def prophet_state(model: Prophet) -> Dict[str, np.ndarray]:
+    """Fitted (MAP) parameters of a model plus its log posterior per observation"""
+    state = {name: np.asarray(model.params[name], dtype=float).reshape(-1) for name in WARM_START_PARAMS}
+    state["lp_per_obs"] = np.array(model.stan_fit.optimized_params_dict["lp__"] / len(model.history))
+    return state
+
+
+def _state_path(series: str, directory: str) -> str:
+    return os.path.join(directory, hashlib.sha1(series.encode()).hexdigest()[:16] + ".npz")
+
+
+def load_prophet_state(series: str, directory: str = PROPHET_STATE_DIR) -> Optional[Dict[str, np.ndarray]]:
+    """Last persisted state of a series (None when missing or unreadable)"""
+    try:
+        with np.load(_state_path(series, directory)) as data:
+            state = {key: data[key] for key in data.files}
+    except (OSError, ValueError):
+        return None
+    return state if all(name in state for name in WARM_START_PARAMS + ["lp_per_obs"]) else None
+
+
+def save_prophet_state(series: str, state: Dict[str, np.ndarray], directory: str = PROPHET_STATE_DIR) -> None:
+    """Persist a state atomically (write temp file, then rename); best effort"""
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npz")
+        os.close(fd)
+        try:
+            np.savez(tmp_path, series=np.array(series), **state)
+            os.replace(tmp_path, _state_path(series, directory))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    except OSError as e:
+        logger.warning("Prophet state for %s not saved: %s", series, e)
+
+
+def fit_prophet(df_prophet: pd.DataFrame, init: Optional[Dict[str, np.ndarray]] = None,
+                check_lp: bool = True, regressors: Sequence[str] = (), **params) -> Prophet:
+    """
+    Fit a logistic-growth Prophet model, warm-started from init when given
+    Falls back to a cold start when the warm fit fails to converge or, with check_lp,
+    ends clearly worse than the fit init came from (see WARM_START_LP_TOLERANCE).
+    Args:
+        df_prophet: Prepared frame (ds, y, cap, floor)
+        init: A prophet_state, usually of the previous fit on this series
+        check_lp: Compare log posteriors; only meaningful when init was fitted on
+            (nearly) the same data, not e.g. on a much shorter window
+        regressors: Columns of df_prophet added as additive extra regressors
+        params: Prophet constructor arguments besides growth
+    """
+    def new_model() -> Prophet:
+        model = Prophet(growth='logistic', **params)
+        for name in regressors:
+            model.add_regressor(name, mode='additive')
+        return model
+
+    if init is not None:
+        # Mismatched delta/beta shapes (e.g. other seasonalities) fall back to the defaults in Stan
+        stan_init = {
+            name: init[name] if name in ("delta", "beta") else float(init[name][0])
+            for name in WARM_START_PARAMS
+        }
+        try:
+            model = new_model().fit(df_prophet, init=stan_init)
+            lp_per_obs = model.stan_fit.optimized_params_dict["lp__"] / len(model.history)
+            if np.isfinite(lp_per_obs) and (
+                not check_lp or lp_per_obs >= float(init["lp_per_obs"]) - WARM_START_LP_TOLERANCE
+            ):
+                return model
+            logger.info("Prophet warm start converged poorly (lp/obs %.3f), refitting cold", lp_per_obs)
+        except RuntimeError as e:
+            logger.info("Prophet warm start failed (%s), refitting cold", e)
+
+    return new_model().fit(df_prophet)
+
+
+@st.cache_data(show_spinner="Training Prophet model with hyperparameter tuning...", hash_funcs=HANDLE_HASH_FUNCS)
+@disk_cached
+def train_prophet_model(data: DataHandle) -> Tuple[Prophet, DataHandle, Dict]:
+    """
+    Train Prophet model with optimized parameters from basic_Prophet.ipynb
+    Warm-started from the last fit on the same series (the handle name), whose state is then replaced.
+    Args:
+        data: National series (ds / Divorce), keyed by its fingerprint
+    Returns: (trained_model, prepared data handle, parameters_used)
+    """
+    df_prophet = prepare_prophet_frame(data.frame)
+
+    # Train Prophet model with logistic growth
+    model = fit_prophet(df_prophet, load_prophet_state(data.name), **PROPHET_BEST_PARAMS)
+    save_prophet_state(data.name, prophet_state(model))
+
+    return model, data.derive("prophet_frame", df_prophet), PROPHET_BEST_PARAMS
+
+
+@st.cache_data(show_spinner="Generating Prophet forecast...", hash_funcs=HANDLE_HASH_FUNCS)
+@disk_cached
+def predict_prophet(_model, prophet_data: DataHandle, periods: int = PROPHET_MAX_HORIZON,
+                    uncertainty_samples: int = UNCERTAINTY_SAMPLES["full"]) -> pd.DataFrame:
+    """
+    Single Prophet prediction over history + the maximum horizon
+    Metrics, future forecast views and comparison charts all slice this frame.
+    Args:
+        _model: Trained Prophet model (underscore prefix to skip caching this arg)
+        prophet_data: Prepared data with cap/floor, as returned by train_prophet_model
+        periods: Number of future months to predict
+        uncertainty_samples: Posterior samples for intervals (0 skips interval sampling)
+    """
+    _model.uncertainty_samples = uncertainty_samples
+    df_prophet = prophet_data.frame
+
+    future = _model.make_future_dataframe(periods=periods, freq='MS')
+    future['cap'] = df_prophet['cap'].iloc[0]
+    future['floor'] = df_prophet['floor'].iloc[0]
+
+    forecast = _model.predict(future)
+
+    # yhat_lower / yhat_upper only exist when uncertainty was sampled
+    columns = [col for col in PREDICTION_COLUMNS if col in forecast.columns]
+    return forecast[columns].copy()
+
+
+@st.cache_data(show_spinner="Training Prophet model with the Marriage regressor...", hash_funcs=HANDLE_HASH_FUNCS)
+@disk_cached
+def train_prophet_scenario_model(data: DataHandle) -> Tuple[Prophet, DataHandle, float]:
+    """
+    Prophet model with Marriage as an additive extra regressor, fitted once for every scenario
+    Args:
+        data: National series with ds / Divorce / Marriage
+    Returns: (trained model, prepared data handle, divorces per additional marriage)
+    """
+    df_prophet = prepare_prophet_frame(data.frame, regressors=[MARRIAGE])
+    series = f"{data.name}+{MARRIAGE}"
+    model = fit_prophet(df_prophet, load_prophet_state(series), regressors=[MARRIAGE], **PROPHET_BEST_PARAMS)
+    save_prophet_state(series, prophet_state(model))
+
+    coefficients = regressor_coefficients(model).set_index("regressor")
+    return model, data.derive("prophet_scenario_frame", df_prophet), float(coefficients.loc[MARRIAGE, "coef"])
+
+
+@st.cache_data(show_spinner="Generating scenario baseline forecast...", hash_funcs=HANDLE_HASH_FUNCS)
+@disk_cached
+def predict_scenario_baseline(_model, prophet_data: DataHandle, periods: int = PROPHET_MAX_HORIZON,
+                              uncertainty_samples: int = UNCERTAINTY_SAMPLES["full"]) -> pd.DataFrame:
+    """
+    The one prediction all marriage scenarios are derived from (see scenarios.apply_scenarios)
+    Future months only, with marriages following the seasonal naive baseline.
+    Args:
+        _model: Model from train_prophet_scenario_model (underscore prefix to skip caching this arg)
+        prophet_data: Prepared data handle returned with the model
+    Returns: ds, Marriage, yhat (and yhat_lower / yhat_upper when uncertainty is sampled)
+    """
+    _model.uncertainty_samples = uncertainty_samples
+    df_prophet = prophet_data.frame
+
+    future_ds = pd.date_range(df_prophet['ds'].max() + pd.DateOffset(months=1), periods=periods, freq='MS')
+    future = pd.DataFrame({'ds': future_ds, MARRIAGE: baseline_marriage(df_prophet, future_ds)})
+    future['cap'] = df_prophet['cap'].iloc[0]
+    future['floor'] = df_prophet['floor'].iloc[0]
+
+    forecast = _model.predict(future)
+    columns = [col for col in ['yhat', 'yhat_lower', 'yhat_upper'] if col in forecast.columns]
+    return pd.concat([future[['ds', MARRIAGE]], forecast[columns]], axis=1)
+
+
+def split_prophet_prediction(prediction: pd.DataFrame, last_ds: pd.Timestamp) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Split a shared prediction into (in-sample fit, future forecast) by the last observed date"""
+    is_future = prediction['ds'] > last_ds
+    return prediction[~is_future], prediction[is_future].reset_index(drop=True)
+
+
+def calculate_prophet_metrics_from_forecast(prediction: pd.DataFrame, df: pd.DataFrame) -> Dict:
+    """
+    Calculate Prophet metrics by comparing the shared prediction with actual data
+    Based on the approach from basic_Prophet.ipynb, scored with the shared metrics engine
+    """
+    # Merge forecast with actual data (inner join keeps the historical period only)
+    metric_df = (
+        prediction[['ds', 'yhat']]
+        .merge(df[['ds', 'Divorce']].rename(columns={"Divorce": "y"}), on='ds', how='inner')
+    )
+
+    scores = error_metrics(metric_df['y'].to_numpy(), metric_df['yhat'].to_numpy())
+
+    return {
+        'MAE': float(scores['MAE']),
+        'MSE': float(scores['RMSE']) ** 2,
+        'RMSE': float(scores['RMSE']),
+        'MAPE': float(scores['MAPE']),
+        'sMAPE': float(scores['sMAPE']),
+        'forecast_df': metric_df.rename(columns={'y': 'Actual', 'yhat': 'Forecast'})
+    }
+
+
+@st.cache_data(show_spinner="Backtesting Prophet on rolling origins...", hash_funcs=HANDLE_HASH_FUNCS)
+@disk_cached
+def prophet_rolling_backtest(data: DataHandle, rounds: Tuple[Tuple[str, str], ...], horizon: int = 12) -> pd.DataFrame:
+    """
+    Expanding-window Prophet backtest on the same origins as the SARIMA rounds
+    Each round trains on everything before its test start (cap from training data only),
+    warm-started from that round's last fit, else from the previous round
+    Args:
+        data: National series with ds / Divorce
+        rounds: (round name, test start date) pairs, e.g. from sarimax_rolling_forecast.csv
+        horizon: Months forecast per round
+    Returns: Model, Round, ds, Actual, forecast - same layout as sarimax_rolling_forecast.csv
+    """
+    df = data.frame
+    rows = []
+    previous = None
+    for round_name, start in rounds:
+        start = pd.Timestamp(start)
+        train = prepare_prophet_frame(df[df['ds'] < start])
+        test = df[(df['ds'] >= start) & (df['ds'] < start + pd.DateOffset(months=horizon))]
+        if len(train) < 24 or test.empty:
+            continue
+
+        # The previous round saw a year less data, so its log posterior is no reference
+        series = f"{data.name}@{start:%Y-%m}"
+        init = load_prophet_state(series)
+        model = fit_prophet(train, init if init is not None else previous, check_lp=init is not None,
+                            uncertainty_samples=0, **PROPHET_BEST_PARAMS)
+        previous = prophet_state(model)
+        save_prophet_state(series, previous)
+
+        future = pd.DataFrame({'ds': test['ds'].to_numpy()})
+        future['cap'] = train['cap'].iloc[0]
+        future['floor'] = train['floor'].iloc[0]
+        forecast = model.predict(future)
+
+        rows.append(pd.DataFrame({
+            'Model': 'Prophet',
+            'Round': round_name,
+            'ds': test['ds'].to_numpy(),
+            'Actual': test['Divorce'].to_numpy(),
+            'forecast': forecast['yhat'].to_numpy()
+        }))
+
+    if not rows:
+        return pd.DataFrame(columns=['Model', 'Round', 'ds', 'Actual', 'forecast'])
+    return pd.concat(rows, ignore_index=True)
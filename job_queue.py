@@ -0,0 +1,255 @@
+# =========================================================
+# Job Queue - persistent refit jobs with priorities and checkpoints
+# Filled and drained by scheduler.py; the dashboard only reads its status.
+# =========================================================
+
+import functools
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import pandas as pd
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Location, overridable per deployment
+QUEUE_PATH = os.environ.get("DASHBOARD_JOB_QUEUE", "jobs.sqlite3")
+
+# Seconds a worker waits on the database lock before giving up
+SQLITE_TIMEOUT = 30.0
+
+# Runs a job may start before it is marked failed: a run that raised or was killed
+# is queued again after RETRY_BACKOFF seconds, doubling with every attempt
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 60.0
+
+# Job states; a finished job is never run again, whether it succeeded or not
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    " key TEXT PRIMARY KEY, task TEXT NOT NULL, args TEXT NOT NULL, label TEXT NOT NULL,"
+    " priority INTEGER NOT NULL, version TEXT NOT NULL, requires TEXT NOT NULL,"
+    " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, enqueued REAL NOT NULL,"
+    " started REAL, finished REAL, seconds REAL, detail TEXT, retry_after REAL)",
+    # Next job to run: highest priority first, then in enqueue order
+    "CREATE INDEX IF NOT EXISTS jobs_next ON jobs (status, priority)",
+    "CREATE INDEX IF NOT EXISTS jobs_version ON jobs (version, status)",
+    "CREATE TABLE IF NOT EXISTS checkpoints ("
+    " key TEXT PRIMARY KEY, value BLOB NOT NULL, saved REAL NOT NULL)",
+]
+
+
+@dataclass(frozen=True)
+class Job:
+    """
+    One unit of work: a task name from scheduler.TASKS and its arguments
+    priority orders runnable jobs (lower runs first); requires holds keys of jobs
+    that must finish first. The key covers the data version, so new data means new jobs.
+    """
+    task: str
+    args: Tuple = ()
+    label: str = ""
+    priority: int = 0
+    version: str = ""
+    requires: Tuple[str, ...] = ()
+
+    @property
+    def key(self) -> str:
+        return hashlib.sha1(json.dumps([self.task, list(self.args), self.version]).encode()).hexdigest()
+
+
+class JobQueue:
+    """
+    Jobs and their checkpoints in one SQLite file (WAL, so the dashboard can read while workers write)
+    Only one scheduler drains a queue at a time (see scheduler.py), so a job still
+    marked running when the scheduler starts was interrupted and is queued again.
+    """
+
+    def __init__(self, path: str = QUEUE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not shareable)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                conn.execute(statement)
+            # Queues created before retries were added
+            if "retry_after" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}:
+                conn.execute("ALTER TABLE jobs ADD COLUMN retry_after REAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, jobs: List[Job]) -> int:
+        """
+        Add jobs that are not in the queue yet (by key)
+        Returns: number of jobs added
+        """
+        now = time.time()
+        conn = self._connection()
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO jobs (key, task, args, label, priority, version, requires, status, enqueued)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (job.key, job.task, json.dumps(list(job.args)), job.label or job.task, job.priority,
+                 job.version, json.dumps(list(job.requires)), QUEUED, now)
+                for job in jobs
+            ]
+        )
+        return conn.total_changes - before
+
+    def recover(self) -> int:
+        """
+        Queue jobs left running by a scheduler that was killed (failed once out of attempts)
+        Returns: number of jobs queued again
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, detail = 'interrupted too often'"
+                " WHERE status = ? AND attempts >= ?",
+                (FAILED, time.time(), RUNNING, MAX_ATTEMPTS)
+            )
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, started = NULL WHERE status = ?", (QUEUED, RUNNING)
+            ).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return requeued
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Mark the next runnable job running: the highest priority queued job whose required
+        jobs finished and whose retry backoff (if any) has passed
+        Returns: the job row (args decoded), None when nothing is runnable right now
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            claimed = None
+            for key, task, args, label, requires in conn.execute(
+                "SELECT key, task, args, label, requires FROM jobs"
+                " WHERE status = ? AND (retry_after IS NULL OR retry_after <= ?) ORDER BY priority, rowid",
+                (QUEUED, time.time())
+            ).fetchall():
+                requires = json.loads(requires)
+                if requires:
+                    pending = conn.execute(
+                        f"SELECT COUNT(*) FROM jobs WHERE key IN ({','.join('?' * len(requires))})"
+                        f" AND status NOT IN (?, ?)",
+                        (*requires, *FINISHED)
+                    ).fetchone()[0]
+                    if pending:
+                        continue
+                conn.execute(
+                    "UPDATE jobs SET status = ?, started = ?, attempts = attempts + 1 WHERE key = ?",
+                    (RUNNING, time.time(), key)
+                )
+                claimed = {"key": key, "task": task, "args": tuple(json.loads(args)), "label": label}
+                break
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return claimed
+
+    def finish(self, key: str, status: str, seconds: Optional[float], detail: str) -> str:
+        """
+        Record the outcome of a job; its checkpoint is dropped once it is done
+        A failed run with attempts left is queued again after its backoff instead (keeping its checkpoint).
+        Returns: the status recorded (QUEUED for a retry)
+        """
+        now = time.time()
+        conn = self._connection()
+        attempts = conn.execute("SELECT attempts FROM jobs WHERE key = ?", (key,)).fetchone()
+        if status == FAILED and attempts is not None and attempts[0] < MAX_ATTEMPTS:
+            conn.execute(
+                "UPDATE jobs SET status = ?, started = NULL, seconds = ?, detail = ?, retry_after = ? WHERE key = ?",
+                (QUEUED, seconds, f"retry {attempts[0]}/{MAX_ATTEMPTS - 1}: {detail}",
+                 now + RETRY_BACKOFF * 2 ** (attempts[0] - 1), key)
+            )
+            return QUEUED
+
+        conn.execute(
+            "UPDATE jobs SET status = ?, finished = ?, seconds = ?, detail = ?, retry_after = NULL WHERE key = ?",
+            (status, now, seconds, detail, key)
+        )
+        if status == DONE:
+            conn.execute("DELETE FROM checkpoints WHERE key = ?", (key,))
+        return status
+
+    def next_retry(self) -> Optional[float]:
+        """Time (epoch seconds) the earliest queued job waiting out a retry backoff becomes runnable"""
+        return self._connection().execute(
+            "SELECT MIN(retry_after) FROM jobs WHERE status = ? AND retry_after > ?", (QUEUED, time.time())
+        ).fetchone()[0]
+
+    def load_checkpoint(self, key: str, default: Any = None) -> Any:
+        """Progress saved by an earlier, interrupted run of a job"""
+        row = self._connection().execute("SELECT value FROM checkpoints WHERE key = ?", (key,)).fetchone()
+        return pickle.loads(row[0]) if row is not None else default
+
+    def save_checkpoint(self, key: str, value: Any) -> None:
+        """Replace the saved progress of a job"""
+        self._connection().execute(
+            "INSERT OR REPLACE INTO checkpoints (key, value, saved) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time())
+        )
+
+    def jobs(self, version: Optional[str] = None) -> pd.DataFrame:
+        """Jobs (of one data version, or all) in the order they run, with status and durations"""
+        query = "SELECT label, task, priority, status, attempts, enqueued, started, finished, seconds, detail, version" \
+                " FROM jobs"
+        params = []
+        if version is not None:
+            query += " WHERE version = ?"
+            params.append(version)
+        jobs = pd.read_sql_query(query + " ORDER BY priority, rowid", self._connection(), params=params)
+        for column in ["enqueued", "started", "finished"]:
+            jobs[column] = pd.to_datetime(jobs[column], unit="s")
+        return jobs
+
+    def summary(self, version: str) -> Dict[str, Any]:
+        """Job counts per status for one data version, and when the last one finished"""
+        conn = self._connection()
+        counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE version = ? GROUP BY status", (version,)
+        ).fetchall())
+        last = conn.execute("SELECT MAX(finished) FROM jobs WHERE version = ?", (version,)).fetchone()[0]
+        return {
+            "total": sum(counts.values()),
+            **{status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)},
+            "last_finished": pd.to_datetime(last, unit="s") if last is not None else None,
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def _open_queue(path: str) -> JobQueue:
+    """One queue object per file and process (checkpoints are saved often)"""
+    return JobQueue(path)
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    """Saved progress of one job, passed to tasks that take a checkpoint argument (picklable)"""
+    path: str
+    key: str
+
+    def load(self, default: Any = None) -> Any:
+        return _open_queue(self.path).load_checkpoint(self.key, default)
+
+    def save(self, value: Any) -> None:
+        _open_queue(self.path).save_checkpoint(self.key, value)
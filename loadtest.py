@@ -0,0 +1,295 @@
+# =========================================================
+# Load Test - concurrent headless sessions against DashboardV3.py
+# Run with: python loadtest.py --users 8 --duration 120 [--csv samples.csv]
+# =========================================================
+
+import argparse
+import os
+import random
+import resource
+import threading
+import time
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Optional
+
+from streamlit import logger as streamlit_logger
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "DashboardV3.py")
+
+# Seconds a single rerun may take before the session counts it as failed
+RERUN_TIMEOUT = 300
+
+# Seconds between memory samples
+MEMORY_INTERVAL = 1.0
+
+ALL_OPTION = "ทั้งหมด"
+
+
+# =========================================================
+# Sidebar interactions (one rerun each)
+# =========================================================
+
+def _sidebar_widget(at: AppTest, kind: str, label: str):
+    """Sidebar widget by its label"""
+    return next(w for w in getattr(at.sidebar, kind) if w.label == label)
+
+
+def change_scheme(at: AppTest, rng: random.Random) -> None:
+    box = _sidebar_widget(at, "selectbox", "1️⃣ รูปแบบการแบ่งภูมิภาค")
+    box.set_value(rng.choice(box.options))
+
+
+def pick_region(at: AppTest, rng: random.Random) -> None:
+    box = _sidebar_widget(at, "selectbox", "2️⃣ เลือกภูมิภาค")
+    box.set_value(rng.choice(box.options))
+
+
+def pick_province(at: AppTest, rng: random.Random) -> None:
+    box = _sidebar_widget(at, "selectbox", "3️⃣ เลือกจังหวัด")
+    box.set_value(rng.choice(box.options))
+
+
+def reset_province(at: AppTest, rng: random.Random) -> None:
+    _sidebar_widget(at, "selectbox", "3️⃣ เลือกจังหวัด").set_value(ALL_OPTION)
+
+
+def change_years(at: AppTest, rng: random.Random) -> None:
+    slider = _sidebar_widget(at, "slider", "ช่วงปี (พ.ศ.)")
+    low, high = sorted(rng.sample(range(int(slider.min), int(slider.max) + 1), 2))
+    slider.set_range(low, high)
+
+
+def toggle_confidence_intervals(at: AppTest, rng: random.Random) -> None:
+    box = _sidebar_widget(at, "checkbox", "Show Confidence Intervals")
+    box.set_value(not box.value)
+
+
+def toggle_data_tables(at: AppTest, rng: random.Random) -> None:
+    box = _sidebar_widget(at, "checkbox", "Show Data Tables")
+    box.set_value(not box.value)
+
+
+# Interaction -> relative frequency, roughly how people browse the dashboard:
+# mostly drilling into regions/provinces and years, occasionally the display options
+INTERACTIONS: Dict[str, tuple] = {
+    "pick_region": (pick_region, 3),
+    "pick_province": (pick_province, 3),
+    "reset_province": (reset_province, 1),
+    "change_years": (change_years, 2),
+    "change_scheme": (change_scheme, 1),
+    "toggle_confidence_intervals": (toggle_confidence_intervals, 1),
+    "toggle_data_tables": (toggle_data_tables, 1),
+}
+
+
+# =========================================================
+# Sessions and sampling
+# =========================================================
+
+def _rss_bytes() -> int:
+    """Resident set size of this process (falls back to its peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is KB on Linux, bytes on macOS
+        scale = 1 if os.uname().sysname == "Darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def _timed_run(at: AppTest) -> Dict:
+    """Rerun the script and time it; script exceptions count as errors"""
+    start = time.perf_counter()
+    try:
+        at.run(timeout=RERUN_TIMEOUT)
+        error = "; ".join(str(e.value) for e in at.exception)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {"seconds": time.perf_counter() - start, "ok": not error, "error": error}
+
+
+def run_session(user: int, deadline: float, max_steps: Optional[int], seed: int) -> List[Dict]:
+    """
+    One virtual user: initial page load, then weighted random interactions until the deadline
+    A failed rerun leaves the widget tree unusable, so the session reloads the page after it.
+    """
+    rng = random.Random(seed + user)
+    names = list(INTERACTIONS)
+    weights = [INTERACTIONS[name][1] for name in names]
+    samples = []
+
+    at, name = None, "initial_load"
+    steps = 0
+    while time.time() < deadline and (max_steps is None or steps < max_steps):
+        if at is None:
+            at, name = AppTest.from_file(APP_PATH, default_timeout=RERUN_TIMEOUT), "initial_load"
+        else:
+            name = rng.choices(names, weights)[0]
+            try:
+                INTERACTIONS[name][0](at, rng)
+            except Exception as e:
+                samples.append({"seconds": 0.0, "ok": False, "error": f"{name}: {type(e).__name__}: {e}",
+                                "user": user, "step": name, "t": time.time()})
+                at = None
+                continue
+
+        result = _timed_run(at)
+        samples.append(dict(result, user=user, step=name, t=time.time()))
+        if not result["ok"]:
+            at = None
+        if name != "initial_load":
+            steps += 1
+    return samples
+
+
+def _session_thread(user: int, start_at: float, duration: float, max_steps: Optional[int],
+                    seed: int, samples: List[Dict]) -> None:
+    """Thread entry point for one virtual user (list.extend is atomic, so threads share samples)"""
+    time.sleep(max(0.0, start_at - time.time()))
+    try:
+        result = run_session(user, time.time() + duration, max_steps, seed)
+    except Exception as e:
+        result = [{"seconds": 0.0, "ok": False, "error": f"session: {type(e).__name__}: {e}",
+                   "user": user, "step": "initial_load", "t": time.time()}]
+    samples.extend(result)
+
+
+def sample_memory(stop: threading.Event, memory: List[Dict]) -> None:
+    """Record the RSS of this process (the one server every session runs in) every MEMORY_INTERVAL seconds"""
+    while not stop.is_set():
+        memory.append({"t": time.time(), "rss_mb": _rss_bytes() / 1024 / 1024})
+        stop.wait(MEMORY_INTERVAL)
+
+
+def run_load_test(users: int, duration: float, max_steps: Optional[int] = None,
+                  ramp_up: float = 0.0, seed: int = 0, warm: bool = True) -> Dict[str, pd.DataFrame]:
+    """
+    Drive concurrent sessions as threads of this process, like the sessions of one `streamlit run` server
+    Every session reruns the script in its own thread against the same st.cache_data /
+    st.cache_resource stores, so the GIL and cache and lock contention of a single
+    server instance are part of each latency, and the memory samples are that one
+    process's RSS.
+    Args:
+        users: Concurrent virtual users
+        duration: Seconds each user keeps interacting after its initial load
+        max_steps: Optional cap on interactions per user
+        ramp_up: Seconds over which user start times are spread
+        seed: Seed for the interaction sequences
+        warm: Run one session first so model fits are not part of the measurements
+    Returns: {"samples": one row per rerun, "memory": RSS over time}
+    """
+    if warm:
+        _timed_run(AppTest.from_file(APP_PATH, default_timeout=RERUN_TIMEOUT))
+
+    samples: List[Dict] = []
+    memory: List[Dict] = []
+
+    stop = threading.Event()
+    sampler = threading.Thread(target=sample_memory, args=(stop, memory), daemon=True)
+    sampler.start()
+
+    start = time.time()
+    sessions = []
+    for user in range(users):
+        start_at = start + ramp_up * user / max(users - 1, 1)
+        session = threading.Thread(
+            target=_session_thread, args=(user, start_at, duration, max_steps, seed, samples), daemon=True
+        )
+        session.start()
+        sessions.append(session)
+    for session in sessions:
+        session.join()
+
+    stop.set()
+    sampler.join()
+
+    samples_df = pd.DataFrame(samples)
+    memory_df = pd.DataFrame(memory)
+    for frame in (samples_df, memory_df):
+        if not frame.empty:
+            frame["elapsed"] = frame["t"] - start
+    return {"samples": samples_df, "memory": memory_df}
+
+
+# =========================================================
+# Report
+# =========================================================
+
+def latency_table(samples: pd.DataFrame) -> pd.DataFrame:
+    """Rerun latency percentiles (ms) per interaction and overall"""
+    def summarize(seconds: pd.Series, errors: int) -> Dict:
+        p50, p95, p99 = np.percentile(seconds.to_numpy() * 1000, [50, 95, 99])
+        return {"runs": len(seconds), "errors": errors, "p50_ms": p50, "p95_ms": p95,
+                "p99_ms": p99, "max_ms": seconds.max() * 1000}
+
+    rows = {
+        step: summarize(group["seconds"], int((~group["ok"]).sum()))
+        for step, group in samples.groupby("step")
+    }
+    interactions = samples[samples["step"] != "initial_load"]
+    if not interactions.empty:
+        rows["ALL INTERACTIONS"] = summarize(interactions["seconds"], int((~interactions["ok"]).sum()))
+    return pd.DataFrame.from_dict(rows, orient="index").round(1)
+
+
+def memory_growth(memory: pd.DataFrame) -> Dict[str, float]:
+    """Start / peak / end RSS and the fitted growth rate in MB per minute"""
+    if len(memory) < 2:
+        return {}
+    slope = np.polyfit(memory["elapsed"], memory["rss_mb"], 1)[0] * 60
+    return {
+        "start_mb": memory["rss_mb"].iloc[0],
+        "peak_mb": memory["rss_mb"].max(),
+        "end_mb": memory["rss_mb"].iloc[-1],
+        "growth_mb_per_min": slope,
+    }
+
+
+def print_report(result: Dict[str, pd.DataFrame], users: int) -> None:
+    samples, memory = result["samples"], result["memory"]
+    if samples.empty:
+        print("No reruns recorded")
+        return
+
+    interactions = samples[samples["step"] != "initial_load"]
+    wall = samples["elapsed"].max() - (samples["elapsed"] - samples["seconds"]).min()
+
+    print(f"\nRerun latency ({users} concurrent users)")
+    print(latency_table(samples).to_string())
+    print(f"\nThroughput: {len(interactions) / wall:.2f} interactions/s "
+          f"({len(samples)} reruns in {wall:.1f}s, {int((~samples['ok']).sum())} errors)")
+
+    growth = memory_growth(memory)
+    if growth:
+        print("Memory: start {start_mb:.0f} MB, peak {peak_mb:.0f} MB, end {end_mb:.0f} MB, "
+              "growth {growth_mb_per_min:+.1f} MB/min".format(**growth))
+
+    errors = samples.loc[~samples["ok"], "error"].value_counts().head(5)
+    for message, count in errors.items():
+        print(f"  {count}x {message[:200]}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Concurrent headless session load test for DashboardV3.py")
+    parser.add_argument("--users", type=int, default=4, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of interaction per user")
+    parser.add_argument("--steps", type=int, default=None, help="Optional cap on interactions per user")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Seconds to spread user start times over")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the interaction sequences")
+    parser.add_argument("--cold", action="store_true", help="Skip the warm-up session (measure cold caches)")
+    parser.add_argument("--csv", help="Write every rerun sample to this CSV")
+    args = parser.parse_args()
+
+    streamlit_logger.set_log_level("error")
+    result = run_load_test(args.users, args.duration, args.steps, args.ramp_up, args.seed, warm=not args.cold)
+    print_report(result, args.users)
+    if args.csv:
+        result["samples"].to_csv(args.csv, index=False)
+
+    return 1 if not result["samples"].empty and (~result["samples"]["ok"]).any() else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
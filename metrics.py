@@ -0,0 +1,172 @@
+# =========================================================
+# Forecast Metrics - vectorized scoring of stacked backtests
+# Every model, round, horizon step and series sits in one array, so all
+# error metrics come from a single pass and any grouping is a reduction.
+# =========================================================
+
+import pandas as pd
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+from cleaning import SEASON_LENGTH
+from regional_store import NATION_LABEL
+
+ERROR_METRICS = ["MAE", "RMSE", "MAPE", "sMAPE", "MASE"]
+
+# Axes of a ForecastCube
+CUBE_DIMS = ("Series", "Model", "Round", "Step")
+
+
+def error_metrics(actual: np.ndarray, forecast: np.ndarray, scale: Optional[np.ndarray] = None,
+                  axis=None) -> Dict[str, np.ndarray]:
+    """
+    MAE, RMSE, MAPE (%), sMAPE (%) and MASE over the given axes
+    Pairs with a NaN actual or forecast are ignored; MAPE also skips zero actuals.
+    Args:
+        actual, forecast: Broadcastable arrays
+        scale: MASE denominators (in-sample seasonal naive MAE), broadcastable; MASE is NaN without it
+        axis: Axes reduced (None for all)
+    Returns: metric -> array over the remaining axes, plus N (pairs scored)
+    """
+    actual, forecast = np.broadcast_arrays(np.asarray(actual, dtype=float), np.asarray(forecast, dtype=float))
+    abs_error = np.abs(forecast - actual)
+    valid = np.isfinite(abs_error)
+    abs_error = np.where(valid, abs_error, 0.0)
+    n = valid.sum(axis=axis)
+
+    def mean(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        count = mask.sum(axis=axis)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, np.where(mask, values, 0.0).sum(axis=axis) / count, np.nan)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct = abs_error / np.abs(actual)
+        spct = 2 * abs_error / (np.abs(actual) + np.abs(forecast))
+        scaled = abs_error / scale if scale is not None else np.full_like(abs_error, np.nan)
+
+    return {
+        "MAE": mean(abs_error, valid),
+        "RMSE": np.sqrt(mean(abs_error ** 2, valid)),
+        "MAPE": 100 * mean(pct, valid & np.isfinite(pct)),
+        "sMAPE": 100 * mean(spct, valid & np.isfinite(spct)),
+        "MASE": mean(scaled, valid & np.isfinite(scaled)),
+        "N": n,
+    }
+
+
+@dataclass(frozen=True)
+class ForecastCube:
+    """
+    Aligned backtests, arrays of shape (series, models, rounds, steps)
+    Missing cells (a model without a round, shorter rounds) are NaN.
+    scale is (series, 1, rounds, 1): the seasonal naive MAE on each round's training data.
+    """
+    actual: np.ndarray
+    forecast: np.ndarray
+    scale: np.ndarray
+    series: Tuple[str, ...]
+    models: Tuple[str, ...]
+    rounds: Tuple[str, ...]
+
+    def scores(self, by: Sequence[str] = ("Model",)) -> pd.DataFrame:
+        """
+        Metrics per combination of the dimensions in by (others are pooled)
+        Args:
+            by: Subset of CUBE_DIMS, e.g. ("Model",), ("Model", "Round"), ("Series", "Model", "Step")
+        Returns: one row per group that has scored pairs, columns by + N + ERROR_METRICS
+        """
+        labels = {
+            "Series": list(self.series),
+            "Model": list(self.models),
+            "Round": list(self.rounds),
+            "Step": list(range(1, self.forecast.shape[3] + 1)),
+        }
+        kept = [dim for dim in CUBE_DIMS if dim in by]
+        axis = tuple(i for i, dim in enumerate(CUBE_DIMS) if dim not in by)
+        result = error_metrics(self.actual, self.forecast, self.scale, axis=axis)
+
+        index = pd.MultiIndex.from_product([labels[dim] for dim in kept], names=kept) if kept else pd.RangeIndex(1)
+        table = pd.DataFrame({name: np.ravel(values) for name, values in result.items()}, index=index)
+        table = table[table["N"] > 0][["N"] + ERROR_METRICS]
+        return table.reset_index(drop=not kept)
+
+
+def _seasonal_naive_scales(history: pd.DataFrame, starts: pd.DataFrame, season: int) -> np.ndarray:
+    """
+    In-sample seasonal naive MAE before each round start, via cumulative sums per series
+    Args:
+        history: Series, ds, y (monthly)
+        starts: Series, ds (first forecast month of each series/round)
+    Returns: one scale per row of starts (NaN when less than a season of training data)
+    """
+    wide = history.pivot_table(index="ds", columns="Series", values="y", aggfunc="sum").sort_index()
+    naive_errors = (wide - wide.shift(season)).abs()
+    total = np.nancumsum(naive_errors.to_numpy(), axis=0)
+    count = np.cumsum(np.isfinite(naive_errors.to_numpy()), axis=0)
+
+    rows = np.searchsorted(wide.index.to_numpy(), starts["ds"].to_numpy()) - 1
+    cols = wide.columns.get_indexer(starts["Series"])
+    ok = (rows >= 0) & (cols >= 0)
+    rows, cols = np.maximum(rows, 0), np.maximum(cols, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scale = total[rows, cols] / count[rows, cols]
+    return np.where(ok & (count[rows, cols] > 0) & (scale > 0), scale, np.nan)
+
+
+def backtest_cube(backtests: Dict[str, pd.DataFrame], history: pd.DataFrame, value: str = "y",
+                  season: int = SEASON_LENGTH) -> ForecastCube:
+    """
+    Stack rolling backtests of several models (and series) into a ForecastCube
+    Args:
+        backtests: Model name -> frame with Round, ds, Actual, forecast (and Series; NATION_LABEL if absent)
+        history: Observed data with ds, value (and Series) for the MASE scales
+    """
+    frames = []
+    for name, bt in backtests.items():
+        frame = bt[[c for c in ["Series", "Round", "ds", "Actual", "forecast"] if c in bt.columns]].copy()
+        if "Series" not in frame.columns:
+            frame["Series"] = NATION_LABEL
+        frame["Model"] = name
+        frames.append(frame)
+    stacked = pd.concat(frames, ignore_index=True)
+    stacked["ds"] = pd.to_datetime(stacked["ds"])
+    stacked = stacked.sort_values(["Series", "Model", "Round", "ds"])
+    stacked["Step"] = stacked.groupby(["Series", "Model", "Round"]).cumcount()
+
+    # Series alphabetically, models in the order passed, rounds by their first forecast month
+    labels = {
+        "Series": tuple(sorted(stacked["Series"].unique())),
+        "Model": tuple(backtests),
+        "Round": tuple(stacked.groupby("Round")["ds"].min().sort_values().index),
+    }
+    codes = {dim: pd.Index(labels[dim]).get_indexer(stacked[dim]) for dim in labels}
+
+    shape = (len(labels["Series"]), len(labels["Model"]), len(labels["Round"]), int(stacked["Step"].max()) + 1)
+    position = (codes["Series"], codes["Model"], codes["Round"], stacked["Step"].to_numpy())
+    actual = np.full(shape, np.nan)
+    forecast = np.full(shape, np.nan)
+    actual[position] = stacked["Actual"].to_numpy(dtype=float)
+    forecast[position] = stacked["forecast"].to_numpy(dtype=float)
+
+    hist = history.rename(columns={value: "y"})
+    if "Series" not in hist.columns:
+        hist = hist.assign(Series=NATION_LABEL)
+    hist = hist[["Series", "ds", "y"]].assign(ds=pd.to_datetime(hist["ds"]))
+
+    starts = stacked.groupby(["Series", "Round"], as_index=False)["ds"].min()
+    scale = np.full((shape[0], 1, shape[2], 1), np.nan)
+    scale[
+        pd.Index(labels["Series"]).get_indexer(starts["Series"]), 0,
+        pd.Index(labels["Round"]).get_indexer(starts["Round"]), 0
+    ] = _seasonal_naive_scales(hist, starts, season)
+
+    return ForecastCube(actual, forecast, scale, labels["Series"], labels["Model"], labels["Round"])
+
+
+def leaderboard(cube: ForecastCube, by: Sequence[str] = ("Model",), sort_by: str = "MASE") -> pd.DataFrame:
+    """Scores per group, best first (falls back to MAE where sort_by is all NaN)"""
+    table = cube.scores(by)
+    if table[sort_by].isna().all():
+        sort_by = "MAE"
+    return table.sort_values(sort_by, na_position="last").reset_index(drop=True)
@@ -0,0 +1,235 @@
+# =========================================================
+# Prewarm - fill the persistent caches before the dashboard takes traffic
+# Run with: python prewarm.py [--workers 4] [--all-horizons]
+# =========================================================
+
+import argparse
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Tuple
+
+from streamlit import logger as streamlit_logger
+
+# Cached functions run outside `streamlit run` here, which Streamlit warns about on
+# every decoration and call; quiet it before the compute layer is imported
+streamlit_logger.set_log_level("error")
+
+from dashboard_compute import (
+    REGION_SCHEMES, HIERARCHY_HORIZONS, get_artifact_registry,
+    load_region_index, load_region_rollups, load_province_tensor, province_tensor_version, summarize_selection,
+    load_live_sarima, forecast_live_sarima, backtest_rounds,
+    build_ensemble_forecast, reconcile_regional_forecast,
+    get_forecast_store, record_artifact_forecasts, SCENARIO_DEFAULT_HORIZON
+)
+from forecasting import (
+    train_prophet_model, predict_prophet, split_prophet_prediction, prophet_rolling_backtest,
+    train_prophet_scenario_model, predict_scenario_baseline, PROPHET_MAX_HORIZON, UNCERTAINTY_SAMPLES
+)
+from reconciliation import RECONCILIATION_METHODS
+from regional_store import METRICS
+from disk_cache import default_cache
+
+# Per-fit chatter from Prophet's Stan backend
+QUIET_LOGGERS = ["cmdstanpy", "prophet"]
+
+
+def _init_worker() -> None:
+    """Silence bare-mode and per-fit log lines in each worker process"""
+    streamlit_logger.set_log_level("error")
+    # cmdstanpy resets its level on first use, so disable the loggers instead
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).disabled = True
+
+
+def _data() -> Dict:
+    """
+    Artifact handles through the shared registry
+    Files are only re-read when they changed, so long-lived workers (scheduler.py) pick up new data.
+    """
+    registry = get_artifact_registry()
+    handles = registry.load_handles()
+    if registry.errors:
+        raise RuntimeError("; ".join(registry.errors.values()))
+    return handles
+
+
+# =========================================================
+# Tasks (module level so worker processes can unpickle them)
+# =========================================================
+
+def warm_regional() -> str:
+    """Region index, rollups for every scheme and the memory-mapped province tensor"""
+    regional = _data()["regional"]
+    region_index = load_region_index(regional)
+    load_region_rollups(regional, region_index)
+    tensor = load_province_tensor(regional)
+    return f"{len(REGION_SCHEMES)} schemes, tensor {tensor.values.shape}"
+
+
+def warm_selections(scheme: str) -> str:
+    """Overview aggregates of one scheme for all regions and each region, over the default (full) year range"""
+    regional = _data()["regional"]
+    region_index = load_region_index(regional)
+    tensor = load_province_tensor(regional)
+    year_range = (int(regional.frame.Year_BE.min()), int(regional.frame.Year_BE.max()))
+    regions = [None] + list(REGION_SCHEMES[scheme])
+    for region in regions:
+        summarize_selection(tensor, region_index, province_tensor_version(), scheme,
+                            region=region, province=None, year_range=year_range)
+    return f"{len(regions)} selections, {year_range[0]}-{year_range[1]}"
+
+
+def warm_forecast_store() -> str:
+    """Forecast CSV artifacts recorded in the forecast store"""
+    rows = record_artifact_forecasts(_data())
+    return f"{rows} rows recorded, {len(get_forecast_store().runs())} runs stored"
+
+
+def warm_prophet_fit() -> str:
+    """Prophet fit on the national series"""
+    train_prophet_model(_data()["divorce_model"])
+    return "fitted"
+
+
+def warm_prophet_backtest() -> str:
+    """Prophet rolling-origin backtest used by the ensemble weights"""
+    data = _data()
+    rounds = backtest_rounds(data["sarimax_rolling"].frame)
+    prophet_rolling_backtest(data["divorce_model"], rounds, horizon=12)
+    return f"{len(rounds)} rounds"
+
+
+def warm_sarima() -> str:
+    """SARIMA state update and its forecast at the maximum horizon"""
+    national = _data()["divorce_model"]
+    results, status = load_live_sarima(national)
+    forecast_live_sarima(results, national, PROPHET_MAX_HORIZON)
+    return status
+
+
+def warm_forecasts(mode: str) -> str:
+    """Prophet prediction, ensemble and scenario baseline for one uncertainty mode, as the dashboard requests them"""
+    data = _data()
+    national = data["divorce_model"]
+    model, prophet_data, _ = train_prophet_model(national)
+    prediction = predict_prophet(
+        model, prophet_data,
+        periods=PROPHET_MAX_HORIZON,
+        uncertainty_samples=UNCERTAINTY_SAMPLES[mode]
+    )
+    _, prophet_future = split_prophet_prediction(prediction, national.frame["ds"].max())
+
+    results, _ = load_live_sarima(national)
+    arima_forecast = forecast_live_sarima(results, national, PROPHET_MAX_HORIZON)
+    build_ensemble_forecast(national, prophet_future, arima_forecast, data["sarimax_rolling"])
+
+    # Marriage Scenarios tab: the regressor fit and the baseline prediction every scenario shifts
+    scenario_model, scenario_data, _ = train_prophet_scenario_model(national)
+    predict_scenario_baseline(scenario_model, scenario_data, SCENARIO_DEFAULT_HORIZON, UNCERTAINTY_SAMPLES[mode])
+    return f"{UNCERTAINTY_SAMPLES[mode]} samples"
+
+
+def warm_reconciliation(scheme: str, metric: str, horizon: int, method: str) -> str:
+    """One Hierarchical Forecast tab selection"""
+    reconcile_regional_forecast(_data()["regional"], scheme, metric, horizon, method)
+    return f"{horizon} months"
+
+
+# =========================================================
+# Runner
+# =========================================================
+
+Task = Tuple[str, Callable, tuple]
+
+
+def build_plan(all_horizons: bool = False) -> List[List[Task]]:
+    """
+    Tasks grouped in stages; tasks within a stage run in parallel
+    Stage 1 fits the models, builds the province tensor and reconciles every scheme's
+    hierarchy; stage 2 reuses those for the per-mode predictions and ensembles and the
+    overview aggregates of every scheme/region.
+    """
+    horizons = HIERARCHY_HORIZONS if all_horizons else HIERARCHY_HORIZONS[:1]
+
+    models = [
+        ("Prophet fit", warm_prophet_fit, ()),
+        ("Prophet backtest", warm_prophet_backtest, ()),
+        ("SARIMA update", warm_sarima, ()),
+        ("Regional index/rollups/tensor", warm_regional, ()),
+        ("Forecast store", warm_forecast_store, ()),
+    ]
+    hierarchy = [
+        (f"Hierarchy {scheme} / {metric} / {method} / {horizon}",
+         warm_reconciliation, (scheme, metric, horizon, method))
+        for scheme in REGION_SCHEMES
+        for metric in METRICS
+        for method in RECONCILIATION_METHODS
+        for horizon in horizons
+    ]
+    forecasts = [
+        (f"Forecasts + ensemble ({mode} uncertainty)", warm_forecasts, (mode,))
+        for mode in UNCERTAINTY_SAMPLES
+    ]
+    selections = [
+        (f"Overview selections {scheme}", warm_selections, (scheme,))
+        for scheme in REGION_SCHEMES
+    ]
+    return [models + hierarchy, forecasts + selections]
+
+
+def run_plan(plan: List[List[Task]], workers: int) -> List[Dict]:
+    """Run every stage on a process pool and collect per-task timings"""
+    report = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for stage, tasks in enumerate(plan, start=1):
+            futures = {pool.submit(_timed, func, args): name for name, func, args in tasks}
+            for future in as_completed(futures):
+                row = future.result()
+                row.update(stage=stage, task=futures[future])
+                report.append(row)
+                print(f"  [{row['status']:>5}] {row['seconds']:7.2f}s  {row['task']}  ({row['detail']})", flush=True)
+    return report
+
+
+def _timed(func: Callable, args: tuple) -> Dict:
+    """Run one task, never raising so the rest of the plan still runs"""
+    start = time.perf_counter()
+    try:
+        detail, status = func(*args), "ok"
+    except Exception as e:
+        detail, status = f"{type(e).__name__}: {e}", "error"
+        traceback.print_exc()
+    return {"seconds": time.perf_counter() - start, "status": status, "detail": detail}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Populate the dashboard caches before serving traffic")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="Worker processes (default: up to 4)")
+    parser.add_argument("--all-horizons", action="store_true",
+                        help="Also reconcile every Hierarchical Forecast horizon, not only the default")
+    args = parser.parse_args()
+
+    _init_worker()
+    plan = build_plan(args.all_horizons)
+    print(f"Prewarming {sum(len(stage) for stage in plan)} items with {args.workers} workers")
+
+    start = time.perf_counter()
+    report = run_plan(plan, args.workers)
+    elapsed = time.perf_counter() - start
+
+    failed = [row for row in report if row["status"] != "ok"]
+    cache = default_cache()
+    stats = cache.stats() if cache is not None else {"entries": 0, "bytes": 0}
+    print(
+        f"Done in {elapsed:.1f}s: {len(report) - len(failed)} ok, {len(failed)} failed; "
+        f"disk cache {stats['entries']} entries / {stats['bytes'] / 1024 / 1024:.1f} MB"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
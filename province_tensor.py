@@ -0,0 +1,268 @@
+# =========================================================
+# Province Tensor - dense (province x month x metric) counts
+# =========================================================
+
+import os
+import tempfile
+import pandas as pd
+import numpy as np
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from regional_store import BE_OFFSET, METRICS, RegionIndex
+
+
+@dataclass(frozen=True)
+class ProvinceTensor:
+    """
+    Contiguous int32 array of shape (provinces, months, metrics)
+    Months run consecutively from the first to the last month in the data, so a
+    year range is a plain slice and every filter below returns a view, not a copy.
+    Months a province did not report (e.g. Bueng Kan before 2554) are 0 and
+    False in the observed mask.
+    """
+    values: np.ndarray
+    observed: np.ndarray
+    dates: pd.DatetimeIndex
+    years_be: np.ndarray
+    province_codes: np.ndarray
+    province_names: np.ndarray
+    metrics: Tuple[str, ...] = tuple(METRICS)
+
+    # ---------- indexing ----------
+
+    def metric_index(self, metric: str) -> int:
+        """Position of a metric on the last axis"""
+        return self.metrics.index(metric)
+
+    def month_slice(self, year_range: Tuple[int, int]) -> slice:
+        """Slice of the month axis covering a Buddhist Era year range (inclusive)"""
+        start = np.searchsorted(self.years_be, year_range[0], side="left")
+        stop = np.searchsorted(self.years_be, year_range[1], side="right")
+        return slice(int(start), int(stop))
+
+    def province_row(self, province: str) -> int:
+        """Row of a province name"""
+        return int(np.flatnonzero(self.province_names == province)[0])
+
+    def region_rows(self, index: RegionIndex, scheme: str, region: str) -> np.ndarray:
+        """Rows of the provinces belonging to a region (one gather over the province codes)"""
+        return np.flatnonzero(index.region_mask(scheme, region, self.province_codes))
+
+    def window(self, year_range: Tuple[int, int]) -> np.ndarray:
+        """Zero-copy view of all provinces for a year range"""
+        return self.values[:, self.month_slice(year_range)]
+
+    # ---------- reductions ----------
+
+    def totals(self, year_range: Tuple[int, int], rows=slice(None)) -> np.ndarray:
+        """Summed metrics over the selected provinces and years, shape (metrics,)"""
+        return self.window(year_range)[rows].sum(axis=(0, 1), dtype=np.int64)
+
+    def yearly(self, year_range: Tuple[int, int], rows=slice(None)) -> pd.DataFrame:
+        """Yearly totals for the selected provinces (one reduceat over the month axis)"""
+        months = self.month_slice(year_range)
+        years = self.years_be[months]
+        if len(years) == 0:
+            return pd.DataFrame(columns=["Year_BE"] + list(self.metrics))
+
+        per_month = self.values[rows, months].sum(axis=0, dtype=np.int64)
+        starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+        per_year = np.add.reduceat(per_month, starts, axis=0)
+
+        result = pd.DataFrame(per_year, columns=list(self.metrics))
+        result.insert(0, "Year_BE", years[starts])
+        return result
+
+    def years_observed(self, year_range: Tuple[int, int], rows=slice(None)) -> int:
+        """Number of years in range with at least one reported month for the selection"""
+        months = self.month_slice(year_range)
+        has_data = self.observed[rows, months].any(axis=0)
+        return int(np.unique(self.years_be[months][has_data]).size)
+
+    def by_province(self, year_range: Tuple[int, int], rows=slice(None)) -> pd.DataFrame:
+        """Per-province totals for the selection"""
+        sums = self.window(year_range)[rows].sum(axis=1, dtype=np.int64)
+        result = pd.DataFrame(sums, columns=list(self.metrics))
+        result.insert(0, "Province", self.province_names[rows])
+        result.insert(0, "Province_Code", self.province_codes[rows])
+        return result
+
+    def province_pivot(self, year_range: Tuple[int, int], rows=slice(None)) -> pd.DataFrame:
+        """
+        Yearly totals of every selected province side by side (one reduceat over the month axis)
+        Returns: index Year_BE, columns (metric, province); NaN where a province reported no month that year
+        """
+        months = self.month_slice(year_range)
+        years = self.years_be[months]
+        names = self.province_names[rows]
+        columns = pd.MultiIndex.from_product([list(self.metrics), names], names=["Metric", "Province"])
+        if len(years) == 0:
+            return pd.DataFrame(columns=columns, index=pd.Index([], name="Year_BE"), dtype=float)
+
+        starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+        per_year = np.add.reduceat(self.values[rows, months], starts, axis=1, dtype=np.int64).astype(float)
+        per_year[~np.logical_or.reduceat(self.observed[rows, months], starts, axis=1)] = np.nan
+
+        # (provinces, years, metrics) -> (years, metrics * provinces), metric-major like the columns
+        data = per_year.transpose(1, 2, 0).reshape(len(starts), -1)
+        return pd.DataFrame(data, index=pd.Index(years[starts], name="Year_BE"), columns=columns)
+
+    def by_region(self, index: RegionIndex, scheme: str, year_range: Tuple[int, int],
+                  rows=slice(None)) -> pd.DataFrame:
+        """
+        Per-region totals with the same layout as regional_store.aggregate_by_region
+        (UNMAPPED_REGION last, Provinces = reporting provinces per region)
+        """
+        n_regions = len(index.regions[scheme])
+        codes = index.region_codes(scheme, self.province_codes[rows])
+        sums = self.window(year_range)[rows].sum(axis=1, dtype=np.int64)
+        reporting = self.observed[rows, self.month_slice(year_range)].any(axis=1)
+
+        result = pd.DataFrame({"Region": index.regions[scheme]})
+        for i, metric in enumerate(self.metrics):
+            result[metric] = np.bincount(codes, weights=sums[:, i], minlength=n_regions)
+        result["Provinces"] = np.bincount(codes[reporting], minlength=n_regions)
+        return result
+
+
+def tensor_coordinates(df: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray, int, int]:
+    """
+    Map every row of the long regional table to its (province, month) cell
+    The BE -> Gregorian conversion is integer arithmetic on the Year_BE/Month columns.
+    Returns: (provinces sorted by code, row per record, month column per record,
+              first month number (Year_BE * 12 + Month - 1), number of months)
+    """
+    provinces = df[["Province_Code", "Province"]].drop_duplicates("Province_Code").sort_values("Province_Code")
+    codes = provinces["Province_Code"].to_numpy()
+    code_to_row = np.full(codes.max() + 1, -1, dtype=np.int32)
+    code_to_row[codes] = np.arange(len(codes))
+
+    month_number = df["Year_BE"].to_numpy(dtype=np.int64) * 12 + df["Month"].to_numpy(dtype=np.int64) - 1
+    first = int(month_number.min())
+    n_months = int(month_number.max() - first + 1)
+
+    rows = code_to_row[df["Province_Code"].to_numpy()]
+    cols = month_number - first
+    return provinces, rows, cols, first, n_months
+
+
+def build_province_tensor(df: pd.DataFrame, out: Optional[np.ndarray] = None) -> ProvinceTensor:
+    """
+    Scatter the long regional table into the dense tensor
+    Args:
+        df: Regional data (Year_BE, Month, Province_Code, Province, Marriage, Divorce)
+        out: Optional pre-allocated (e.g. memory-mapped) int32 array to fill
+    """
+    provinces, rows, cols, first, n_months = tensor_coordinates(df)
+
+    shape = (len(provinces), n_months, len(METRICS))
+    values = np.zeros(shape, dtype=np.int32) if out is None else out
+    values[...] = 0
+    observed = np.zeros(shape[:2], dtype=bool)
+
+    for i, metric in enumerate(METRICS):
+        np.add.at(values[..., i], (rows, cols), df[metric].to_numpy(dtype=np.int64).astype(np.int32))
+    observed[rows, cols] = True
+
+    month_axis = first + np.arange(n_months)
+    years_be = (month_axis // 12).astype(np.int16)
+    start = pd.Timestamp(year=int(years_be[0]) - BE_OFFSET, month=int(month_axis[0] % 12) + 1, day=1)
+
+    return ProvinceTensor(
+        values=values,
+        observed=observed,
+        dates=pd.date_range(start, periods=n_months, freq="MS"),
+        years_be=years_be,
+        province_codes=provinces["Province_Code"].to_numpy(),
+        province_names=provinces["Province"].to_numpy(),
+    )
+
+
+# =========================================================
+# Memory-mapped backing file (shared across worker processes)
+# =========================================================
+
+def save_province_tensor(tensor: ProvinceTensor, prefix: str, fingerprint: str = "") -> None:
+    """
+    Write <prefix>.npy (values) and <prefix>.meta.npz (axes) atomically
+    Other processes open the .npy read-only with open_province_tensor and share its pages.
+    The meta file is the commit marker: it is replaced last, so a reader that sees the
+    new fingerprint also finds the new values.
+    """
+    directory = os.path.dirname(os.path.abspath(prefix))
+    for suffix, writer in (
+        (".npy", lambda path: np.save(path, np.ascontiguousarray(tensor.values))),
+        (".meta.npz", lambda path: np.savez(
+            path,
+            observed=tensor.observed,
+            dates=tensor.dates.to_numpy(),
+            years_be=tensor.years_be,
+            province_codes=tensor.province_codes,
+            province_names=tensor.province_names.astype(str),
+            metrics=np.array(tensor.metrics),
+            fingerprint=np.array(fingerprint),
+            shape=np.array(tensor.values.shape),
+        )),
+    ):
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=suffix)
+        os.close(fd)
+        try:
+            writer(tmp_path)
+            os.replace(tmp_path, prefix + suffix)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def open_province_tensor(prefix: str, fingerprint: str = "") -> Optional[ProvinceTensor]:
+    """
+    Open a saved tensor with its values memory-mapped read-only
+    Returns None when the files are missing, were built from different data, or were
+    replaced while being opened (values of another shape or a newer meta file).
+    """
+    if not (os.path.exists(prefix + ".npy") and os.path.exists(prefix + ".meta.npz")):
+        return None
+    meta_stat = os.stat(prefix + ".meta.npz")
+    with np.load(prefix + ".meta.npz") as meta:
+        if fingerprint and str(meta["fingerprint"]) != fingerprint:
+            return None
+        axes = {key: meta[key] for key in meta.files}
+
+    values = np.load(prefix + ".npy", mmap_mode="r")
+    current = os.stat(prefix + ".meta.npz")
+    if (current.st_ino, current.st_mtime_ns) != (meta_stat.st_ino, meta_stat.st_mtime_ns):
+        return None
+    if "shape" not in axes or tuple(values.shape) != tuple(axes["shape"].tolist()):
+        return None
+
+    return ProvinceTensor(
+        values=values,
+        observed=axes["observed"],
+        dates=pd.DatetimeIndex(axes["dates"], freq="MS"),
+        years_be=axes["years_be"],
+        province_codes=axes["province_codes"],
+        province_names=axes["province_names"].astype(object),
+        metrics=tuple(axes["metrics"].tolist()),
+    )
+
+
+def load_or_build_province_tensor(df: pd.DataFrame, prefix: Optional[str] = None,
+                                  fingerprint: str = "") -> ProvinceTensor:
+    """
+    Build the tensor in memory, or share it through a memory-mapped file when prefix is set
+    The first process to see a new data fingerprint writes the file, the rest map it.
+    If another process replaces the file before it can be reopened, the tensor just
+    built is used from memory instead.
+    """
+    if prefix is None:
+        return build_province_tensor(df)
+
+    tensor = open_province_tensor(prefix, fingerprint)
+    if tensor is None:
+        built = build_province_tensor(df)
+        save_province_tensor(built, prefix, fingerprint)
+        tensor = open_province_tensor(prefix, fingerprint)
+        if tensor is None:
+            return built
+    return tensor
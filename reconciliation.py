@@ -0,0 +1,148 @@
+# =========================================================
+# Hierarchical Forecast Reconciliation
+# nation -> region -> province (-> district)
+# =========================================================
+
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+SEASON_LENGTH = 12
+
+RECONCILIATION_METHODS = {
+    "mint_shrink": "MinT (shrink) - optimal combination",
+    "wls_struct": "WLS (structural scaling)",
+    "ols": "OLS",
+    "bottom_up": "Bottom-up",
+}
+
+
+# =========================================================
+# Base Forecasts (vectorized over all series)
+# =========================================================
+
+def seasonal_ratio_forecast(Y: np.ndarray, horizon: int, season: int = SEASON_LENGTH,
+                            n_years: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Multiplicative seasonal forecast for every row of Y at once
+    yhat[T+h] = level * growth^k * seasonal_index[month], k = h // season + 1
+    level is the trailing 12-month mean, growth the year-over-year level ratio
+    and the seasonal index the average month / year-mean ratio of the last n_years.
+    Args:
+        Y: Series matrix with shape (n_series, n_months)
+        horizon: Number of months to forecast
+    Returns: (forecasts (n_series, horizon), in-sample residuals (n_series, n_months - season))
+    """
+    n_series, n_months = Y.shape
+    if n_months < 2 * season:
+        raise ValueError(f"Need at least {2 * season} months of history, got {n_months}")
+
+    # Trailing means: level[:, j] = mean(Y[:, j:j + season])
+    csum = np.cumsum(np.pad(Y, ((0, 0), (1, 0))), axis=1)
+    level = (csum[:, season:] - csum[:, :-season]) / season
+
+    window = min(n_years, n_months // season) * season
+    recent = Y[:, -window:].reshape(n_series, -1, season)
+    year_mean = recent.mean(axis=2, keepdims=True)
+    ratios = np.divide(recent, year_mean, out=np.ones_like(recent), where=year_mean > 0)
+    seasonal = ratios.mean(axis=1)
+
+    prev_level = level[:, -1 - season]
+    growth = np.divide(level[:, -1], prev_level, out=np.ones(n_series), where=prev_level > 0)
+    growth = np.clip(growth, 0.8, 1.25)[:, None]
+
+    steps = np.arange(horizon)
+    k = steps // season + 1
+    forecasts = level[:, -1:] * growth ** k * seasonal[:, steps % season]
+
+    positions = (np.arange(season, n_months) - n_months) % season
+    fitted = level[:, :n_months - season] * seasonal[:, positions]
+    residuals = Y[:, season:] - fitted
+    return forecasts, residuals
+
+
+# =========================================================
+# Reconciliation
+# =========================================================
+
+def shrink_covariance(residuals: np.ndarray) -> np.ndarray:
+    """
+    Schafer-Strimmer shrinkage of the residual covariance towards its diagonal
+    (the estimator used by MinT-shrink)
+    Args:
+        residuals: Residual matrix with shape (n_series, n_obs)
+    """
+    n_obs = residuals.shape[1]
+    E = residuals.T
+    cov = E.T @ E / n_obs
+    sd = np.sqrt(np.clip(np.diag(cov), 1e-12, None))
+
+    corr = cov / np.outer(sd, sd)
+    Es = E / sd
+    w2 = (Es ** 2).T @ (Es ** 2)
+    w = Es.T @ Es
+    var_corr = (w2 - w ** 2 / n_obs) / (n_obs * (n_obs - 1))
+    np.fill_diagonal(var_corr, 0.0)
+    off = corr.copy()
+    np.fill_diagonal(off, 0.0)
+
+    denom = (off ** 2).sum()
+    lam = float(np.clip(var_corr.sum() / denom, 0.0, 1.0)) if denom > 0 else 1.0
+
+    shrunk = (1 - lam) * cov
+    shrunk[np.diag_indices_from(shrunk)] = np.diag(cov)
+    return shrunk + np.eye(len(cov)) * 1e-9
+
+
+def reconcile(base: np.ndarray, S: np.ndarray, method: str = "mint_shrink",
+              residuals: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Reconcile base forecasts for every node so all levels add up
+    y_tilde = S (S' W^-1 S)^-1 S' W^-1 y_hat
+    Args:
+        base: Base forecasts for every node, shape (n_nodes, horizon)
+        S: Summing matrix, shape (n_nodes, n_bottom); bottom rows are the last n_bottom rows
+        method: One of RECONCILIATION_METHODS
+        residuals: In-sample residuals per node, required for mint_shrink
+    Returns: Coherent forecasts, shape (n_nodes, horizon)
+    """
+    n_nodes, n_bottom = S.shape
+
+    if method == "bottom_up":
+        return S @ base[-n_bottom:]
+
+    if method == "ols":
+        W = np.eye(n_nodes)
+    elif method == "wls_struct":
+        W = np.diag(S.sum(axis=1))
+    elif method == "mint_shrink":
+        if residuals is None:
+            raise ValueError("mint_shrink requires in-sample residuals")
+        W = shrink_covariance(residuals)
+    else:
+        raise ValueError(f"Unknown reconciliation method: {method}")
+
+    Winv_S = np.linalg.solve(W, S)
+    G = np.linalg.solve(S.T @ Winv_S, Winv_S.T)
+    return S @ (G @ base)
+
+
+def hierarchical_forecast(Y_bottom: np.ndarray, S: np.ndarray, horizon: int,
+                          method: str = "mint_shrink") -> Dict[str, np.ndarray]:
+    """
+    Fit base forecasts for every node and reconcile them across the hierarchy
+    Args:
+        Y_bottom: Bottom level history, shape (n_bottom, n_months)
+        S: Summing matrix from regional_store.build_hierarchy
+        horizon: Number of months to forecast
+        method: One of RECONCILIATION_METHODS
+    Returns: dict with history, base and reconciled matrices for every node
+    """
+    history = S @ Y_bottom
+    base, residuals = seasonal_ratio_forecast(history, horizon)
+    reconciled = reconcile(base, S, method=method, residuals=residuals)
+
+    return {
+        "history": history,
+        "base": base,
+        "reconciled": reconciled,
+    }
@@ -0,0 +1,275 @@
+# =========================================================
+# Regional Store - Province / District Data Model
+# Shared helpers for the monthly regional data
+# (monthly_marriage_divorce_wide_BE.csv)
+# =========================================================
+
+import pandas as pd
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# Buddhist Era year = Gregorian year + 543
+BE_OFFSET = 543
+
+METRICS = ["Marriage", "Divorce"]
+
+# Hierarchy labels
+NATION_LABEL = "ทั้งประเทศ"
+UNMAPPED_REGION = "ไม่ระบุภูมิภาค"
+
+PROVINCE_COLUMNS = ["Province_Code", "Province"]
+# Optional district (amphoe) level - present only in district-level extracts
+DISTRICT_COLUMNS = ["District_Code", "District"]
+
+
+def has_district_level(df: pd.DataFrame) -> bool:
+    """Check whether the regional data carries the district (amphoe) level"""
+    return all(col in df.columns for col in DISTRICT_COLUMNS)
+
+
+def bottom_key_columns(df: pd.DataFrame) -> List[str]:
+    """Key columns identifying the lowest level series (province or district)"""
+    if has_district_level(df):
+        return PROVINCE_COLUMNS + DISTRICT_COLUMNS
+    return list(PROVINCE_COLUMNS)
+
+
+def be_to_timestamp(year_be: pd.Series, month: pd.Series) -> pd.Series:
+    """Convert Buddhist Era year + month columns to month-start timestamps"""
+    return pd.to_datetime(
+        pd.DataFrame({"year": year_be - BE_OFFSET, "month": month, "day": 1})
+    )
+
+
+def build_bottom_matrix(df: pd.DataFrame, metric: str) -> Tuple[np.ndarray, pd.DataFrame, pd.DatetimeIndex]:
+    """
+    Pivot the regional data into a (bottom series x months) matrix
+    Months missing for a series (e.g. Bueng Kan before 2554) are filled with 0
+    Returns: (values, bottom_keys, dates)
+    """
+    keys = bottom_key_columns(df)
+    data = df[keys + ["Year_BE", "Month", metric]].copy()
+    data["ds"] = be_to_timestamp(data["Year_BE"], data["Month"])
+
+    wide = data.pivot_table(
+        index=keys,
+        columns="ds",
+        values=metric,
+        aggfunc="sum",
+        fill_value=0
+    ).sort_index()
+
+    dates = pd.DatetimeIndex(wide.columns)
+    full_dates = pd.date_range(dates.min(), dates.max(), freq="MS")
+    wide = wide.reindex(columns=full_dates, fill_value=0)
+
+    bottom_keys = wide.index.to_frame(index=False)
+    return wide.to_numpy(dtype=float), bottom_keys, full_dates
+
+
+def build_hierarchy(bottom_keys: pd.DataFrame, regions: Dict[str, List[str]]) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Build the summing matrix S for nation -> region -> province (-> district)
+    Provinces missing from the region scheme are rolled into UNMAPPED_REGION
+    so every level still adds up to the national total.
+    Args:
+        bottom_keys: One row per bottom series (from build_bottom_matrix)
+        regions: Region scheme, region name -> list of province names
+    Returns: (S with shape (n_nodes, n_bottom), node labels with Level/Name/Region/Province)
+    """
+    province_to_region = {p: r for r, provs in regions.items() for p in provs}
+    provinces = bottom_keys["Province"].to_numpy()
+    region_of_bottom = np.array(
+        [province_to_region.get(p, UNMAPPED_REGION) for p in provinces]
+    )
+
+    region_names = [r for r in regions.keys() if r in set(region_of_bottom)]
+    if UNMAPPED_REGION in set(region_of_bottom):
+        region_names.append(UNMAPPED_REGION)
+    province_names = list(dict.fromkeys(provinces))
+
+    blocks = [np.ones((1, len(bottom_keys)))]
+    labels = [("Nation", NATION_LABEL, "", "")]
+
+    # Region / province rows are indicator matrices built by broadcasting
+    blocks.append((region_of_bottom[None, :] == np.array(region_names)[:, None]).astype(float))
+    labels += [("Region", r, r, "") for r in region_names]
+
+    blocks.append((provinces[None, :] == np.array(province_names)[:, None]).astype(float))
+    labels += [
+        ("Province", p, province_to_region.get(p, UNMAPPED_REGION), p)
+        for p in province_names
+    ]
+
+    if has_district_level(bottom_keys):
+        blocks.append(np.eye(len(bottom_keys)))
+        labels += [
+            ("District", d, province_to_region.get(p, UNMAPPED_REGION), p)
+            for p, d in zip(provinces, bottom_keys["District"])
+        ]
+
+    S = np.vstack(blocks)
+    nodes = pd.DataFrame(labels, columns=["Level", "Name", "Region", "Province"])
+    return S, nodes
+
+
+# =========================================================
+# Region Membership Index
+# =========================================================
+
+@dataclass(frozen=True)
+class RegionIndex:
+    """
+    Integer province code -> region code lookup for every region scheme
+    The last region code of every scheme is the UNMAPPED_REGION bucket,
+    so provinces missing from a scheme are counted instead of dropped.
+    """
+    province_codes: np.ndarray
+    province_names: np.ndarray
+    regions: Dict[str, List[str]]
+    lookup: Dict[str, np.ndarray]
+
+    def region_codes(self, scheme: str, province_codes: np.ndarray) -> np.ndarray:
+        """Gather the region code of every province code"""
+        return self.lookup[scheme][province_codes]
+
+    def region_code(self, scheme: str, region: str) -> int:
+        """Integer code of a region name within a scheme"""
+        return self.regions[scheme].index(region)
+
+    def region_mask(self, scheme: str, region: str, province_codes: np.ndarray) -> np.ndarray:
+        """Boolean mask of the rows whose province belongs to region"""
+        return self.region_codes(scheme, province_codes) == self.region_code(scheme, region)
+
+    def unmapped_provinces(self, scheme: str) -> List[str]:
+        """Provinces present in the data but missing from the scheme"""
+        unmapped = self.region_codes(scheme, self.province_codes) == len(self.regions[scheme]) - 1
+        return self.province_names[unmapped].tolist()
+
+
+def build_region_index(df: pd.DataFrame, schemes: Dict[str, Dict[str, List[str]]]) -> RegionIndex:
+    """
+    Build the region index once from the regional data and REGION_SCHEMES
+    Args:
+        df: Regional data with Province_Code / Province columns
+        schemes: Scheme name -> region name -> list of province names
+    """
+    provinces = df[PROVINCE_COLUMNS].drop_duplicates().sort_values("Province_Code")
+    codes = provinces["Province_Code"].to_numpy()
+    names = provinces["Province"].to_numpy()
+    name_to_code = dict(zip(names, codes))
+
+    regions = {}
+    lookup = {}
+    for scheme, scheme_regions in schemes.items():
+        region_names = list(scheme_regions.keys()) + [UNMAPPED_REGION]
+        table = np.full(codes.max() + 1, len(region_names) - 1, dtype=np.int16)
+        for region_code, provs in enumerate(scheme_regions.values()):
+            prov_codes = [name_to_code[p] for p in provs if p in name_to_code]
+            table[prov_codes] = region_code
+        regions[scheme] = region_names
+        lookup[scheme] = table
+
+    return RegionIndex(
+        province_codes=codes,
+        province_names=names,
+        regions=regions,
+        lookup=lookup
+    )
+
+
+def aggregate_by_region(index: RegionIndex, scheme: str, df: pd.DataFrame,
+                        metrics: List[str] = METRICS) -> pd.DataFrame:
+    """
+    Sum metrics per region with a single gather + bincount
+    Returns one row per region (UNMAPPED_REGION last) with a Provinces count
+    """
+    n_regions = len(index.regions[scheme])
+    codes = index.region_codes(scheme, df["Province_Code"].to_numpy())
+
+    result = pd.DataFrame({"Region": index.regions[scheme]})
+    for metric in metrics:
+        result[metric] = np.bincount(
+            codes, weights=df[metric].to_numpy(dtype=float), minlength=n_regions
+        )
+    unique_codes = np.unique(df["Province_Code"].to_numpy())
+    result["Provinces"] = np.bincount(
+        index.region_codes(scheme, unique_codes), minlength=n_regions
+    )
+    return result
+
+
+# =========================================================
+# Materialized Region Rollups
+# =========================================================
+
+def build_region_rollups(df: pd.DataFrame, index: RegionIndex) -> Dict[str, pd.DataFrame]:
+    """
+    Precompute region-level Marriage/Divorce series for every scheme and region
+    Returns: {"monthly": ..., "yearly": ...} long frames keyed by Scheme/Region_Code
+    (UNMAPPED_REGION included) with a Provinces count per period
+    """
+    province_codes = df["Province_Code"].to_numpy()
+    parts = []
+    for scheme, region_names in index.regions.items():
+        part = (
+            df[["Year_BE", "Month", "Province_Code"] + METRICS]
+            .assign(Region_Code=index.region_codes(scheme, province_codes))
+            .groupby(["Region_Code", "Year_BE", "Month"], sort=True)
+            .agg(
+                Marriage=("Marriage", "sum"),
+                Divorce=("Divorce", "sum"),
+                Provinces=("Province_Code", "nunique")
+            )
+            .reset_index()
+        )
+        part.insert(0, "Scheme", scheme)
+        part.insert(2, "Region", np.asarray(region_names)[part["Region_Code"]])
+        parts.append(part)
+
+    monthly = pd.concat(parts, ignore_index=True)
+    monthly["Scheme"] = monthly["Scheme"].astype("category")
+    monthly["ds"] = be_to_timestamp(monthly["Year_BE"], monthly["Month"])
+
+    yearly = (
+        monthly
+        .groupby(["Scheme", "Region_Code", "Region", "Year_BE"], observed=True, sort=True)
+        .agg(
+            Marriage=("Marriage", "sum"),
+            Divorce=("Divorce", "sum"),
+            Provinces=("Provinces", "max")
+        )
+        .reset_index()
+    )
+    return {"monthly": monthly, "yearly": yearly}
+
+
+def select_rollup(rollup: pd.DataFrame, scheme: str, year_range: Tuple[int, int],
+                  region: Optional[str] = None) -> pd.DataFrame:
+    """Slice a materialized rollup to one scheme, a year range and optionally one region"""
+    mask = (
+        (rollup["Scheme"] == scheme)
+        & (rollup["Year_BE"] >= year_range[0])
+        & (rollup["Year_BE"] <= year_range[1])
+    )
+    if region is not None:
+        mask &= rollup["Region"] == region
+    return rollup[mask]
+
+
+def region_totals_from_rollup(yearly: pd.DataFrame, index: RegionIndex, scheme: str) -> pd.DataFrame:
+    """
+    Collapse a sliced yearly rollup to one row per region
+    Same layout as aggregate_by_region (UNMAPPED_REGION last)
+    """
+    totals = yearly.groupby("Region_Code")[["Marriage", "Divorce", "Provinces"]].agg(
+        {"Marriage": "sum", "Divorce": "sum", "Provinces": "max"}
+    )
+    n_regions = len(index.regions[scheme])
+    totals = totals.reindex(range(n_regions), fill_value=0)
+
+    result = pd.DataFrame({"Region": index.regions[scheme]})
+    for col in ["Marriage", "Divorce", "Provinces"]:
+        result[col] = totals[col].to_numpy()
+    return result
@@ -0,0 +1,379 @@
+# =========================================================
+# SARIMA - persisted state-space model (from basic_ARIMA.ipynb)
+# Select orders and refit with: python sarima.py [--workers 4] [--save]
+# =========================================================
+
+import argparse
+import hashlib
+import os
+import tempfile
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+from statsmodels.tsa.statespace.sarimax import SARIMAX, SARIMAXResults
+from statsmodels.tsa.stattools import adfuller, kpss
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from cleaning import SEASON_LENGTH
+from decomposition import decompose_batch
+
+# Orders selected by the grid search in basic_ARIMA.ipynb
+SARIMA_ORDER = (1, 1, 2)
+SARIMA_SEASONAL_ORDER = (1, 1, 1, 12)
+
+# Fitted parameters + the filtered state at the last observation (a few KB,
+# unlike pickled SARIMAXResults which carry every smoother matrix)
+SARIMA_STATE_FILE = "sarima_state.npz"
+
+
+def to_monthly_series(df: pd.DataFrame, column: str = "Divorce") -> pd.Series:
+    """Monthly series with a DatetimeIndex (freq MS) as expected by the state-space model"""
+    y = df.set_index("ds")[column].astype(float).sort_index()
+    y.index = pd.DatetimeIndex(y.index, freq="MS")
+    return y
+
+
+def _history_hash(y: pd.Series) -> str:
+    """Fingerprint of dates + values, used to detect revised history"""
+    h = hashlib.sha1(y.index.asi8.tobytes())
+    h.update(y.to_numpy(dtype=float).tobytes())
+    return h.hexdigest()
+
+
+def _build_model(y: pd.Series, order: Tuple, seasonal_order: Tuple) -> SARIMAX:
+    """SARIMAX specification shared by fitting and filtering"""
+    return SARIMAX(
+        y,
+        order=order,
+        seasonal_order=seasonal_order,
+        enforce_stationarity=False,
+        enforce_invertibility=False
+    )
+
+
+def fit_sarima(y: pd.Series, order: Tuple = SARIMA_ORDER,
+               seasonal_order: Tuple = SARIMA_SEASONAL_ORDER) -> SARIMAXResults:
+    """Full SARIMA fit (parameter optimization) - the expensive step"""
+    return _build_model(y, order, seasonal_order).fit(disp=False)
+
+
+def sarima_state(results: SARIMAXResults, y: pd.Series) -> Dict:
+    """
+    Compact state needed to continue filtering from the last observation
+    The anchor is the last observation: its predicted state (given all earlier
+    data) lets the filter restart there and absorb any newer months.
+    results may cover all of y or only its tail, as long as both end together.
+    """
+    n = int(results.nobs)
+    return {
+        "params": results.params.to_numpy(),
+        "order": np.array(results.model.order),
+        "seasonal_order": np.array(results.model.seasonal_order),
+        "anchor_ds": np.datetime64(y.index[-1], "ns"),
+        "history_hash": np.array(_history_hash(y.iloc[:-1])),
+        "state": results.predicted_state[:, n - 1],
+        "state_cov": results.predicted_state_cov[:, :, n - 1],
+    }
+
+
+def save_sarima_state(state: Dict, path: str = SARIMA_STATE_FILE) -> None:
+    """Persist the state atomically (write temp file, then rename)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npz")
+    os.close(fd)
+    try:
+        np.savez(tmp_path, **state)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_sarima_state(path: str = SARIMA_STATE_FILE) -> Dict:
+    """Load a persisted state file"""
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def filter_from_state(state: Dict, y: pd.Series) -> Tuple[SARIMAXResults, str]:
+    """
+    Bring the model up to date with y without re-optimizing parameters
+    New trailing months are filtered from the persisted anchor state only;
+    revised history is re-filtered from scratch with the same parameters.
+    Returns: (results, status) with status "current", "updated" or "refiltered"
+    """
+    order = tuple(int(v) for v in state["order"])
+    seasonal_order = tuple(int(v) for v in state["seasonal_order"])
+    anchor = pd.Timestamp(state["anchor_ds"].item())
+
+    before_anchor = y[y.index < anchor]
+    if anchor in y.index and _history_hash(before_anchor) == str(state["history_hash"]):
+        tail = y[y.index >= anchor]
+        model = _build_model(tail, order, seasonal_order)
+        model.initialize_known(state["state"], state["state_cov"])
+        status = "current" if len(tail) == 1 else "updated"
+        return model.filter(state["params"]), status
+
+    return _build_model(y, order, seasonal_order).filter(state["params"]), "refiltered"
+
+
+def current_state_file(path: str = SARIMA_STATE_FILE, live_path: Optional[str] = None) -> Optional[str]:
+    """
+    State file to load: the live copy when it exists and is at least as new as the seed at path
+    (a deploy shipping a new seed then takes over from older live updates)
+    Returns: None when neither file exists
+    """
+    if live_path is not None and os.path.exists(live_path):
+        if not os.path.exists(path) or os.path.getmtime(live_path) >= os.path.getmtime(path):
+            return live_path
+    return path if os.path.exists(path) else None
+
+
+def load_or_update_sarima(y: pd.Series, path: str = SARIMA_STATE_FILE, auto_order: bool = False,
+                          live_path: Optional[str] = None) -> Tuple[SARIMAXResults, str]:
+    """
+    Load the persisted SARIMA state and filter any new observations through it
+    Falls back to a full fit (and persists it) when no state file exists yet.
+    Args:
+        auto_order: Choose the orders of that full fit with auto_sarima instead of
+            the notebook's SARIMA_ORDER / SARIMA_SEASONAL_ORDER
+        live_path: Where updated states are written (and read first, see current_state_file);
+            the state at path is then read-only seed data. None updates path in place.
+    Returns: (results, status) with status "fitted", "current", "updated" or "refiltered"
+    """
+    target = live_path if live_path is not None else path
+    source = current_state_file(path, live_path)
+    if source is None:
+        if auto_order:
+            selection = auto_sarima(y)
+            results = fit_sarima(y, selection["order"], selection["seasonal_order"])
+        else:
+            results = fit_sarima(y)
+        save_sarima_state(sarima_state(results, y), target)
+        return results, "fitted"
+
+    results, status = filter_from_state(load_sarima_state(source), y)
+    if status != "current":
+        save_sarima_state(sarima_state(results, y), target)
+    return results, status
+
+
+def sarima_forecast(results: SARIMAXResults, horizon: int, alpha: float = 0.05) -> pd.DataFrame:
+    """
+    Forecast any horizon from the current end of the data
+    Returns: ds, yhat, yhat_lower, yhat_upper
+    """
+    forecast = results.get_forecast(steps=horizon)
+    conf_int = forecast.conf_int(alpha=alpha)
+
+    return pd.DataFrame({
+        "ds": forecast.predicted_mean.index,
+        "yhat": forecast.predicted_mean.to_numpy(),
+        "yhat_lower": conf_int.iloc[:, 0].to_numpy(),
+        "yhat_upper": conf_int.iloc[:, 1].to_numpy(),
+    })
+
+
+# =========================================================
+# Automatic Order Selection (stepwise, Hyndman-Khandakar)
+# Replaces the notebook's exhaustive grid: differencing comes from unit-root
+# tests and seasonal strength, then (p, q, P, Q) walks to neighbouring orders
+# from a few starting models while AIC keeps improving.
+# =========================================================
+
+# Significance level of the ADF / KPSS tests
+UNIT_ROOT_ALPHA = 0.05
+
+# Seasonal strength above which the series is seasonally differenced (as forecast::nsdiffs)
+SEASONAL_STRENGTH_THRESHOLD = 0.64
+
+# Largest orders the search may reach
+MAX_ORDERS = {"p": 5, "q": 5, "P": 2, "Q": 2, "d": 2, "D": 1}
+
+# (p, q, P, Q) of the starting models
+STEPWISE_START = [(2, 2, 1, 1), (0, 0, 0, 0), (1, 0, 1, 0), (0, 1, 0, 1)]
+
+# Cap on the number of models fitted by one search
+STEPWISE_MAX_FITS = 94
+
+
+def unit_root_tests(y: pd.Series) -> Dict[str, float]:
+    """
+    ADF and KPSS p-values of a series, as adf_test / kpss_test in basic_ARIMA.ipynb
+    ADF's null is a unit root, KPSS's null is (level) stationarity.
+    """
+    values = np.asarray(y, dtype=float)
+    with warnings.catch_warnings():
+        # KPSS warns when the statistic falls outside its p-value table
+        warnings.simplefilter("ignore")
+        adf_pvalue = adfuller(values, autolag="AIC")[1]
+        kpss_pvalue = kpss(values, regression="c", nlags="auto")[1]
+    return {"adf_pvalue": float(adf_pvalue), "kpss_pvalue": float(kpss_pvalue)}
+
+
+def needs_difference(y: pd.Series, alpha: float = UNIT_ROOT_ALPHA) -> bool:
+    """True when KPSS rejects stationarity and ADF cannot reject a unit root"""
+    tests = unit_root_tests(y)
+    return tests["kpss_pvalue"] < alpha and tests["adf_pvalue"] >= alpha
+
+
+def seasonal_strength(y: pd.Series, period: int = SEASON_LENGTH) -> float:
+    """max(0, 1 - Var(residual) / Var(seasonal + residual)) of the additive decomposition"""
+    values = np.asarray(y, dtype=float)[None, :, None]
+    _, seasonal, resid, _ = decompose_batch(values, first_month=y.index[0].month - 1, period=period)
+    detrended = (seasonal + resid)[0, :, 0]
+    resid = resid[0, :, 0]
+    if np.nanvar(detrended) == 0:
+        return 0.0
+    return float(max(0.0, 1 - np.nanvar(resid) / np.nanvar(detrended)))
+
+
+def select_differencing(y: pd.Series, period: int = SEASON_LENGTH) -> Tuple[int, int]:
+    """
+    Seasonal differences D from the seasonal strength, then d from repeated unit-root tests
+    on the seasonally differenced series
+    Returns: (d, D)
+    """
+    D = 0
+    if len(y) >= 3 * period and seasonal_strength(y, period) > SEASONAL_STRENGTH_THRESHOLD:
+        D = 1
+    x = y.diff(period).dropna() if D else y
+
+    d = 0
+    while d < MAX_ORDERS["d"] and len(x) > 2 * period and needs_difference(x):
+        x = x.diff().dropna()
+        d += 1
+    return d, min(D, MAX_ORDERS["D"])
+
+
+def _candidate_aic(y: pd.Series, order: Tuple, seasonal_order: Tuple) -> float:
+    """AIC of one candidate (inf when the fit fails); module level so worker processes can run it"""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            aic = fit_sarima(y, order, seasonal_order).aic
+    except (ValueError, np.linalg.LinAlgError):
+        return np.inf
+    return float(aic) if np.isfinite(aic) else np.inf
+
+
+def _neighbours(pqPQ: Tuple[int, int, int, int], seasonal: bool) -> List[Tuple[int, int, int, int]]:
+    """
+    Orders one step away: each of p, q, P, Q by +-1, and p/q or P/Q together by +-1
+    Returns only orders inside MAX_ORDERS (P = Q = 0 for non-seasonal searches).
+    """
+    p, q, P, Q = pqPQ
+    steps = [(1, 0, 0, 0), (0, 1, 0, 0), (1, 1, 0, 0)]
+    if seasonal:
+        steps += [(0, 0, 1, 0), (0, 0, 0, 1), (0, 0, 1, 1)]
+
+    limits = (MAX_ORDERS["p"], MAX_ORDERS["q"], MAX_ORDERS["P"], MAX_ORDERS["Q"])
+    result = []
+    for step in steps:
+        for sign in (1, -1):
+            candidate = tuple(v + sign * s for v, s in zip(pqPQ, step))
+            if all(0 <= v <= limit for v, limit in zip(candidate, limits)):
+                result.append(candidate)
+    return result
+
+
+def auto_sarima(y: pd.Series, period: int = SEASON_LENGTH, max_workers: int = 4,
+                max_fits: int = STEPWISE_MAX_FITS, fitted: Optional[Dict] = None,
+                on_round: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Stepwise SARIMA order selection
+    Each round fits every unfitted neighbour of the current best model concurrently
+    and moves to the best of them; the search stops when no neighbour lowers the AIC
+    (or after max_fits models), typically a few dozen fits instead of the 6^6 grid.
+    Args:
+        y: Monthly series (freq MS)
+        max_workers: Processes fitting candidates in parallel (1 fits in this process)
+        fitted: AICs of candidates scored by an interrupted search of the same series ((p, q, P, Q) -> AIC),
+            which are not fitted again
+        on_round: Called with every AIC so far after each round of fits (e.g. to checkpoint them)
+    Returns: dict with order, seasonal_order, aic, d/D tests and fits (every candidate by AIC)
+    """
+    d, D = select_differencing(y, period)
+    seasonal = len(y) >= 2 * period + 1
+
+    def specs(pqPQ: Tuple[int, int, int, int]) -> Tuple[Tuple, Tuple]:
+        p, q, P, Q = pqPQ
+        return (p, d, q), ((P, D, Q, period) if seasonal else (0, 0, 0, 0))
+
+    aics: Dict[Tuple[int, int, int, int], float] = dict(fitted or {})
+    pool = ProcessPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+
+    def evaluate(candidates: Set[Tuple[int, int, int, int]]) -> None:
+        candidates = sorted(c for c in candidates if c not in aics)[:max(0, max_fits - len(aics))]
+        if pool is None:
+            scores = [_candidate_aic(y, *specs(c)) for c in candidates]
+        else:
+            scores = list(pool.map(_candidate_aic, [y] * len(candidates),
+                                   *zip(*[specs(c) for c in candidates])))
+        aics.update(zip(candidates, scores))
+        if on_round is not None and candidates:
+            on_round(dict(aics))
+
+    try:
+        evaluate({start if seasonal else start[:2] + (0, 0) for start in STEPWISE_START})
+        best = min(aics, key=aics.get)
+        while len(aics) < max_fits:
+            before = len(aics)
+            evaluate(set(_neighbours(best, seasonal)))
+            if len(aics) == before:
+                break
+            challenger = min(aics, key=aics.get)
+            if not aics[challenger] < aics[best]:
+                break
+            best = challenger
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    order, seasonal_order = specs(best)
+    fits = pd.DataFrame(
+        [specs(c)[0] + specs(c)[1] + (aic,) for c, aic in aics.items()],
+        columns=["p", "d", "q", "P", "D", "Q", "s", "AIC"]
+    ).sort_values("AIC").reset_index(drop=True)
+
+    return {
+        "order": order,
+        "seasonal_order": seasonal_order,
+        "aic": aics[best],
+        "tests": unit_root_tests(y),
+        "seasonal_strength": seasonal_strength(y, period) if len(y) >= 3 * period else 0.0,
+        "fits": fits,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Stepwise SARIMA order selection for the national divorce series")
+    parser.add_argument("--workers", type=int, default=4, help="Processes fitting candidate models in parallel")
+    parser.add_argument("--save", action="store_true", help="Refit with the selected orders and replace the state file")
+    args = parser.parse_args()
+
+    # DATA_FILES lives in the compute layer, whose cached functions warn outside `streamlit run`
+    from streamlit import logger as streamlit_logger
+    streamlit_logger.set_log_level("error")
+    from dashboard_compute import DATA_FILES
+
+    df = pd.read_csv(DATA_FILES["divorce_model"], parse_dates=["ds"])
+    y = to_monthly_series(df)
+    selection = auto_sarima(y, max_workers=args.workers)
+
+    print(selection["fits"].head(10).to_string(index=False))
+    print(f"\nSelected SARIMA{selection['order']}x{selection['seasonal_order']} "
+          f"(AIC {selection['aic']:.1f}, {len(selection['fits'])} models fitted, "
+          f"seasonal strength {selection['seasonal_strength']:.2f})")
+
+    if args.save:
+        results = fit_sarima(y, selection["order"], selection["seasonal_order"])
+        save_sarima_state(sarima_state(results, y), DATA_FILES["sarima_state"])
+        print(f"Saved {DATA_FILES['sarima_state']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
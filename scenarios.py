@@ -0,0 +1,82 @@
+# =========================================================
+# Marriage Scenarios - what-if marriage trajectories for the Prophet regressor model
+# Marriage enters Prophet as an additive regressor with a fixed (MAP) coefficient,
+# so every scenario is the baseline prediction shifted by coefficient x change in
+# marriages; all scenarios are evaluated together as one (scenarios, months) array.
+# =========================================================
+
+import pandas as pd
+import numpy as np
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from cleaning import SEASON_LENGTH
+
+# Extra regressor of the scenario model (a column of divorce_all_model.csv)
+MARRIAGE = "Marriage"
+
+# Prediction columns shifted by a scenario (intervals shift with the point forecast)
+SCENARIO_COLUMNS = ["yhat", "yhat_lower", "yhat_upper"]
+
+
+@dataclass(frozen=True)
+class MarriageScenario:
+    """
+    Marriage trajectory relative to the baseline, in percent
+    annual_growth compounds monthly from the first forecast month; shock applies
+    to every month of shock_year (Gregorian) on top of the growth.
+    """
+    name: str
+    annual_growth: float = 0.0
+    shock_year: Optional[int] = None
+    shock: float = 0.0
+
+
+def baseline_marriage(history: pd.DataFrame, future_ds: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Seasonal naive marriage path: each future month repeats the same calendar month of the last observed year
+    Args:
+        history: Observed ds / Marriage (monthly)
+        future_ds: Months to fill
+    """
+    last_year = history.sort_values("ds").tail(SEASON_LENGTH)
+    by_month = pd.Series(last_year[MARRIAGE].to_numpy(dtype=float), index=last_year["ds"].dt.month)
+    return by_month.reindex(future_ds.month).to_numpy()
+
+
+def marriage_paths(baseline: np.ndarray, future_ds: pd.DatetimeIndex,
+                   scenarios: Sequence[MarriageScenario]) -> np.ndarray:
+    """Marriages per scenario and month, shape (scenarios, months)"""
+    years_ahead = np.arange(1, len(future_ds) + 1) / SEASON_LENGTH
+    growth = np.array([s.annual_growth for s in scenarios], dtype=float)[:, None] / 100
+    factor = (1 + growth) ** years_ahead[None, :]
+
+    shock_year = np.array([s.shock_year if s.shock_year is not None else -1 for s in scenarios])[:, None]
+    shock = np.array([s.shock for s in scenarios], dtype=float)[:, None] / 100
+    factor *= np.where(future_ds.year.to_numpy()[None, :] == shock_year, 1 + shock, 1.0)
+    return baseline[None, :] * factor
+
+
+def apply_scenarios(baseline_prediction: pd.DataFrame, coefficient: float,
+                    scenarios: Sequence[MarriageScenario]) -> pd.DataFrame:
+    """
+    Evaluate every scenario from one baseline prediction
+    Args:
+        baseline_prediction: Future ds, Marriage (baseline path) and SCENARIO_COLUMNS
+        coefficient: Divorces per additional marriage in the same month (additive regressor)
+    Returns: scenarios stacked along one frame: Scenario, ds, Marriage, SCENARIO_COLUMNS
+    """
+    future_ds = pd.DatetimeIndex(baseline_prediction["ds"])
+    baseline = baseline_prediction[MARRIAGE].to_numpy(dtype=float)
+    paths = marriage_paths(baseline, future_ds, scenarios)
+    shift = coefficient * (paths - baseline[None, :])
+
+    stacked = {
+        "Scenario": np.repeat([s.name for s in scenarios], len(future_ds)),
+        "ds": np.tile(future_ds.to_numpy(), len(scenarios)),
+        MARRIAGE: paths.ravel(),
+    }
+    for column in SCENARIO_COLUMNS:
+        if column in baseline_prediction.columns:
+            stacked[column] = (baseline_prediction[column].to_numpy(dtype=float)[None, :] + shift).ravel()
+    return pd.DataFrame(stacked)
@@ -0,0 +1,248 @@
+# =========================================================
+# Scheduler - recurring refits through the persistent job queue
+# Run with: python scheduler.py [--workers 4] [--every 3600] [--select-orders] [--status]
+# Fits, backtests and forecasts run here, off the request path; the dashboard
+# reads their results from the disk cache, forecast store and SARIMA state.
+# =========================================================
+
+import argparse
+import inspect
+import os
+import time
+import traceback
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List
+
+try:
+    import fcntl
+except ImportError:  # Windows: nothing stops a second scheduler, so run only one
+    fcntl = None
+
+from prewarm import (
+    _init_worker, _data, warm_prophet_fit, warm_prophet_backtest, warm_sarima, warm_regional,
+    warm_selections, warm_forecast_store, warm_forecasts, warm_reconciliation
+)
+from dashboard_compute import (
+    REGION_SCHEMES, HIERARCHY_HORIZONS, SARIMA_LIVE_STATE, get_artifact_registry, artifacts_version
+)
+from forecasting import UNCERTAINTY_SAMPLES
+from reconciliation import RECONCILIATION_METHODS
+from regional_store import METRICS
+from sarima import auto_sarima, fit_sarima, sarima_state, save_sarima_state, to_monthly_series
+from job_queue import QUEUE_PATH, QUEUED, DONE, FAILED, Checkpoint, Job, JobQueue
+
+# What the dashboard shows before any input: first scheme, Divorce, first method,
+# first horizon, fast Prophet uncertainty
+DEFAULT_HIERARCHY = (
+    next(iter(REGION_SCHEMES)), "Divorce", next(iter(RECONCILIATION_METHODS)), HIERARCHY_HORIZONS[0]
+)
+DEFAULT_UNCERTAINTY = "fast"
+
+
+def select_sarima_orders(checkpoint: Checkpoint) -> str:
+    """
+    Stepwise SARIMA order search on the national series, refit and saved as the live state
+    Every round of fits is checkpointed, so a killed search resumes without refitting them.
+    """
+    y = to_monthly_series(_data()["divorce_model"].frame)
+    # The scheduler already runs one job per core
+    selection = auto_sarima(y, max_workers=1, fitted=checkpoint.load({}), on_round=checkpoint.save)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        results = fit_sarima(y, selection["order"], selection["seasonal_order"])
+    save_sarima_state(sarima_state(results, y), SARIMA_LIVE_STATE)
+    return f"SARIMA{selection['order']}x{selection['seasonal_order']}, {len(selection['fits'])} models fitted"
+
+
+# Task name -> function (module level so worker processes can unpickle them)
+TASKS: Dict[str, Callable] = {
+    func.__name__: func for func in [
+        warm_prophet_fit, warm_prophet_backtest, warm_sarima, warm_regional, warm_selections,
+        warm_forecast_store, warm_forecasts, warm_reconciliation, select_sarima_orders
+    ]
+}
+
+
+# =========================================================
+# Jobs
+# =========================================================
+
+def build_jobs(version: str, all_horizons: bool = False, select_orders: bool = False) -> List[Job]:
+    """
+    Every job for one data version, national model and default view first
+    Priorities: national fits, then the default forecasts and view, then every other
+    selection. Forecasts wait for the fits they reuse instead of fitting them again.
+    """
+    def job(task: str, args: tuple, label: str, priority: int, requires: List[Job] = ()) -> Job:
+        return Job(task, args, label, priority, version, tuple(r.key for r in requires))
+
+    prophet_fit = job("warm_prophet_fit", (), "Prophet fit", 0)
+    sarima = job("warm_sarima", (), "SARIMA update", 0)
+    backtest = job("warm_prophet_backtest", (), "Prophet backtest", 1)
+    jobs = [prophet_fit, sarima, backtest, job("warm_forecast_store", (), "Forecast store", 1)]
+
+    fits = [prophet_fit, sarima, backtest]
+    jobs += [
+        job("warm_forecasts", (mode,), f"Forecasts + ensemble ({mode} uncertainty)",
+            2 if mode == DEFAULT_UNCERTAINTY else 5, fits)
+        for mode in UNCERTAINTY_SAMPLES
+    ]
+    regional = job("warm_regional", (), "Regional index/rollups/tensor", 3)
+    jobs.append(regional)
+    jobs += [
+        job("warm_selections", (scheme,), f"Overview selections {scheme}",
+            4 if scheme == DEFAULT_HIERARCHY[0] else 6, [regional])
+        for scheme in REGION_SCHEMES
+    ]
+
+    horizons = HIERARCHY_HORIZONS if all_horizons else HIERARCHY_HORIZONS[:1]
+    jobs += [
+        job("warm_reconciliation", (scheme, metric, horizon, method),
+            f"Hierarchy {scheme} / {metric} / {method} / {horizon}",
+            4 if (scheme, metric, method, horizon) == DEFAULT_HIERARCHY else 6)
+        for scheme in REGION_SCHEMES
+        for metric in METRICS
+        for method in RECONCILIATION_METHODS
+        for horizon in horizons
+    ]
+    if select_orders:
+        jobs.append(job("select_sarima_orders", (), "SARIMA order search", 7, [sarima]))
+    return jobs
+
+
+def _run_job(path: str, key: str, task: str, args: tuple) -> Dict:
+    """Run one job in a worker process, never raising so the scheduler keeps going"""
+    func = TASKS[task]
+    kwargs = {"checkpoint": Checkpoint(path, key)} if "checkpoint" in inspect.signature(func).parameters else {}
+    start = time.perf_counter()
+    try:
+        detail, status = func(*args, **kwargs), DONE
+    except Exception as e:
+        detail, status = f"{type(e).__name__}: {e}", FAILED
+        traceback.print_exc()
+    return {"seconds": time.perf_counter() - start, "status": status, "detail": detail}
+
+
+def _record(queue: JobQueue, job: Dict, row: Dict) -> None:
+    """Store the outcome of one run (failed runs with attempts left are queued for a retry) and log it"""
+    status = queue.finish(job["key"], **row)
+    label = "retry" if status == QUEUED else status
+    print(f"  [{label:>6}] {row['seconds']:7.2f}s  {job['label']}  ({row['detail']})", flush=True)
+
+
+def drain(queue: JobQueue, workers: int) -> int:
+    """
+    Run queued jobs on a process pool until none is runnable, keeping every worker busy
+    Waits out retry backoffs. A worker that dies (OOM, a crash inside Stan) breaks the
+    whole pool: every job running on it is failed (and retried while it has attempts
+    left) and the pool is recreated, so the scheduler itself keeps going.
+    Returns: number of job runs, retries included
+    """
+    ran = 0
+    running = {}
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    try:
+        while True:
+            while len(running) < workers:
+                job = queue.claim()
+                if job is None:
+                    break
+                future = pool.submit(_run_job, queue.path, job["key"], job["task"], job["args"])
+                running[future] = (job, time.perf_counter())
+            if not running:
+                retry_at = queue.next_retry()
+                if retry_at is None:
+                    return ran
+                time.sleep(max(0.0, retry_at - time.time()))
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            broken = None
+            for future in finished:
+                job, start = running.pop(future)
+                try:
+                    row = future.result()
+                except BrokenProcessPool as e:
+                    broken = e
+                    row = {"seconds": time.perf_counter() - start, "status": FAILED, "detail": f"worker crashed: {e}"}
+                _record(queue, job, row)
+                ran += 1
+
+            if broken is not None:
+                # The jobs still running were lost with the pool too
+                for job, start in running.values():
+                    _record(queue, job, {"seconds": time.perf_counter() - start, "status": FAILED,
+                                         "detail": f"worker crashed: {broken}"})
+                    ran += 1
+                running.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def current_version() -> str:
+    """Version of the artifacts on disk right now"""
+    registry = get_artifact_registry()
+    return artifacts_version(registry.load_handles())
+
+
+# =========================================================
+# Runner
+# =========================================================
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run model refits from the persistent job queue")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Jobs run in parallel (default: one per core)")
+    parser.add_argument("--every", type=float, default=0,
+                        help="Seconds between checks for new data (default: run once and exit)")
+    parser.add_argument("--all-horizons", action="store_true",
+                        help="Also reconcile every Hierarchical Forecast horizon, not only the default")
+    parser.add_argument("--select-orders", action="store_true",
+                        help="Also rerun the SARIMA order search and replace the live state")
+    parser.add_argument("--status", action="store_true", help="Print the jobs of the current data and exit")
+    parser.add_argument("--queue", default=QUEUE_PATH, help="Job queue file")
+    args = parser.parse_args()
+
+    _init_worker()
+    queue = JobQueue(args.queue)
+    if args.status:
+        jobs = queue.jobs(current_version())
+        print(jobs[["label", "status", "attempts", "seconds", "finished", "detail"]].to_string(index=False)
+              if not jobs.empty else "No jobs for the current data")
+        return 0
+
+    # One scheduler per queue: jobs left running can then only be from a killed run
+    with open(f"{args.queue}.lock", "a") as lock:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                print(f"Another scheduler is already draining {args.queue}")
+                return 1
+
+        resumed = queue.recover()
+        if resumed:
+            print(f"Resuming {resumed} interrupted jobs")
+        while True:
+            version = current_version()
+            added = queue.enqueue(build_jobs(version, args.all_horizons, args.select_orders))
+            summary = queue.summary(version)
+            if added or summary["queued"]:
+                print(f"Data version {version[:10]}: {added} new jobs, {summary['queued']} queued, "
+                      f"{args.workers} workers", flush=True)
+                start = time.perf_counter()
+                ran = drain(queue, args.workers)
+                summary = queue.summary(version)
+                print(f"Ran {ran} job runs in {time.perf_counter() - start:.1f}s: "
+                      f"{summary['done']} done, {summary['failed']} failed", flush=True)
+            if not args.every:
+                return 1 if summary["failed"] else 0
+            time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
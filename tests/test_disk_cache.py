@@ -0,0 +1,106 @@
+import importlib
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import pytest
+
+import disk_cache
+from disk_cache import DiskCache
+
+
+def _compute_once(directory: str, marker: str) -> str:
+    """Slow computation that leaves one line in marker per run"""
+    with open(marker, "a") as f:
+        f.write("run\n")
+    time.sleep(0.5)
+    return "value"
+
+
+def _worker(directory: str, marker: str, start: float, results) -> None:
+    time.sleep(max(0.0, start - time.time()))
+    cache = DiskCache(directory)
+    results.put(cache.get_or_compute("shared", lambda: _compute_once(directory, marker)))
+
+
+@pytest.mark.skipif(disk_cache.fcntl is None, reason="per-key locks need fcntl")
+def test_two_processes_compute_a_key_once(tmp_path):
+    directory, marker = str(tmp_path / "cache"), str(tmp_path / "runs.txt")
+    DiskCache(directory)
+    ctx = mp.get_context("fork")
+    results = ctx.Queue()
+    start = time.time() + 0.2
+    workers = [ctx.Process(target=_worker, args=(directory, marker, start, results)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    values = [results.get(timeout=30) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=30)
+
+    assert values == ["value", "value"]
+    with open(marker) as f:
+        assert f.read().count("run") == 1
+
+
+def test_eviction_drops_least_recently_accessed_and_their_locks(tmp_path):
+    directory = str(tmp_path / "cache")
+    cache = DiskCache(directory, max_bytes=400)
+    payload = "x" * 100  # ~120 bytes pickled: three entries fit, a fourth evicts
+
+    for key in ["a", "b", "c"]:
+        with cache.lock(key):
+            cache.set(key, payload)
+        time.sleep(0.01)
+    assert cache.get("a")[0]  # a is now more recently accessed than b and c
+    time.sleep(0.01)
+
+    with cache.lock("d"):
+        cache.set("d", payload)
+
+    hits = {key: cache.get(key)[0] for key in "abcd"}
+    assert hits == {"a": True, "b": False, "c": True, "d": True}
+    locks = sorted(os.listdir(os.path.join(directory, "locks")))
+    assert locks == ["a.lock", "c.lock", "d.lock"]
+
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+    assert os.listdir(os.path.join(directory, "locks")) == []
+
+
+def test_code_salt_follows_project_module_sources(tmp_path, monkeypatch):
+    (tmp_path / "salt_helper.py").write_text("FACTOR = 1\n")
+    (tmp_path / "salt_user.py").write_text("from salt_helper import FACTOR\nimport salt_helper\n")
+    (tmp_path / "salt_other.py").write_text("VALUE = 1\n")
+    monkeypatch.setattr(disk_cache, "PROJECT_DIR", str(tmp_path))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for name in ["salt_helper", "salt_user", "salt_other"]:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    importlib.import_module("salt_user")
+    importlib.import_module("salt_other")
+
+    disk_cache.code_salt.cache_clear()
+    before = disk_cache.code_salt("salt_user"), disk_cache.code_salt("salt_other")
+
+    # Edit a helper the module only reaches through an import
+    (tmp_path / "salt_helper.py").write_text("FACTOR = 2\n")
+    disk_cache.code_salt.cache_clear()
+    after = disk_cache.code_salt("salt_user"), disk_cache.code_salt("salt_other")
+    disk_cache.code_salt.cache_clear()
+
+    assert after[0] != before[0]
+    assert after[1] == before[1]
+
+
+def test_errors_in_the_cached_function_propagate_without_a_second_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache, "_default_cache", DiskCache(str(tmp_path / "cache")))
+    calls = []
+
+    @disk_cache.disk_cached
+    def broken(x):
+        calls.append(x)
+        raise TypeError("bug")
+
+    with pytest.raises(TypeError):
+        broken(1)
+    assert calls == [1]
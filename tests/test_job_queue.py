@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+import job_queue
+from job_queue import DONE, FAILED, QUEUED, RUNNING, Job, JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def _row(queue: JobQueue, key: str):
+    return queue._connection().execute(
+        "SELECT status, attempts, retry_after FROM jobs WHERE key = ?", (key,)
+    ).fetchone()
+
+
+def _skip_backoff(queue: JobQueue, key: str) -> None:
+    queue._connection().execute("UPDATE jobs SET retry_after = 0 WHERE key = ?", (key,))
+
+
+def test_failed_job_is_retried_with_doubling_backoff(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "RETRY_BACKOFF", 10.0)
+    job = Job("task", (1,), "flaky", version="v")
+    queue.enqueue([job])
+
+    delays = []
+    for attempt in range(1, job_queue.MAX_ATTEMPTS):
+        assert queue.claim()["key"] == job.key
+        now = time.time()
+        assert queue.finish(job.key, FAILED, 0.1, "boom") == QUEUED
+        status, attempts, retry_after = _row(queue, job.key)
+        assert (status, attempts) == (QUEUED, attempt)
+        delays.append(retry_after - now)
+
+        # Not runnable until its backoff has passed
+        assert queue.claim() is None
+        assert queue.next_retry() == pytest.approx(retry_after)
+        _skip_backoff(queue, job.key)
+
+    assert delays == pytest.approx([10.0 * 2 ** i for i in range(job_queue.MAX_ATTEMPTS - 1)], abs=1.0)
+
+    # The last attempt fails for good
+    assert queue.claim()["key"] == job.key
+    assert queue.finish(job.key, FAILED, 0.1, "boom") == FAILED
+    assert _row(queue, job.key)[:2] == (FAILED, job_queue.MAX_ATTEMPTS)
+    assert queue.claim() is None and queue.next_retry() is None
+
+
+def test_job_waits_for_unfinished_requirements(queue):
+    fit = Job("fit", (), "fit", priority=5, version="v")
+    forecast = Job("forecast", (), "forecast", priority=0, version="v", requires=(fit.key,))
+    queue.enqueue([forecast, fit])
+
+    # The forecast has the higher priority but its requirement has not finished
+    assert queue.claim()["key"] == fit.key
+    assert queue.claim() is None
+
+    queue.finish(fit.key, DONE, 1.0, "ok")
+    assert queue.claim()["key"] == forecast.key
+
+
+def test_recover_requeues_jobs_of_a_dead_scheduler(queue):
+    job = Job("fit", (), "fit", version="v")
+    queue.enqueue([job])
+    assert queue.claim()["key"] == job.key
+    assert _row(queue, job.key)[0] == RUNNING
+
+    # A new scheduler on the same file after the old one died mid-run
+    restarted = JobQueue(queue.path)
+    assert restarted.recover() == 1
+    assert _row(restarted, job.key)[:2] == (QUEUED, 1)
+    assert restarted.claim()["key"] == job.key
+
+
+def test_recover_fails_jobs_interrupted_too_often(queue):
+    job = Job("fit", (), "fit", version="v")
+    queue.enqueue([job])
+    for _ in range(job_queue.MAX_ATTEMPTS):
+        assert queue.claim()["key"] == job.key
+        JobQueue(queue.path).recover()
+
+    assert _row(queue, job.key)[:2] == (FAILED, job_queue.MAX_ATTEMPTS)
+    assert queue.claim() is None
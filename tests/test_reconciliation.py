@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reconciliation import RECONCILIATION_METHODS, hierarchical_forecast, reconcile, shrink_covariance
+from regional_store import NATION_LABEL, UNMAPPED_REGION, build_hierarchy
+
+REGIONS = {"North": ["A", "B"], "South": ["C"]}
+
+
+def _bottom_keys(provinces):
+    return pd.DataFrame({"Province_Code": range(len(provinces)), "Province": provinces})
+
+
+def _seasonal_history(n_series: int, n_months: int = 48, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    months = np.arange(n_months)
+    seasonal = 1 + 0.3 * np.sin(2 * np.pi * months / 12)
+    scale = rng.uniform(50, 500, size=(n_series, 1))
+    return scale * seasonal * rng.uniform(0.9, 1.1, size=(n_series, n_months))
+
+
+@pytest.mark.parametrize("method", list(RECONCILIATION_METHODS))
+def test_reconciled_aggregates_equal_summed_bottom(method):
+    S, _ = build_hierarchy(_bottom_keys(["A", "B", "C", "D"]), REGIONS)
+    n_bottom = S.shape[1]
+
+    result = hierarchical_forecast(_seasonal_history(n_bottom), S, horizon=18, method=method)
+
+    reconciled = result["reconciled"]
+    assert reconciled.shape == (S.shape[0], 18)
+    np.testing.assert_allclose(reconciled, S @ reconciled[-n_bottom:], rtol=1e-9)
+
+
+def test_unmapped_provinces_land_in_unmapped_region():
+    S, nodes = build_hierarchy(_bottom_keys(["A", "B", "C", "D", "E"]), REGIONS)
+
+    regions = nodes[nodes.Level == "Region"].reset_index()
+    assert regions.Name.tolist() == ["North", "South", UNMAPPED_REGION]
+
+    unmapped_row = S[regions.loc[regions.Name == UNMAPPED_REGION, "index"].item()]
+    np.testing.assert_array_equal(unmapped_row, [0, 0, 0, 1, 1])
+
+    provinces = nodes[nodes.Level == "Province"].set_index("Name")
+    assert provinces.loc[["D", "E"], "Region"].tolist() == [UNMAPPED_REGION, UNMAPPED_REGION]
+
+    # Every level still adds up to the nation
+    assert nodes.Name.iloc[0] == NATION_LABEL
+    np.testing.assert_array_equal(S[regions["index"]].sum(axis=0), S[0])
+
+
+def test_shrink_covariance_hand_computed():
+    # n = 4; var = (1, 1/2), cov = 1/2, corr = 1/sqrt(2)
+    # standardized: e1 = (1, -1, 1, -1), e2 = sqrt(2) * (1, -1, 0, 0)
+    # w12 = 2 sqrt(2), w2_12 = 4 -> Var(r12) = (4 - 8 / 4) / (4 * 3) = 1/6
+    # lambda = 2 * 1/6 / (2 * 1/2) = 1/3 -> off-diagonal (1 - 1/3) * 1/2 = 1/3
+    residuals = np.array([[1.0, -1.0, 1.0, -1.0],
+                          [1.0, -1.0, 0.0, 0.0]])
+
+    np.testing.assert_allclose(shrink_covariance(residuals), [[1.0, 1 / 3], [1 / 3, 0.5]], atol=1e-8)
+
+
+def test_mint_shrink_weights_hand_computed():
+    # total = a + b; uncorrelated residuals with variances (4, 1, 1) shrink to W = diag(4, 1, 1)
+    S = np.array([[1.0, 1.0], [1.0, 0.0], [0.0, 1.0]])
+    residuals = np.array([[2.0, 2.0, -2.0, -2.0],
+                          [1.0, -1.0, 1.0, -1.0],
+                          [1.0, -1.0, -1.0, 1.0]])
+    np.testing.assert_allclose(shrink_covariance(residuals), np.diag([4.0, 1.0, 1.0]), atol=1e-8)
+
+    # G = (S' W^-1 S)^-1 S' W^-1 = [[1/6, 5/6, -1/6], [1/6, -1/6, 5/6]]
+    # base (12, 4, 6): a = 2 + 10/3 - 1 = 13/3, b = 2 - 2/3 + 5 = 19/3
+    base = np.array([[12.0], [4.0], [6.0]])
+    reconciled = reconcile(base, S, method="mint_shrink", residuals=residuals)
+
+    np.testing.assert_allclose(reconciled.ravel(), [32 / 3, 13 / 3, 19 / 3], rtol=1e-8)
+
+
+def test_mint_shrink_requires_residuals():
+    with pytest.raises(ValueError):
+        reconcile(np.ones((3, 1)), np.array([[1.0, 1.0], [1.0, 0.0], [0.0, 1.0]]), method="mint_shrink")